@@ -11,6 +11,7 @@ import config
 from secure_db import secure_db, EncryptedJSONStorage
 from tinydb import TinyDB
 from handlers.ledger import seed_tables  # 🌱 Correct import path for seeding
+from handlers.ledger_archive import reseal_segments, remove_segment_files
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import (
     ApplicationBuilder,
@@ -69,10 +70,25 @@ from handlers.reports.store_report    import (
     save_custom_start as save_custom_start_store,
 )
 from handlers.reports.owner_report    import register_owner_report_handlers
+from handlers.reports.workers         import report_executor
+from handlers.reports.pdf             import register_pdf_stats_handlers
+from handlers.reports.statements      import register_statements_handlers
 
 # Owner module
 from handlers.owner import register_owner_handlers, show_owner_menu
 
+# Ledger diagnostics (/ledgerdiag)
+from handlers.ledger_diag import register_ledger_diag_handlers
+
+# Ledger maintenance (/closeperiod, /integrity, /verifyledger)
+from handlers.period_close import register_period_close_handlers
+from handlers.integrity import register_integrity_handlers
+from handlers.verify_ledger import register_verify_ledger_handlers
+
+# Stock projections (/rebuildstock, /stockcheck)
+from handlers.stock_projection import register_stock_projection_handlers
+from handlers.store_stock import register_store_stock_handlers
+
 # ====== DIVIDENDS MODULE HANDLERS (UPDATED) ======
 from handlers.dividends import (
     dividends_menu, handle_dividends_callback,
@@ -146,14 +162,18 @@ async def changepin_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
     new_pin = context.user_data.get('new_pin')
     try:
         all_data = secure_db.db.storage.read()
+        new_fernet = secure_db._derive_key(new_pin)
+        # archive segments are sealed with the DB key: re-seal them first
+        old_segments = reseal_segments(all_data, secure_db.fernet, new_fernet)
         secure_db.lock()
-        secure_db.fernet = secure_db._derive_key(new_pin)
+        secure_db.fernet = new_fernet
         secure_db.db = TinyDB(
             config.DB_PATH,
             storage=lambda p: EncryptedJSONStorage(p, secure_db.fernet)
         )
         secure_db.db.storage.write(all_data)
         secure_db.lock()
+        remove_segment_files(old_segments)
         await update.message.reply_text("✅ PIN changed successfully! Please use your new PIN from now on.")
         await start(update, context)
     except Exception as e:
@@ -338,6 +358,8 @@ async def auto_lock_task():
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Main menu with DB status indicator and unlock/initdb shortcuts."""
+    if update.effective_user:       # navigated away: drop any report still computing
+        report_executor.cancel(update.effective_user.id)
     if not os.path.exists(config.DB_PATH):
         status_icon = "📂 No DB found: run /initdb"
         kb = InlineKeyboardMarkup([
@@ -545,6 +567,13 @@ async def run_bot():
     # Admin commands
     app.add_handler(CommandHandler("restart", restart_bot))
     app.add_handler(CommandHandler("kill",    kill_bot))
+    register_ledger_diag_handlers(app)
+    register_pdf_stats_handlers(app)
+    register_period_close_handlers(app)
+    register_integrity_handlers(app)
+    register_verify_ledger_handlers(app)
+    register_stock_projection_handlers(app)
+    register_store_stock_handlers(app)
 
     # InitDB handler
     app.add_handler(ConversationHandler(
@@ -621,6 +650,7 @@ async def run_bot():
     register_partner_report_handlers(app)
     register_store_report_handlers(app)
     register_owner_report_handlers(app)
+    register_statements_handlers(app)
 
     # ====== DIVIDENDS MODULE HANDLER (ADDED) ======
     app.add_handler(dividends_conv)
@@ -636,6 +666,7 @@ async def run_bot():
         await app.updater.stop()
         await app.stop()
         await app.shutdown()
+        report_executor.shutdown()
 
 # ════════════════════════════════════════════════════════════
 # Simple self-supervisor — restarts on crash
@@ -12,9 +12,37 @@ DB_PATH           = "data/db.json"
 # Toggle DB encryption/locking (False in test, True in production)
 ENABLE_ENCRYPTION = True
 
-# config.py
-
 NEXTCLOUD_URL = "https://cloud.secu1.chat/remote.php/dav/files/pipe/accts/"
 NEXTCLOUD_USER = "pipe"
 NEXTCLOUD_PASS = "epSxp-AfGbP-SHyRK-eWYks-2rJBo"
 
+# Ledger write diagnostics (caller tag + ring buffer, see /ledgerdiag)
+LEDGER_DIAGNOSTICS = False
+LEDGER_DIAG_BUFFER = 200
+
+# Rows between per-account balance checkpoints (handlers/ledger_checkpoints.py)
+LEDGER_CHECKPOINT_EVERY = 256
+
+# Sealed segments written by /closeperiod (handlers/ledger_archive.py)
+LEDGER_ARCHIVE_DIR = "data/archive"
+
+# Replayed ledger events before the stock projection re-snapshots (handlers/stock_projection.py)
+STOCK_SNAPSHOT_EVERY = 500
+
+# Quiet seconds after ledger writes before the owner position snapshot is recomputed (handlers/reports/owner_report.py)
+OWNER_SNAPSHOT_DELAY = 5
+
+# Computed report models kept for page flips / PDF export (handlers/reports/cache.py)
+REPORT_CACHE_ENTRIES = 64
+REPORT_CACHE_MB = 32
+
+# Report worker processes (0 = compute inline) and per-report timeout in seconds (handlers/reports/workers.py)
+REPORT_WORKERS = 2
+REPORT_TIMEOUT = 60
+
+# Rows from which multi-section PDFs are laid out section-parallel; export stats kept for /pdfstats (handlers/reports/pdf.py)
+PDF_PARALLEL_ROWS = 400
+PDF_STATS_BUFFER = 100
+
+# Seconds allowed for building all the models of a /statements batch (handlers/reports/statements.py)
+STATEMENTS_TIMEOUT = 600
@@ -23,7 +23,9 @@ from telegram.ext import (
     CallbackQueryHandler,
 )
 
+from secure_db import secure_db
 from handlers.utils import require_unlock
+from handlers.ledger_archive import ARCHIVE_DIR, SEGMENT_SUFFIX
 import config
 
 BACKUP_FILES = ["data/db.json", "data/kdf_salt.bin"]
@@ -36,6 +38,50 @@ ADMIN_TELEGRAM_ID = getattr(config, "ADMIN_TELEGRAM_ID", None)
 RESTORE_WAITING = range(1)
 CLOUD_RESTORE_SELECT = range(1)
 
+# --- Closed-period ledger segments travel with the DB ---
+def archive_segments():
+    if not os.path.isdir(ARCHIVE_DIR):
+        return []
+    return sorted(
+        os.path.join(ARCHIVE_DIR, f) for f in os.listdir(ARCHIVE_DIR)
+        if f.endswith(SEGMENT_SUFFIX)
+    )
+
+def extract_segments(zf, tmpdir):
+    names = [n for n in zf.namelist() if n.endswith(SEGMENT_SUFFIX)]
+    for n in names:
+        zf.extract(n, path=tmpdir)
+    return names
+
+def install_segments(tmpdir, names):
+    if not names:
+        return
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    for n in names:
+        dest = os.path.join(ARCHIVE_DIR, os.path.basename(n))
+        if os.path.exists(dest):
+            os.chmod(dest, stat.S_IWRITE | stat.S_IREAD)
+        shutil.move(os.path.join(tmpdir, n), dest)
+        os.chmod(dest, 0o444)
+
+def install_backup(tmpdir, segments):
+    """
+    Swap the verified backup in for data/db.json, the salt and the segments,
+    then lock: the session's in-memory state (ledger index, chain head,
+    checkpoints, projections, report caches, serial block) describes the
+    old DB, and the lock's session hooks drop it.  The next /unlock reads
+    the restored files.
+    """
+    # PATCH: Unlock the salt file for writing
+    if os.path.exists("data/kdf_salt.bin"):
+        os.chmod("data/kdf_salt.bin", stat.S_IWRITE | stat.S_IREAD)
+    shutil.move(os.path.join(tmpdir, "db.json"), "data/db.json")
+    shutil.move(os.path.join(tmpdir, "kdf_salt.bin"), "data/kdf_salt.bin")
+    install_segments(tmpdir, segments)
+    # PATCH: Lock down the salt file again
+    os.chmod("data/kdf_salt.bin", 0o444)
+    secure_db.lock()
+
 # --- Nextcloud Upload and Public Link ---
 def upload_to_nextcloud(local_file_path, remote_filename, share=False):
     url = getattr(config, "NEXTCLOUD_URL", "").strip()
@@ -186,13 +232,14 @@ def make_backup_file(suffix=""):
         if not os.path.isfile(f):
             logging.error(f"Backup file missing or not a file: {f}")
             raise FileNotFoundError(f"Missing backup file: {f}")
-    hash_txt = compute_hashes(BACKUP_FILES)
+    files = BACKUP_FILES + archive_segments()
+    hash_txt = compute_hashes(files)
     with open(HASH_FILE, "w") as hout:
         hout.write(hash_txt)
 
     try:
         with ZipFile(BACKUP_TMP, 'w', compression=ZIP_STORED) as zf:
-            for filepath in BACKUP_FILES:
+            for filepath in files:
                 zf.write(filepath, arcname=os.path.basename(filepath))
             zf.write(HASH_FILE, arcname=HASH_FILE)
         if os.path.exists(HASH_FILE):
@@ -311,17 +358,12 @@ async def restore_receive(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 zf.extract("db.json", path=tmpdir)
                 zf.extract("kdf_salt.bin", path=tmpdir)
                 zf.extract("backup.sha256", path=tmpdir)
+                segments = extract_segments(zf, tmpdir)
             ok, msg = check_hashes(tmpdir, os.path.join(tmpdir, "backup.sha256"))
             if not ok:
                 await update.message.reply_text(f"❌ Hash check failed: {msg}. Restore aborted.")
                 return ConversationHandler.END
-            # PATCH: Unlock the salt file for writing
-            if os.path.exists("data/kdf_salt.bin"):
-                os.chmod("data/kdf_salt.bin", stat.S_IWRITE | stat.S_IREAD)
-            shutil.move(os.path.join(tmpdir, "db.json"), "data/db.json")
-            shutil.move(os.path.join(tmpdir, "kdf_salt.bin"), "data/kdf_salt.bin")
-            # PATCH: Lock down the salt file again
-            os.chmod("data/kdf_salt.bin", 0o444)
+            install_backup(tmpdir, segments)
         except Exception as e:
             logging.error(f"Restore failed: {e}")
             await update.message.reply_text(f"❌ Restore failed: {e}")
@@ -381,16 +423,12 @@ async def cloud_restore_receive(update: Update, context: ContextTypes.DEFAULT_TY
                 zf.extract("db.json", path=tmpdir)
                 zf.extract("kdf_salt.bin", path=tmpdir)
                 zf.extract("backup.sha256", path=tmpdir)
+                segments = extract_segments(zf, tmpdir)
             ok, msg = check_hashes(tmpdir, os.path.join(tmpdir, "backup.sha256"))
             if not ok:
                 await update.callback_query.edit_message_text(f"❌ Hash check failed: {msg}. Restore aborted.")
                 return ConversationHandler.END
-            # PATCH: Unlock the salt file for writing
-            if os.path.exists("data/kdf_salt.bin"):
-                os.chmod("data/kdf_salt.bin", stat.S_IWRITE | stat.S_IREAD)
-            shutil.move(os.path.join(tmpdir, "db.json"), "data/db.json")
-            shutil.move(os.path.join(tmpdir, "kdf_salt.bin"), "data/kdf_salt.bin")
-            os.chmod("data/kdf_salt.bin", 0o444)
+            install_backup(tmpdir, segments)
         except Exception as e:
             logging.error(f"Cloud restore failed: {e}")
             await update.callback_query.edit_message_text(f"❌ Cloud restore failed: {e}")
@@ -479,17 +517,12 @@ async def backups_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     zf.extract("db.json", path=tmpdir)
                     zf.extract("kdf_salt.bin", path=tmpdir)
                     zf.extract("backup.sha256", path=tmpdir)
+                    segments = extract_segments(zf, tmpdir)
                 ok, msg = check_hashes(tmpdir, os.path.join(tmpdir, "backup.sha256"))
                 if not ok:
                     await update.callback_query.message.reply_text(f"❌ Hash check failed: {msg}. Restore aborted.")
                     return
-                # PATCH: Unlock the salt file for writing
-                if os.path.exists("data/kdf_salt.bin"):
-                    os.chmod("data/kdf_salt.bin", stat.S_IWRITE | stat.S_IREAD)
-                shutil.move(os.path.join(tmpdir, "db.json"), "data/db.json")
-                shutil.move(os.path.join(tmpdir, "kdf_salt.bin"), "data/kdf_salt.bin")
-                # PATCH: Lock down the salt file again
-                os.chmod("data/kdf_salt.bin", 0o444)
+                install_backup(tmpdir, segments)
             await update.callback_query.message.reply_text(
                 f"✅ Restore from <b>{fname}</b> complete and hash verified! Please /unlock with your PIN.",
                 parse_mode="HTML"
@@ -13,7 +13,7 @@ from telegram.ext import (
 )
 from secure_db import secure_db
 from handlers.utils import require_unlock_and_admin, fmt_money, fmt_date
-from handlers.ledger import add_ledger_entry, delete_ledger_entries_by_related
+from handlers.ledger_txn import LedgerTransaction
 
 logger = logging.getLogger("dividends")
 DEBUG_HANDLERS = True
@@ -72,6 +72,126 @@ async def trace_all_messages(update: Update, context: ContextTypes.DEFAULT_TYPE)
 ) = range(24)
 
 OWNER_ACCOUNT_ID = "POT"
+
+# ===================== LEDGER LEGS =====================
+# One builder per record table, shared by the create and edit flows, so an
+# edited record is re-posted with exactly the legs its creation wrote.
+def _add_dividend_legs(txn, table_name, rec, related_id=None):
+    """Buffer the ledger legs of one dividends record; returns its related_id."""
+    ts = rec["timestamp"]
+    if table_name == "project_dividends":
+        related_id = txn.add(
+            account_type="partner",
+            account_id=rec["debit_project_id"],
+            entry_type="project_payout",
+            related_id=related_id,
+            amount=-rec["amount"],
+            currency=rec["currency"],
+            note="Dividends paid to partner",
+            timestamp=ts
+        )
+        txn.add(
+            account_type="partner_dividends",
+            account_id=rec["credit_project_id"],
+            entry_type="dividend_credit",
+            related_id=related_id,
+            amount=rec["amount"],
+            currency=rec["currency"],
+            note="Dividends credited from project",
+            timestamp=ts
+        )
+    elif table_name == "project_dividends_withdrawals":
+        related_id = txn.add(
+            account_type="partner_dividends",
+            account_id=rec["project_id"],
+            entry_type="dividend_withdrawal",
+            related_id=related_id,
+            amount=-rec["local_amount"],
+            currency=rec["currency"],
+            note="Dividends withdrawal",
+            timestamp=ts
+        )
+        txn.add(
+            account_type="owner",
+            account_id=OWNER_ACCOUNT_ID,
+            entry_type="payout_sent",
+            related_id=related_id,
+            amount=-rec["usd_amount"],
+            currency="USD",
+            fx_rate=rec["fx_rate"],
+            fee_amt=rec["fee"],
+            usd_amt=rec["usd_amount"],
+            note="USD paid for dividends withdrawal",
+            timestamp=ts
+        )
+        if rec["fee"] > 0:
+            txn.add(
+                account_type="owner",
+                account_id=OWNER_ACCOUNT_ID,
+                entry_type="fee",
+                related_id=related_id,
+                amount=rec["fee"],
+                currency=rec["currency"],
+                note="Handling fee for dividends withdrawal",
+                timestamp=ts
+            )
+    else:  # project_expense_payments
+        related_id = txn.add(
+            account_type="partner",
+            account_id=rec["debit_project_id"],
+            entry_type="investor_expense",
+            related_id=related_id,
+            amount=-rec["local_paid"],
+            currency=rec["currency_paid"],
+            fx_rate=rec["fx_rate"],
+            fee_amt=rec["fee"],
+            note=rec["description"],
+            timestamp=ts
+        )
+        txn.add(
+            account_type="partner",
+            account_id=rec["credit_project_id"],
+            entry_type="expense_credit",
+            related_id=related_id,
+            amount=rec["local_received"],
+            currency=rec["currency_received"],
+            fx_rate=rec["fx_rate"],
+            note=rec["description"],
+            timestamp=ts
+        )
+        if rec["fee"] > 0:
+            txn.add(
+                account_type="owner",
+                account_id=OWNER_ACCOUNT_ID,
+                entry_type="fee",
+                related_id=related_id,
+                amount=rec["fee"],
+                currency=rec["currency_paid"],
+                note="Handling fee for project expense",
+                timestamp=ts
+            )
+    return related_id
+
+def _remove_dividend_legs(txn, table_name, rec):
+    """Queue every leg _add_dividend_legs() wrote for *rec* for removal."""
+    rid = rec["related_id"]
+    if table_name == "project_dividends":
+        txn.remove("partner", rec["debit_project_id"], rid)
+        txn.remove("partner_dividends", rec["credit_project_id"], rid)
+    elif table_name == "project_dividends_withdrawals":
+        txn.remove("partner_dividends", rec["project_id"], rid)
+        txn.remove("owner", OWNER_ACCOUNT_ID, rid)
+    else:
+        txn.remove("partner", rec["debit_project_id"], rid)
+        txn.remove("partner", rec["credit_project_id"], rid)
+        txn.remove("owner", OWNER_ACCOUNT_ID, rid)
+
+# Edit-flow "amount" is the table's local amount column
+_AMOUNT_FIELD = {
+    "project_dividends": "amount",
+    "project_dividends_withdrawals": "local_amount",
+    "project_expense_payments": "local_paid",
+}
 # ===================== MAIN MENU =====================
 @require_unlock_and_admin
 async def dividends_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -169,41 +289,24 @@ async def credit_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
     project = secure_db.table("partners").get(doc_id=credit_project_id)
     currency = project["currency"]
     timestamp = datetime.utcnow().isoformat()
-    related_id = None
+    record = {
+        "debit_project_id": debit_project_id,
+        "credit_project_id": credit_project_id,
+        "amount": amount,
+        "currency": currency,
+        "timestamp": timestamp,
+    }
+    doc_id = None
     try:
-        related_id = add_ledger_entry(
-            account_type="partner",
-            account_id=debit_project_id,
-            entry_type="project_payout",
-            related_id=None,
-            amount=-amount,
-            currency=currency,
-            note="Dividends paid to partner",
-            timestamp=timestamp
-        )
-        add_ledger_entry(
-            account_type="partner_dividends",
-            account_id=credit_project_id,
-            entry_type="dividend_credit",
-            related_id=related_id,
-            amount=amount,
-            currency=currency,
-            note="Dividends credited from project",
-            timestamp=timestamp
-        )
-        secure_db.insert("project_dividends", {
-            "debit_project_id": debit_project_id,
-            "credit_project_id": credit_project_id,
-            "amount": amount,
-            "currency": currency,
-            "timestamp": timestamp,
-            "related_id": related_id
-        })
+        txn = LedgerTransaction()
+        record["related_id"] = _add_dividend_legs(txn, "project_dividends", record)
+        doc_id = secure_db.insert("project_dividends", record)
+        txn.commit()
         await update.callback_query.edit_message_text(f"✅ Credited {fmt_money(amount, currency)} to selected project.")
     except Exception as e:
         logger.error(f"Error in credit_confirm: {e}")
-        if related_id:
-            delete_ledger_entries_by_related("partner", debit_project_id, related_id)
+        if doc_id is not None:
+            secure_db.remove("project_dividends", [doc_id])
         await update.callback_query.edit_message_text("❌ Failed to credit dividends. Rolled back.")
     return ConversationHandler.END
 # ===================== WITHDRAW DIVIDENDS FLOW =====================
@@ -282,57 +385,26 @@ async def withdraw_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
     project = secure_db.table("partners").get(doc_id=project_id)
     currency = project["currency"]
     timestamp = datetime.utcnow().isoformat()
-    related_id = None
+    record = {
+        "project_id": project_id,
+        "local_amount": amount,
+        "currency": currency,
+        "usd_amount": usd_amount,
+        "fx_rate": fx_rate,
+        "fee": fee,
+        "timestamp": timestamp,
+    }
+    doc_id = None
     try:
-        related_id = add_ledger_entry(
-            account_type="partner_dividends",
-            account_id=project_id,
-            entry_type="dividend_withdrawal",
-            related_id=None,
-            amount=-amount,
-            currency=currency,
-            note="Dividends withdrawal",
-            timestamp=timestamp
-        )
-        add_ledger_entry(
-            account_type="owner",
-            account_id=OWNER_ACCOUNT_ID,
-            entry_type="payout_sent",
-            related_id=related_id,
-            amount=-usd_amount,
-            currency="USD",
-            fx_rate=fx_rate,
-            fee_amt=fee,
-            usd_amt=usd_amount,
-            note="USD paid for dividends withdrawal",
-            timestamp=timestamp
-        )
-        if fee > 0:
-            add_ledger_entry(
-                account_type="owner",
-                account_id=OWNER_ACCOUNT_ID,
-                entry_type="fee",
-                related_id=related_id,
-                amount=fee,
-                currency=currency,
-                note="Handling fee for dividends withdrawal",
-                timestamp=timestamp
-            )
-        secure_db.insert("project_dividends_withdrawals", {
-            "project_id": project_id,
-            "local_amount": amount,
-            "currency": currency,
-            "usd_amount": usd_amount,
-            "fx_rate": fx_rate,
-            "fee": fee,
-            "timestamp": timestamp,
-            "related_id": related_id
-        })
+        txn = LedgerTransaction()
+        record["related_id"] = _add_dividend_legs(txn, "project_dividends_withdrawals", record)
+        doc_id = secure_db.insert("project_dividends_withdrawals", record)
+        txn.commit()
         await update.callback_query.edit_message_text(f"✅ Withdrawal of {fmt_money(amount, currency)} recorded.")
     except Exception as e:
         logger.error(f"Error in withdraw_confirm: {e}")
-        if related_id:
-            delete_ledger_entries_by_related("partner_dividends", project_id, related_id)
+        if doc_id is not None:
+            secure_db.remove("project_dividends_withdrawals", [doc_id])
         await update.callback_query.edit_message_text("❌ Failed to record withdrawal. Rolled back.")
     return ConversationHandler.END
 # ===================== PAY PROJECT EXPENSES FLOW =====================
@@ -443,60 +515,29 @@ async def expense_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
     debit_currency = debit_project["currency"]
     credit_currency = credit_project["currency"]
     timestamp = datetime.utcnow().isoformat()
-    related_id = None
+    record = {
+        "debit_project_id": debit_project_id,
+        "credit_project_id": credit_project_id,
+        "local_paid": local_paid,
+        "local_received": local_received,
+        "fee": fee,
+        "fx_rate": fx_rate,
+        "currency_paid": debit_currency,
+        "currency_received": credit_currency,
+        "description": desc,
+        "timestamp": timestamp,
+    }
+    doc_id = None
     try:
-        related_id = add_ledger_entry(
-            account_type="partner",
-            account_id=debit_project_id,
-            entry_type="investor_expense",
-            related_id=None,
-            amount=-local_paid,
-            currency=debit_currency,
-            fx_rate=fx_rate,
-            fee_amt=fee,
-            note=desc,
-            timestamp=timestamp
-        )
-        add_ledger_entry(
-            account_type="partner",
-            account_id=credit_project_id,
-            entry_type="expense_credit",
-            related_id=related_id,
-            amount=local_received,
-            currency=credit_currency,
-            fx_rate=fx_rate,
-            note=desc,
-            timestamp=timestamp
-        )
-        if fee > 0:
-            add_ledger_entry(
-                account_type="owner",
-                account_id=OWNER_ACCOUNT_ID,
-                entry_type="fee",
-                related_id=related_id,
-                amount=fee,
-                currency=debit_currency,
-                note="Handling fee for project expense",
-                timestamp=timestamp
-            )
-        secure_db.insert("project_expense_payments", {
-            "debit_project_id": debit_project_id,
-            "credit_project_id": credit_project_id,
-            "local_paid": local_paid,
-            "local_received": local_received,
-            "fee": fee,
-            "fx_rate": fx_rate,
-            "currency_paid": debit_currency,
-            "currency_received": credit_currency,
-            "description": desc,
-            "timestamp": timestamp,
-            "related_id": related_id
-        })
+        txn = LedgerTransaction()
+        record["related_id"] = _add_dividend_legs(txn, "project_expense_payments", record)
+        doc_id = secure_db.insert("project_expense_payments", record)
+        txn.commit()
         await update.callback_query.edit_message_text(f"✅ Project expense of {fmt_money(local_paid, debit_currency)} recorded.")
     except Exception as e:
         logger.error(f"Error in expense_confirm: {e}")
-        if related_id:
-            delete_ledger_entries_by_related("partner", debit_project_id, related_id)
+        if doc_id is not None:
+            secure_db.remove("project_expense_payments", [doc_id])
         await update.callback_query.edit_message_text("❌ Failed to record project expense. Rolled back.")
     return ConversationHandler.END
 # ===================== REPORT FLOW (LEDGER-BASED) =====================
@@ -683,22 +724,23 @@ async def edit_new_value_input(update: Update, context: ContextTypes.DEFAULT_TYP
 
 @require_unlock_and_admin
 async def edit_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    project_id = context.user_data["project_id"]
     related_id = context.user_data["related_id"]
     table_name = context.user_data["table_name"]
     field = context.user_data["edit_field"]
     new_value = context.user_data["new_value"]
 
     try:
-        # Rollback old ledger entries
-        delete_ledger_entries_by_related("partner", project_id, related_id)
-
-        # Fetch DB record
-        record = secure_db.table(table_name).get(lambda x: x["related_id"] == related_id)
-
-        # Update record
-        record[field] = float(new_value) if field in ["amount", "fee", "fx_rate"] else new_value
-        secure_db.update(table_name, lambda x: x["related_id"] == related_id, record)
+        # callback data carries related_id as text
+        record = secure_db.table(table_name).get(lambda x: str(x["related_id"]) == str(related_id))
+        key = _AMOUNT_FIELD[table_name] if field == "amount" else field
+        fields = {key: float(new_value) if field in ["amount", "fee", "fx_rate"] else new_value}
+
+        # Old legs out, record update and re-posted legs in: one checked write
+        txn = LedgerTransaction()
+        _remove_dividend_legs(txn, table_name, record)
+        txn.update_row(table_name, record.doc_id, fields)
+        _add_dividend_legs(txn, table_name, {**record, **fields}, record["related_id"])
+        txn.commit()
 
         await update.callback_query.edit_message_text("✅ Record updated successfully.")
     except Exception as e:
@@ -708,13 +750,15 @@ async def edit_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 @require_unlock_and_admin
 async def confirm_delete_record(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    project_id = context.user_data["project_id"]
     related_id = context.user_data["related_id"]
     table_name = context.user_data["table_name"]
 
     try:
-        secure_db.remove(table_name, lambda r: r["related_id"] == related_id)
-        delete_ledger_entries_by_related("partner", project_id, related_id)
+        record = secure_db.table(table_name).get(lambda x: str(x["related_id"]) == str(related_id))
+        txn = LedgerTransaction()
+        _remove_dividend_legs(txn, table_name, record)
+        txn.delete_row(table_name, record.doc_id)
+        txn.commit()
         await update.callback_query.edit_message_text("✅ Record deleted successfully.")
     except Exception as e:
         logger.error(f"Error deleting record: {e}")
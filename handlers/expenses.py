@@ -14,7 +14,8 @@ from telegram.ext import (
     filters,
 )
 from handlers.utils import require_unlock, fmt_money, fmt_date
-from handlers.ledger import add_ledger_entry, delete_ledger_entries_by_related
+from handlers.ledger import delete_ledger_entries_by_related
+from handlers.ledger_txn import LedgerTransaction
 from secure_db import secure_db
 
 (
@@ -355,8 +356,9 @@ async def confirm_expense(update: Update, context: ContextTypes.DEFAULT_TYPE):
         }
         expense_id = None
         related_id = None
+        txn = LedgerTransaction()
         try:
-            related_id = add_ledger_entry(
+            related_id = txn.add(
                 account_type=d["exp_type"],
                 account_id=d["exp_acct_id"],
                 entry_type="expense",
@@ -370,10 +372,11 @@ async def confirm_expense(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 usd_amt=d.get("exp_usd_amt", 0),
                 fx_rate=d.get("exp_fx", 0),
             )
+            txn.commit()
             record["related_id"] = related_id
             expense_id = secure_db.insert("expenses", record)
         except Exception as e:
-            if related_id is not None:
+            if txn.doc_ids is not None:
                 delete_ledger_entries_by_related(d["exp_type"], d["exp_acct_id"], related_id)
             logger.exception("confirm_expense: failed writing to ledger/DB")
             await update.callback_query.edit_message_text(
@@ -785,10 +788,12 @@ async def edit_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
         update_dict["fx_rate"] = fx
 
     try:
-        secure_db.update("expenses", update_dict, [eid])
-        delete_ledger_entries_by_related(rec["account_type"], rec["account_id"], related_id)
+        # record update, old leg removal and new leg: one checked write
+        txn = LedgerTransaction()
+        txn.remove(rec["account_type"], rec["account_id"], related_id)
+        txn.update_row("expenses", eid, update_dict)
         rec = {**rec, **update_dict}
-        add_ledger_entry(
+        txn.add(
             account_type=rec["account_type"],
             account_id=rec["account_id"],
             entry_type="expense",
@@ -802,6 +807,7 @@ async def edit_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
             usd_amt=rec.get("usd_amt", 0),
             fx_rate=rec.get("fx_rate", 0),
         )
+        txn.commit()
     except Exception as e:
         logger.error(f"Failed to update expense: {e}")
         await send_error(update, "❌ Error updating expense.")
@@ -954,8 +960,10 @@ async def del_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
     related_id = rec.get("related_id", rec.doc_id)
     eid = rec.doc_id
     try:
-        secure_db.remove("expenses", [eid])
-        delete_ledger_entries_by_related(rec["account_type"], rec["account_id"], related_id)
+        txn = LedgerTransaction()
+        txn.remove(rec["account_type"], rec["account_id"], related_id)
+        txn.delete_row("expenses", eid)
+        txn.commit()
     except Exception as e:
         logger.error(f"Failed to delete expense: {e}")
         await send_error(update, "❌ Error deleting expense.")
@@ -0,0 +1,204 @@
+# handlers/integrity.py
+"""
+/integrity [full] – verify the ledger hash chain (handlers/ledger_chain.py).
+
+Incremental (default): start from the last verified checkpoint
+(`system_meta` key "ledger_chain_verified") and check only the entries
+written since, so the cost follows the amount of new data.  Full: start
+from GENESIS and also walk tombstones and archived segments.
+
+For every chain position the verifier checks that
+  • the position is accounted for (hot row, tombstone or archived row),
+  • chain_prev equals the previous position's chain_hash,
+  • the row still hashes to its chain_hash (tombstones carry no body).
+The first failure is reported with its position and row, and the checkpoint
+is not advanced.  Rows are read from the DB file (one snapshot per run), not
+from the session's ledger index, so an edit made outside the bot while the
+session is unlocked is caught on the next run.
+
+On success, per-day Merkle roots over the chain hashes (grouped by the
+entry's UTC write day) are stored in `ledger_merkle`; a full run recomputes
+them all and lists days whose stored root no longer matches.
+"""
+
+import logging
+
+from telegram import Update
+from telegram.ext import CommandHandler, ContextTypes
+from tinydb import Query
+from tinydb.table import Document
+
+from secure_db import secure_db
+from handlers.utils import require_unlock_and_admin
+from handlers.ledger import LEDGER_TABLE, _chain_head, archive_store
+from handlers.ledger_chain import GENESIS, TOMBSTONE_TABLE, entry_hash, merkle_root, write_day
+from handlers.serials import META_TABLE
+
+logger = logging.getLogger("ledger.integrity")
+
+CHECKPOINT_KEY = "ledger_chain_verified"
+MERKLE_TABLE = "ledger_merkle"
+
+
+class ChainSource:
+    """chain_seq → record, from the ledger rows on disk, tombstones, then archives (lazily)."""
+
+    def __init__(self, tables: dict):
+        rows = tables.get(LEDGER_TABLE, {})
+        self._hot = {row["chain_seq"]: Document(row, int(doc_id))
+                     for doc_id, row in rows.items() if row.get("chain_seq") is not None}
+        self.unchained = len(rows) - len(self._hot)
+        self._tombs = {t["chain_seq"]: t for t in tables.get(TOMBSTONE_TABLE, {}).values()}
+        self._archived = None
+
+    def get(self, seq) -> tuple[str | None, dict | None]:
+        row = self._hot.get(seq)
+        if row is not None:
+            return "hot", row
+        if seq in self._tombs:
+            return "tombstone", self._tombs[seq]
+        if self._archived is None:
+            self._archived = {}
+            for seg in archive_store.indexes_for(None, None):
+                for r in seg.chained.rows:
+                    self._archived[r["chain_seq"]] = r
+        if seq in self._archived:
+            return "archive", self._archived[seq]
+        return None, None
+
+
+def _day(kind, rec) -> str:
+    return rec.get("day", "") if kind == "tombstone" else write_day(rec)
+
+
+def _describe(seq, kind, rec, reason) -> dict:
+    out = {"chain_seq": seq, "reason": reason, "where": kind}
+    if rec is not None and kind != "tombstone":
+        out.update({
+            "doc_id":     getattr(rec, "doc_id", None),
+            "date":       rec.get("date"),
+            "entry_type": rec.get("entry_type"),
+            "account":    f"{rec.get('account_type')}:{rec.get('account_id')}",
+            "related_id": rec.get("related_id"),
+        })
+    return out
+
+
+def _load_checkpoint() -> tuple[int, str]:
+    meta = secure_db.get(META_TABLE, Query().key == CHECKPOINT_KEY)
+    if not meta:
+        return 0, GENESIS
+    return meta["val"]["chain_seq"], meta["val"]["chain_hash"]
+
+
+def _save_checkpoint(seq: int, hsh: str):
+    val = {"chain_seq": seq, "chain_hash": hsh}
+    secure_db.table(META_TABLE).upsert({"key": CHECKPOINT_KEY, "val": val},
+                                       Query().key == CHECKPOINT_KEY)
+
+
+def verify_chain(full: bool = False) -> dict:
+    """Walk the chain; returns a report dict (see format_report)."""
+    head = _chain_head()
+    start_seq, prev_hash = (0, GENESIS) if full else _load_checkpoint()
+    src = ChainSource(secure_db.snapshot())
+
+    report = {
+        "mode": "full" if full else "incremental",
+        "from_seq": start_seq,
+        "head_seq": head.seq,
+        "checked": 0,
+        "unchained": src.unchained,
+        "first_bad": None,
+        "days": {},
+    }
+    if head.seq < start_seq:
+        report["first_bad"] = {"chain_seq": start_seq, "where": "checkpoint",
+                               "reason": "verified checkpoint is beyond the chain head"}
+        return report
+
+    days = {}
+    for seq in range(start_seq + 1, head.seq + 1):
+        kind, rec = src.get(seq)
+        if rec is None:
+            report["first_bad"] = _describe(seq, None, None, "entry missing (deleted without tombstone)")
+            return report
+        if rec.get("chain_prev") != prev_hash:
+            report["first_bad"] = _describe(seq, kind, rec, "chain link broken (chain_prev mismatch)")
+            return report
+        if kind != "tombstone" and entry_hash(prev_hash, rec) != rec.get("chain_hash"):
+            report["first_bad"] = _describe(seq, kind, rec, "entry modified (hash mismatch)")
+            return report
+        prev_hash = rec["chain_hash"]
+        days.setdefault(_day(kind, rec), []).append(seq)
+        report["checked"] += 1
+
+    if prev_hash != head.hash:
+        report["first_bad"] = _describe(head.seq, None, None, "chain head mismatch")
+        return report
+
+    report["days"] = _update_merkle(src, days, full, report)
+    if report["checked"] or full:
+        _save_checkpoint(head.seq, head.hash)
+    return report
+
+
+def _update_merkle(src, days: dict, full: bool, report: dict) -> dict:
+    """Store/compare per-day roots for the days seen in this run."""
+    table = secure_db.table(MERKLE_TABLE)
+    stored = {d["day"]: d for d in table.all()}
+    roots, mismatched = {}, []
+    for day, seqs in days.items():
+        prior = stored.get(day)
+        if not full and prior and prior["last_seq"] < seqs[0]:
+            # day already partly verified – extend it with the earlier seqs
+            seqs = list(range(prior["first_seq"], prior["last_seq"] + 1)) + [
+                s for s in seqs if s > prior["last_seq"]]
+        hashes = []
+        for s in seqs:
+            kind, rec = src.get(s)
+            if rec is not None and _day(kind, rec) == day:
+                hashes.append(rec["chain_hash"])
+        root = merkle_root(hashes)
+        roots[day] = root
+        if full and prior and prior["root"] != root:
+            mismatched.append(day)
+            continue
+        table.upsert({"day": day, "root": root, "count": len(hashes),
+                      "first_seq": seqs[0], "last_seq": seqs[-1]}, Query().day == day)
+    report["mismatched_days"] = sorted(mismatched)
+    return roots
+
+
+def format_report(r: dict) -> str:
+    lines = [f"🔐 Ledger integrity ({r['mode']})",
+             f"Checked {r['checked']} entries (seq {r['from_seq'] + 1}–{r['head_seq']})"]
+    if r["unchained"]:
+        lines.append(f"ℹ️ {r['unchained']} older entries pre-date the hash chain")
+    bad = r["first_bad"]
+    if bad:
+        lines.append(f"❌ First bad entry: seq {bad['chain_seq']} — {bad['reason']}")
+        if bad.get("doc_id") is not None:
+            lines.append(f"   #{bad['doc_id']} {bad['account']} {bad['entry_type']} "
+                         f"date={bad['date']} rel={bad['related_id']} ({bad['where']})")
+        return "\n".join(lines)
+    lines.append(f"✅ Chain intact; {len(r['days'])} day root(s) updated")
+    if r.get("mismatched_days"):
+        lines.append("⚠️ Stored day roots differ for: " + ", ".join(r["mismatched_days"]))
+    return "\n".join(lines)
+
+
+@require_unlock_and_admin
+async def integrity_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    full = bool(context.args) and context.args[0].lower() == "full"
+    try:
+        report = verify_chain(full=full)
+    except Exception as e:
+        logger.exception("Integrity check failed")
+        await update.message.reply_text(f"❌ Integrity check failed: {e}")
+        return
+    await update.message.reply_text(format_report(report)[:4096])
+
+
+def register_integrity_handlers(app):
+    app.add_handler(CommandHandler("integrity", integrity_command))
@@ -6,14 +6,29 @@ Each entry records a financial or inventory-affecting event, for audit and repor
 Ledger is append-only (historical), and all balances/reports are derived from these entries.
 
 Now supports optional: item_id, quantity, unit_price, store_id, fee_perc, fee_amt, fx_rate, usd_amt.
+
+Every new row also stores `amount_minor`: the amount as an integer count of
+the currency's minor unit (see _CURRENCY_EXPONENTS in handlers/utils.py).
+`amount` stays for display and older readers; totals are summed on
+amount_minor so they are exact.
+
+Rows are also sealed into a hash chain (chain_seq / chain_prev / chain_hash,
+see handlers/ledger_chain.py); verify it with /integrity.
 """
 
+import heapq
 import logging
-import inspect
-import os
 from datetime import datetime
 from secure_db import secure_db
-from tinydb import Query
+from tinydb.table import Document
+from handlers.serials import related_id_allocator
+from handlers.ledger_index import LedgerIndex, to_ordinal, amount_minor
+from handlers.ledger_entry import LedgerEntry
+from handlers.ledger_checkpoints import BalanceCheckpoints, accumulate, minor_to_amount
+from handlers.ledger_archive import ArchiveStore, OPENING_ENTRY
+from handlers.ledger_chain import ChainHead, TOMBSTONE_TABLE, tombstone
+from handlers import ledger_diag
+from handlers.utils import to_minor
 
 logger = logging.getLogger("ledger")
 
@@ -27,19 +42,54 @@ if not logger.hasHandlers():
 
 LEDGER_TABLE = "ledger_entries"
 
+_ledger_index = LedgerIndex()
+archive_store = ArchiveStore(secure_db)
+_chain = ChainHead()
+_listeners = []
+
+
+def add_ledger_listener(fn):
+    """
+    Subscribe *fn(event, payload)* to ledger changes made through this module:
+      "add"    – payload is the new Document (has .doc_id)
+      "delete" – payload is the list of removed doc_ids
+      "reset"  – payload is None (lock/unlock: drop all derived state)
+    Listeners must be cheap; exceptions are logged and swallowed.
+    """
+    if fn not in _listeners:
+        _listeners.append(fn)
+
+
+def _notify(event: str, payload=None):
+    for fn in _listeners:
+        try:
+            fn(event, payload)
+        except Exception:
+            logger.exception("Ledger listener %r failed on %s", fn, event)
+
+
+def _on_session_change():
+    _ledger_index.reset()
+    archive_store.reset()
+    _chain.reset()
+    _notify("reset")
+
+secure_db.add_session_hook(_on_session_change)
+
+_checkpoints = BalanceCheckpoints()
+add_ledger_listener(lambda event, payload: _checkpoints.on_ledger_event(_ledger_index, event, payload))
+
 # ─────────────────────────────────────────────────────────────────────────
 #  SERIAL: Global never-reused serial for related_id
 # ─────────────────────────────────────────────────────────────────────────
 def get_next_related_id(secure_db):
-    meta_table = secure_db.table("system_meta")
-    meta = meta_table.get(Query().key == "next_related_id")
-    if meta:
-        related_id = meta["val"]
-        meta_table.update({ "val": related_id + 1 }, Query().key == "next_related_id")
-    else:
-        related_id = 1
-        meta_table.insert({ "key": "next_related_id", "val": 2 })
-    return related_id
+    """
+    Hand out the next related_id.  IDs come from an in-memory block reserved
+    in `system_meta` (see handlers/serials.py), so most calls touch no disk.
+    """
+    return related_id_allocator.next_id(secure_db)
+
+secure_db.add_session_hook(related_id_allocator.reset)
 
 # ─────────────────────────────────────────────────────────────────────────
 #  DB bootstrap
@@ -94,27 +144,59 @@ def add_ledger_entry(
     """
     Add a new entry to the ledger.
     """
-    # PATCH: Auto-generate unique related_id if not supplied (new rows)
-    if related_id is None:
-        related_id = get_next_related_id(secure_db)
+    # Diagnostics: one bool check when off (see handlers/ledger_diag.py)
+    caller = ledger_diag.caller_tag() if ledger_diag.enabled else None
 
-    caller = inspect.stack()[1]
-    logger.debug(
-        "📨 add_ledger_entry called from %s:%s (%s)",
-        os.path.basename(caller.filename),
-        caller.lineno,
-        caller.function,
-    )
-    logger.debug(
-        "Arguments → acct=%s id=%s type=%s rel=%s amt=%s cur=%s",
-        account_type,
-        account_id,
-        entry_type,
-        related_id,
-        amount,
-        currency,
+    entry = build_entry(
+        account_type, account_id, entry_type, related_id, amount, currency,
+        note=note, date=date, timestamp=timestamp, item_id=item_id,
+        quantity=quantity, unit_price=unit_price, store_id=store_id,
+        fee_perc=fee_perc, fee_amt=fee_amt, fx_rate=fx_rate, usd_amt=usd_amt,
     )
+    related_id = entry["related_id"]
 
+    doc_id = None
+    try:
+        seal_entry(entry)
+        doc_id = secure_db.insert(LEDGER_TABLE, entry)
+        doc = Document(entry, doc_id)
+        _ledger_index.add(doc)
+        _notify("add", doc)
+        logger.info("📝 Ledger entry #%s saved.", doc_id)
+
+        if caller is not None:
+            ledger_diag.record_write(entry, doc_id, caller)
+
+        return related_id  # Return the unique serial for use in other tables!
+    except Exception:
+        if doc_id is None:
+            _chain.rewind(entry)
+        logger.exception("❌ Failed inserting ledger entry")
+
+
+def build_entry(
+    account_type: str,
+    account_id: int | str,
+    entry_type: str,
+    related_id: int | str | None,
+    amount: float,
+    currency: str,
+    note: str = "",
+    date: str | None = None,
+    timestamp: str | None = None,
+    item_id: str | int | None = None,
+    quantity: int | None = None,
+    unit_price: float | None = None,
+    store_id: int | str | None = None,
+    fee_perc: float | None = None,
+    fee_amt: float | None = None,
+    fx_rate: float | None = None,
+    usd_amt: float | None = None,
+) -> dict:
+    """The row add_ledger_entry() would write (not sealed, not stored)."""
+    # PATCH: Auto-generate unique related_id if not supplied (new rows)
+    if related_id is None:
+        related_id = get_next_related_id(secure_db)
     if date is None:
         date = datetime.now().strftime("%d%m%Y")
     if timestamp is None:
@@ -126,6 +208,7 @@ def add_ledger_entry(
         "entry_type":   entry_type,
         "related_id":   related_id,
         "amount":       amount,
+        "amount_minor": to_minor(amount, currency),
         "currency":     currency,
         "note":         note,
         "date":         date,
@@ -140,71 +223,262 @@ def add_ledger_entry(
     if fee_amt   is not None: entry["fee_amt"]   = fee_amt
     if fx_rate   is not None: entry["fx_rate"]   = fx_rate
     if usd_amt   is not None: entry["usd_amt"]   = usd_amt
+    return entry
 
-    logger.debug("Payload to persist: %s", entry)
 
+def write_ledger_entries(entries: list[dict]) -> list[int]:
+    """
+    Seal and insert *entries* (from build_entry) with ONE DB write.
+    Unlike add_ledger_entry() this raises on failure; nothing is written then.
+    """
+    if not entries:
+        return []
+    caller = ledger_diag.caller_tag() if ledger_diag.enabled else None
     try:
-        doc_id = secure_db.insert(LEDGER_TABLE, entry)
-        logger.info("📝 Ledger entry #%s saved.", doc_id)
+        for entry in entries:
+            seal_entry(entry)
+        doc_ids = secure_db.table(LEDGER_TABLE).insert_multiple(entries)
+    except Exception:
+        reset_chain_head()
+        raise
+    for entry, doc_id in zip(entries, doc_ids):
+        doc = Document(entry, doc_id)
+        _ledger_index.add(doc)
+        _notify("add", doc)
+        if caller is not None:
+            ledger_diag.record_write(entry, doc_id, caller)
+    logger.info("📝 Ledger entries %s saved.", doc_ids)
+    return doc_ids
 
-        # ========== LEDGER DEBUG SECTION ==========
-        #  This section prints every ledger entry to terminal after insert.
-        #  COMMENT OUT or REMOVE after diagnostic testing is complete!
-        print("\nLEDGER DEBUG WRITE:")
-        for k, v in entry.items():
-            print(f"  {k}: {v}")
-        print("--- END LEDGER DEBUG ---\n")
-        # ========== END LEDGER DEBUG SECTION ==========
 
-        return related_id  # Return the unique serial for use in other tables!
+def write_ledger_changes(entries: list[dict], removed=(), updates=(), deletes=()) -> list[int]:
+    """
+    One business operation in ONE DB write (secure_db.atomic_update): remove
+    the ledger rows *removed* (Documents; chained ones leave a tombstone),
+    insert *entries* (from build_entry), apply *updates* – (table, doc_id,
+    fields) – and *deletes* – (table, doc_id) – to the business tables.
+    An edit therefore never leaves its group half-replaced or its record out
+    of step with its legs.  Raises on failure; nothing is written then.
+    The session's derived ledger state is reset afterwards (see atomic_update).
+    """
+    caller = ledger_diag.caller_tag() if ledger_diag.enabled else None
+    stones = [tombstone(r) for r in removed if r.get("chain_seq") is not None]
+    drop = {str(r.doc_id) for r in removed}
+    doc_ids = []
+
+    def mutate(tables):
+        ledger = tables.setdefault(LEDGER_TABLE, {})
+        next_id = max((int(k) for k in ledger), default=0) + 1
+        for k in drop:
+            ledger.pop(k, None)
+        for entry in entries:
+            ledger[str(next_id)] = entry
+            doc_ids.append(next_id)
+            next_id += 1
+        graves = tables.setdefault(TOMBSTONE_TABLE, {})
+        next_grave = max((int(k) for k in graves), default=0) + 1
+        for t in stones:
+            graves[str(next_grave)] = t
+            next_grave += 1
+        for table, doc_id, fields in updates:
+            tables.setdefault(table, {})[str(doc_id)].update(fields)
+        for table, doc_id in deletes:
+            tables.setdefault(table, {}).pop(str(doc_id), None)
+
+    try:
+        for entry in entries:
+            seal_entry(entry)
+        secure_db.atomic_update(mutate)
     except Exception:
-        logger.exception("❌ Failed inserting ledger entry")
+        reset_chain_head()
+        raise
+    if caller is not None:
+        for entry, doc_id in zip(entries, doc_ids):
+            ledger_diag.record_write(entry, doc_id, caller)
+    logger.info("📝 Ledger entries %s saved, %s removed.", doc_ids, sorted(drop, key=int))
+    return doc_ids
+
+
+# ─────────────────────────────────────────────────────────────────────────
+#  Hash chain (see handlers/ledger_chain.py)
+# ─────────────────────────────────────────────────────────────────────────
+def _chain_head() -> ChainHead:
+    if not _chain.loaded:
+        idx = _index()
+        heads = [m["chain_head"] for m in archive_store.manifest() if m.get("chain_head")]
+        _chain.load([*idx.chained.rows[-1:], *secure_db.all(TOMBSTONE_TABLE), *heads])
+    return _chain
+
+
+def seal_entry(entry: dict) -> dict:
+    """Stamp chain_seq / chain_prev / chain_hash onto a row about to be written."""
+    return _chain_head().seal(entry)
+
+
+def reset_chain_head():
+    """Forget the cached head (after a write that sealed rows then failed)."""
+    _chain.reset()
 
 
 # ─────────────────────────────────────────────────────────────────────────
 #  Readers
 # ─────────────────────────────────────────────────────────────────────────
+def _index() -> LedgerIndex:
+    """The session's ledger index, loading it on first use."""
+    if not _ledger_index.built:
+        rows = secure_db.all(LEDGER_TABLE)
+        _ledger_index.build(rows)
+        logger.debug("Ledger index built (%d rows)", len(rows))
+    return _ledger_index
+
+
+def ledger_version() -> int:
+    """Bumped on every ledger write/delete and on lock/unlock (cache key)."""
+    return _ledger_index.version
+
+
+def data_version() -> tuple:
+    """
+    (ledger_version(), secure_db.version): changes on every ledger write and
+    on every secure_db insert / update / remove of any table (customers,
+    partners, stores …).  Key anything built from ledger + tables on this.
+    """
+    return _ledger_index.version, secure_db.version
+
+
+def _buckets(idx: LedgerIndex, acct_key, types):
+    if acct_key is not None:
+        return [idx.by_account.get(acct_key)]
+    if types is not None:
+        return [idx.by_type.get(t) for t in types]
+    return [idx.all]
+
+
+def iter_ledger(account_type: str | None = None,
+                account_id: int | str | None = None,
+                entry_types=None,
+                store_id: int | str | None = None,
+                item_id: int | str | None = None,
+                start=None,
+                end=None,
+                archives: bool = True,
+                as_entries: bool = False):
+    """
+    Lazily yield ledger entries in date order (date, timestamp).
+
+    Every argument is an optional filter.  `entry_types` is a str or an
+    iterable of str; `start` / `end` are inclusive whole-day bounds given as
+    datetime/date or 'DDMMYYYY'.  The narrowest index is picked first
+    (account, else entry type), date bounds are bisected, and the remaining
+    predicates are checked per row.  Yielded rows are shared – don't mutate.
+
+    When the range reaches back before a closed period (see
+    handlers/ledger_archive.py) the archived rows are merged in and the
+    `opening_balance` entries that summarise them are skipped.
+    archives=False reads the hot ledger only (openings included).
+    as_entries=True yields typed LedgerEntry objects (handlers/ledger_entry.py)
+    built from the rows instead of the shared dicts.
+    """
+    lo, hi = to_ordinal(start), to_ordinal(end)
+    if isinstance(entry_types, str):
+        entry_types = (entry_types,)
+    types = set(entry_types) if entry_types is not None else None
+
+    check_type = check_acct_type = check_acct_id = False
+    acct_key = None
+    if account_type is not None and account_id is not None:
+        acct_key = (account_type, str(account_id))
+        check_type = types is not None
+    else:
+        check_acct_type = account_type is not None
+        check_acct_id = account_id is not None
+
+    indexes = [_index()]
+    skip_openings = False
+    if archives:
+        cutoff = archive_store.cutoff()
+        if cutoff is not None and (lo is None or lo < cutoff):
+            indexes += archive_store.indexes_for(lo, hi)
+            skip_openings = True
+
+    spans = []
+    for idx in indexes:
+        for b in _buckets(idx, acct_key, types):
+            if b:
+                i, j = b.span(lo, hi)
+                if i < j:
+                    spans.append(zip(b.keys[i:j], b.rows[i:j]))
+    if not spans:
+        return
+    stream = spans[0] if len(spans) == 1 else heapq.merge(*spans, key=lambda kr: kr[0])
+
+    acct_id = str(account_id) if account_id is not None else None
+    store = str(store_id) if store_id is not None else None
+    item = str(item_id) if item_id is not None else None
+    for _, row in stream:
+        if check_type and row.get("entry_type") not in types:
+            continue
+        if skip_openings and row.get("entry_type") == OPENING_ENTRY:
+            continue
+        if check_acct_type and row.get("account_type") != account_type:
+            continue
+        if check_acct_id and str(row.get("account_id")) != acct_id:
+            continue
+        if store is not None and str(row.get("store_id")) != store:
+            continue
+        if item is not None and str(row.get("item_id")) != item:
+            continue
+        yield LedgerEntry.from_dict(row) if as_entries else row
+
+
 def get_ledger(account_type: str,
                account_id: int | str,
                start_date: str | None = None,
-               end_date: str | None = None) -> list:
+               end_date: str | None = None,
+               as_entries: bool = False) -> list:
     """
-    Get all ledger entries for an account, optionally filtered by date (DDMMYYYY).
+    Get all ledger entries for an account in date order, optionally filtered
+    by date (DDMMYYYY).  Thin list wrapper around iter_ledger(); as_entries
+    returns LedgerEntry objects.
     """
     logger.debug("Fetching ledger rows for %s:%s", account_type, account_id)
     try:
-        rows = [
-            r for r in secure_db.all(LEDGER_TABLE)
-            if r["account_type"] == account_type
-            and str(r["account_id"]) == str(account_id)
-        ]
+        rows = list(iter_ledger(account_type, account_id, start=start_date, end=end_date,
+                                as_entries=as_entries))
     except Exception:
         logger.exception("Failed to fetch ledger")
         return []
-
-    # Date filter if needed
-    if start_date or end_date:
-        def in_range(row):
-            try:
-                d = datetime.strptime(row["date"], "%d%m%Y")
-                if start_date and d < datetime.strptime(start_date, "%d%m%Y"):
-                    return False
-                if end_date and d > datetime.strptime(end_date, "%d%m%Y"):
-                    return False
-                return True
-            except Exception:
-                logger.exception("Bad date in row %s", row)
-                return False
-        rows = [r for r in rows if in_range(r)]
-
-    rows.sort(key=lambda r: (r["date"], r["timestamp"]))
     logger.debug("Retrieved %d rows", len(rows))
     return rows
 
 
-def get_balance(account_type: str, account_id: int | str) -> float:
+def get_account_totals(account_type: str,
+                       account_id: int | str,
+                       as_of=None) -> tuple[float, dict]:
+    """
+    (balance, {item_id: units}) for an account over all entries dated on or
+    before *as_of* (datetime/date/'DDMMYYYY'; None = everything).  Served from
+    the nearest balance checkpoint plus a short delta scan.
+    """
+    hi = to_ordinal(as_of)
+    cutoff = archive_store.cutoff()
+    if hi is not None and cutoff is not None and hi < cutoff - 1:
+        # before the opening entries – only the archive has the detail
+        minor, units = {}, {}
+        accumulate(iter_ledger(account_type, account_id, end=as_of), minor, units)
+        return minor_to_amount(minor), units
+
+    acct = (account_type, str(account_id))
+    bucket = _index().by_account.get(acct)
+    if not bucket:
+        return 0.0, {}
+    minor, units = _checkpoints.totals(bucket, acct, hi)
+    return minor_to_amount(minor), units
+
+
+def get_balance(account_type: str, account_id: int | str, as_of=None) -> float:
     try:
-        bal = sum(r["amount"] for r in get_ledger(account_type, account_id))
+        bal, _ = get_account_totals(account_type, account_id, as_of)
         logger.debug("Balance for %s:%s ⇒ %s", account_type, account_id, bal)
         return bal
     except Exception:
@@ -224,17 +498,59 @@ def delete_ledger_entries_by_related(account_type: str,
     logger.debug("Deleting ledger rows for rel=%s (%s:%s)",
                  related_id, account_type, account_id)
     try:
-        tbl = secure_db.table(LEDGER_TABLE)
-        to_delete = [
-            r.doc_id for r in tbl
-            if r["account_type"] == account_type
-            and str(r["account_id"]) == str(account_id)
-            and str(r.get("related_id", "")) == str(related_id)
+        rows = [
+            r for r in iter_ledger(account_type, account_id, archives=False)
+            if str(r.get("related_id", "")) == str(related_id)
         ]
+        to_delete = [r.doc_id for r in rows]
         if to_delete:
+            # tombstones first: a crash in between leaves an unused tombstone,
+            # never an unexplained hole in the chain
+            stones = [tombstone(r) for r in rows if r.get("chain_seq") is not None]
+            if stones:
+                secure_db.table(TOMBSTONE_TABLE).insert_multiple(stones)
             secure_db.remove(LEDGER_TABLE, to_delete)
+            _ledger_index.discard(to_delete)
+            _notify("delete", to_delete)
             logger.info("🗑️ Removed ledger rows %s", to_delete)
         else:
             logger.warning("No ledger rows matched (nothing removed)")
     except Exception:
         logger.exception("Ledger delete failed")
+
+
+# ─────────────────────────────────────────────────────────────────────────
+#  Replay (report workers)
+# ─────────────────────────────────────────────────────────────────────────
+def apply_ledger_changes(changes) -> int:
+    """
+    Replay ledger writes made in another process onto this one's copy – a
+    report worker keeping its ledger current (handlers/reports/workers.py).
+    *changes* are ("add", doc_id, row) / ("delete", [doc_ids]) in write
+    order; they reach the table, the index and the listeners like local
+    writes.  Adds of rows already present and deletes of absent ones are
+    skipped, so changes the copy already holds may be replayed.
+    Returns the number of changes applied.
+    """
+    table = secure_db.table(LEDGER_TABLE)
+    applied = 0
+    for change in changes:
+        if change[0] == "add":
+            _, doc_id, row = change
+            if table.contains(doc_id=doc_id):
+                continue
+            doc = Document(row, doc_id)
+            table.insert(doc)
+            _ledger_index.add(doc)
+            _notify("add", doc)
+        else:
+            gone = [d for d in change[1] if table.contains(doc_id=d)]
+            if not gone:
+                continue
+            table.remove(doc_ids=gone)
+            _ledger_index.discard(gone)
+            _notify("delete", gone)
+        applied += 1
+    if applied:
+        _chain.reset()      # re-read from the index on next use
+    return applied
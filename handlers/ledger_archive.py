@@ -0,0 +1,176 @@
+# handlers/ledger_archive.py
+"""
+Sealed archive segments for closed ledger periods.
+
+/closeperiod (handlers/period_close.py) moves ledger rows dated before a
+cutoff out of `ledger_entries` into a segment file:
+
+    data/archive/ledger-<first>-<last>-<sha8>.seg
+        = Fernet( zlib( JSON [[doc_id, row], …] ) )      – same key as the DB
+
+The file is written once, made read-only and its SHA-256 recorded in the
+`ledger_archives` manifest table (inside the encrypted DB):
+
+    {"file", "first_date", "last_date", "cutoff", "rows", "sha256", "created"}
+
+/changepin re-seals every segment under the new key, as new files
+(reseal_segments).
+
+In the hot ledger, every (account, currency, item, store) touched by archived
+rows is summarised by one `opening_balance` entry dated the day before the
+cutoff, so balances and stock totals never need the archive.
+
+Readers (handlers/ledger.iter_ledger) open segments lazily and only when a
+requested date range reaches back before the latest cutoff; they then use
+the archived rows instead of the opening entries.  Loaded segments are
+cached per unlocked session.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import zlib
+
+from tinydb.table import Document
+
+import config
+from handlers.ledger_index import LedgerIndex, date_ordinal
+
+logger = logging.getLogger("ledger.archive")
+
+ARCHIVE_DIR = getattr(config, "LEDGER_ARCHIVE_DIR", "data/archive")
+MANIFEST_TABLE = "ledger_archives"
+OPENING_ENTRY = "opening_balance"
+SEGMENT_SUFFIX = ".seg"
+
+
+class ArchiveError(RuntimeError):
+    pass
+
+
+# ─────────────────────────────────────────────────────────────────────────
+#  Segment files
+# ─────────────────────────────────────────────────────────────────────────
+def _write_segment(blob: bytes, first_date: str, last_date: str) -> tuple[str, str]:
+    sha = hashlib.sha256(blob).hexdigest()
+    name = f"ledger-{first_date}-{last_date}-{sha[:8]}{SEGMENT_SUFFIX}"
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    path = os.path.join(ARCHIVE_DIR, name)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    os.chmod(path, 0o444)
+    return name, sha
+
+
+def _read_segment(meta: dict) -> bytes:
+    path = os.path.join(ARCHIVE_DIR, meta["file"])
+    try:
+        with open(path, "rb") as f:
+            blob = f.read()
+    except OSError as e:
+        raise ArchiveError(f"Archive segment {meta['file']} is missing: {e}") from e
+    if hashlib.sha256(blob).hexdigest() != meta["sha256"]:
+        raise ArchiveError(f"Archive segment {meta['file']} failed its hash check")
+    return blob
+
+
+def seal_segment(rows, fernet, first_date: str, last_date: str) -> tuple[str, str]:
+    """
+    Write *rows* (Documents) as a sealed segment.  Returns (file name, sha256).
+    """
+    payload = json.dumps([[r.doc_id, dict(r)] for r in rows], separators=(",", ":"))
+    name, sha = _write_segment(fernet.encrypt(zlib.compress(payload.encode(), 9)),
+                               first_date, last_date)
+    logger.info("Sealed %d ledger rows into %s", len(rows), name)
+    return name, sha
+
+
+def open_segment(meta: dict, fernet) -> list:
+    """Read + verify one segment; returns its rows as Documents."""
+    rows = json.loads(zlib.decompress(fernet.decrypt(_read_segment(meta))))
+    return [Document(row, doc_id) for doc_id, row in rows]
+
+
+def reseal_segments(tables: dict, old_fernet, new_fernet) -> list[str]:
+    """
+    PIN change: re-encrypt every segment in the manifest of *tables* (raw
+    DB dict) under *new_fernet*, as new files.  The manifest rows in *tables*
+    are pointed at the new files / sha256; the old files stay until the
+    caller has written *tables* under the new key (a crash in between leaves
+    the old DB and its segments intact).  Returns the old file paths.
+    """
+    old = []
+    for meta in (tables.get(MANIFEST_TABLE) or {}).values():
+        payload = old_fernet.decrypt(_read_segment(meta))
+        name, sha = _write_segment(new_fernet.encrypt(payload), meta["first_date"], meta["last_date"])
+        old.append(os.path.join(ARCHIVE_DIR, meta["file"]))
+        meta["file"], meta["sha256"] = name, sha
+    if old:
+        logger.info("Re-sealed %d archive segment(s) under the new key", len(old))
+    return old
+
+
+def remove_segment_files(paths):
+    for path in paths:
+        try:
+            os.chmod(path, 0o644)
+            os.remove(path)
+        except OSError as e:
+            logger.warning("Could not remove old archive segment %s: %s", path, e)
+
+
+# ─────────────────────────────────────────────────────────────────────────
+#  Session cache: manifest + loaded segments
+# ─────────────────────────────────────────────────────────────────────────
+class ArchiveStore:
+    def __init__(self, db):
+        self._db = db
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._manifest = None   # list of manifest rows, oldest first
+            self._loaded = {}       # file → LedgerIndex
+
+    def manifest(self) -> list:
+        with self._lock:
+            if self._manifest is None:
+                rows = self._db.all(MANIFEST_TABLE) if self._db.is_unlocked() else []
+                self._manifest = sorted(rows, key=lambda m: date_ordinal(m["first_date"]))
+            return self._manifest
+
+    def cutoff(self) -> int | None:
+        """Ordinal of the latest cutoff (first day still in the hot ledger)."""
+        cuts = [date_ordinal(m["cutoff"]) for m in self.manifest()]
+        return max(cuts) if cuts else None
+
+    def indexes_for(self, lo: int | None, hi: int | None) -> list:
+        """LedgerIndex per segment overlapping [lo, hi] (None = open)."""
+        out = []
+        for meta in self.manifest():
+            if lo is not None and date_ordinal(meta["last_date"]) < lo:
+                continue
+            if hi is not None and date_ordinal(meta["first_date"]) > hi:
+                continue
+            out.append(self._segment(meta))
+        return out
+
+    def _segment(self, meta: dict) -> LedgerIndex:
+        with self._lock:
+            idx = self._loaded.get(meta["file"])
+            if idx is None:
+                idx = LedgerIndex()
+                idx.build(open_segment(meta, self._db.fernet))
+                self._loaded[meta["file"]] = idx
+                logger.debug("Loaded archive segment %s (%d rows)", meta["file"], len(idx.all))
+            return idx
+
+    def segment_files(self) -> list[str]:
+        return [os.path.join(ARCHIVE_DIR, m["file"]) for m in self.manifest()]
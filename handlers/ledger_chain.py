@@ -0,0 +1,113 @@
+# handlers/ledger_chain.py
+"""
+Hash chain over ledger writes.
+
+Every entry written by add_ledger_entry() (and every opening entry written
+by /closeperiod) is sealed before insert with three fields:
+
+    chain_seq   1, 2, 3 … in write order (never reused)
+    chain_prev  chain_hash of entry chain_seq − 1  (GENESIS for the first)
+    chain_hash  sha256(chain_prev + "|" + canonical JSON of the entry)
+
+Editing any field of a row, or re-ordering / dropping rows, breaks either
+the row's own hash or the next row's link.  Rows legitimately removed –
+rollbacks via delete_ledger_entries_by_related() and /closeperiod – leave a
+tombstone ({chain_seq, chain_prev, chain_hash, day}) in `ledger_tombstones`
+(archived rows are also still readable from their segment), so the chain
+stays verifiable across them.
+
+Rows written before the chain existed carry no chain fields and are
+reported as "unchained" by the verifier (handlers/integrity.py).
+"""
+
+import hashlib
+import json
+import threading
+
+GENESIS = "0" * 64
+TOMBSTONE_TABLE = "ledger_tombstones"
+CHAIN_FIELDS = ("chain_seq", "chain_prev", "chain_hash")
+
+
+def canonical(entry) -> bytes:
+    """Stable serialisation of an entry: sorted keys, chain_prev/hash excluded."""
+    body = {k: v for k, v in entry.items() if k not in ("chain_prev", "chain_hash")}
+    return json.dumps(body, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def entry_hash(prev: str, entry) -> str:
+    h = hashlib.sha256(prev.encode())
+    h.update(b"|")
+    h.update(canonical(entry))
+    return h.hexdigest()
+
+
+def write_day(entry) -> str:
+    """UTC day the entry was written ('YYYY-MM-DD'), from its timestamp."""
+    return str(entry.get("timestamp") or "")[:10]
+
+
+def merkle_root(hashes) -> str:
+    """Binary Merkle root of hex hashes (odd levels duplicate the last node)."""
+    level = [bytes.fromhex(h) for h in hashes]
+    if not level:
+        return GENESIS
+    while len(level) > 1:
+        if len(level) % 2:
+            level.append(level[-1])
+        level = [hashlib.sha256(level[i] + level[i + 1]).digest()
+                 for i in range(0, len(level), 2)]
+    return level[0].hex()
+
+
+def tombstone(row) -> dict:
+    return {
+        "chain_seq":  row["chain_seq"],
+        "chain_prev": row["chain_prev"],
+        "chain_hash": row["chain_hash"],
+        "day":        write_day(row),
+    }
+
+
+class ChainHead:
+    """
+    The (seq, hash) of the latest chained write, loaded once per session from
+    the hot ledger, the tombstones and the archive manifest.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.seq = None
+        self.hash = None
+
+    def load(self, candidates):
+        """*candidates*: iterable of dicts carrying chain_seq / chain_hash."""
+        seq, hsh = 0, GENESIS
+        for c in candidates:
+            s = c.get("chain_seq")
+            if s is not None and s > seq:
+                seq, hsh = s, c["chain_hash"]
+        self.seq, self.hash = seq, hsh
+
+    @property
+    def loaded(self) -> bool:
+        return self.seq is not None
+
+    def seal(self, entry: dict) -> dict:
+        """Stamp chain fields onto *entry* (in place) and advance the head."""
+        with self._lock:
+            entry["chain_seq"] = self.seq + 1
+            entry["chain_prev"] = self.hash
+            entry.pop("chain_hash", None)
+            entry["chain_hash"] = entry_hash(self.hash, entry)
+            self.seq, self.hash = entry["chain_seq"], entry["chain_hash"]
+            return entry
+
+    def rewind(self, entry: dict):
+        """Undo seal() after a failed insert (only if nothing was sealed since)."""
+        with self._lock:
+            if self.seq == entry.get("chain_seq"):
+                self.seq, self.hash = self.seq - 1, entry["chain_prev"]
@@ -0,0 +1,118 @@
+# handlers/ledger_checkpoints.py
+"""
+Per-account balance checkpoints over the in-memory ledger index.
+
+An account's rows sit in a date-sorted bucket (handlers/ledger_index.py).
+Every CHECKPOINT_EVERY rows a checkpoint records the running totals up to
+that point:
+
+  • pos     – number of bucket rows covered (rows[:pos])
+  • minor   – {currency: Σ amount_minor}
+  • units   – {item_id: Σ quantity}
+
+A balance as of any date is then the nearest checkpoint at or before it plus
+a delta scan of at most CHECKPOINT_EVERY rows – never the whole history.
+
+Checkpoints are created on demand as queries walk past them (so they follow
+the ledger as it grows), truncated from the insert position when a
+back-dated entry lands inside covered rows, and dropped for all accounts on
+delete and on lock/unlock.  They live in memory only: they are cheap to
+rebuild from the index, and persisting them would cost an encrypted
+full-file write each time.
+
+config.py knob (optional):
+    LEDGER_CHECKPOINT_EVERY = 256
+"""
+
+import threading
+from bisect import bisect_left, bisect_right
+
+import config
+from handlers.ledger_index import amount_minor, row_key
+from handlers.utils import from_minor
+
+CHECKPOINT_EVERY = int(getattr(config, "LEDGER_CHECKPOINT_EVERY", 256))
+
+
+class Checkpoint:
+    __slots__ = ("pos", "minor", "units")
+
+    def __init__(self, pos: int, minor: dict, units: dict):
+        self.pos = pos
+        self.minor = minor
+        self.units = units
+
+
+def accumulate(rows, minor: dict, units: dict):
+    for r in rows:
+        cur = r.get("currency")
+        minor[cur] = minor.get(cur, 0) + amount_minor(r)
+        qty = r.get("quantity")
+        if qty:
+            item = r.get("item_id")
+            units[item] = units.get(item, 0) + qty
+
+
+class BalanceCheckpoints:
+    def __init__(self, every: int = CHECKPOINT_EVERY):
+        if every < 1:
+            raise ValueError("every must be >= 1")
+        self.every = every
+        self._lock = threading.Lock()
+        self._by_account = {}   # (account_type, str(account_id)) → [Checkpoint]
+
+    def reset(self):
+        with self._lock:
+            self._by_account = {}
+
+    def row_added(self, index, row):
+        """Drop the account's checkpoints that cover the new row's position."""
+        acct = (row.get("account_type"), str(row.get("account_id")))
+        with self._lock:
+            cps = self._by_account.get(acct)
+            if not cps:
+                return
+            bucket = index.by_account.get(acct)
+            pos = bisect_left(bucket.keys, row_key(row)) if bucket else 0
+            while cps and cps[-1].pos > pos:
+                cps.pop()
+
+    def on_ledger_event(self, index, event, payload):
+        if event == "add":
+            self.row_added(index, payload)
+        else:  # delete / reset
+            self.reset()
+
+    def totals(self, bucket, acct, hi: int | None = None) -> tuple[dict, dict]:
+        """
+        ({currency: Σ minor}, {item_id: Σ qty}) over bucket rows whose date
+        ordinal is ≤ *hi* (all rows when None).
+        """
+        end = len(bucket) if hi is None else bisect_right(bucket.keys, (hi + 1,))
+        with self._lock:
+            cps = self._by_account.setdefault(acct, [])
+            # nearest checkpoint at or before `end`
+            i = len(cps)
+            while i and cps[i - 1].pos > end:
+                i -= 1
+            base = cps[i - 1] if i else None
+            pos = base.pos if base else 0
+            minor = dict(base.minor) if base else {}
+            units = dict(base.units) if base else {}
+            # extend the chain while walking forward (only past the last one)
+            if i == len(cps):
+                while pos + self.every <= end:
+                    accumulate(bucket.rows[pos:pos + self.every], minor, units)
+                    pos += self.every
+                    cps.append(Checkpoint(pos, dict(minor), dict(units)))
+        accumulate(bucket.rows[pos:end], minor, units)
+        return minor, units
+
+    def checkpoint_count(self, acct=None) -> int:
+        if acct is not None:
+            return len(self._by_account.get(acct, ()))
+        return sum(len(c) for c in self._by_account.values())
+
+
+def minor_to_amount(minor: dict) -> float:
+    return sum(from_minor(m, cur) for cur, m in minor.items())
@@ -0,0 +1,218 @@
+# handlers/ledger_columns.py
+"""
+Columnar, read-only mirror of `ledger_entries` for analytics.
+
+A ledger row is a dict repeating the same keys and a handful of distinct
+strings (account_type, entry_type, currency …).  Here every field lives in
+one packed array instead:
+
+  • categorical fields  → array('i') of codes + a small value table
+      account_type, entry_type, currency, account_id, store_id, item_id
+      (IDs are mixed int/str in the ledger, so they are coded on str(value))
+  • numeric fields      → array('d'), NaN where the optional field is absent
+      amount, quantity, unit_price, unit_cost, fee_perc, fee_amt, fx_rate,
+      usd_amt
+  • int32 fields        → array('i')
+      doc_id, related_id (-1 if not an int), date (ordinal, -1 if unparseable)
+  • int64 fields        → array('q')
+      amount_minor (exact; derived from amount for rows that predate it)
+
+Row order is insertion order (doc order), NOT date order – use the `date`
+column for windows.  The mirror is built from the ledger index on first use
+after an unlock, appended to on every add_ledger_entry(), rebuilt lazily
+after a delete and dropped on lock/unlock.
+
+    cols = ledger_columns()
+    amt  = cols.numeric("amount")
+    et   = cols.codes("entry_type")
+    sale = cols.code("entry_type", "sale")
+    total = sum(a for a, e in zip(amt, et) if e == sale)
+
+`cols.as_numpy(name)` returns a NumPy snapshot of a column when NumPy is
+present (a copy: a live view would pin the buffer and block appends).
+"""
+
+import math
+import threading
+from array import array
+
+from handlers.ledger import _index, add_ledger_listener, amount_minor
+from handlers.ledger_index import date_ordinal
+
+try:  # optional – only needed for as_numpy()
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+CATEGORICAL = ("account_type", "entry_type", "currency", "account_id", "store_id", "item_id")
+NUMERIC = ("amount", "quantity", "unit_price", "unit_cost", "fee_perc", "fee_amt", "fx_rate", "usd_amt")
+INTEGER = ("doc_id", "related_id", "date")
+INT64 = ("amount_minor",)
+
+MISSING = -1          # code / int value for an absent field
+NAN = math.nan
+
+_INT32_MAX = 2**31 - 1
+
+
+def _as_int32(value) -> int:
+    try:
+        v = int(value)
+    except (TypeError, ValueError):
+        return MISSING
+    return v if -_INT32_MAX <= v <= _INT32_MAX else MISSING
+
+
+def _as_float(value) -> float:
+    if value is None:
+        return NAN
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return NAN
+
+
+class Categories:
+    """Interned value table: value ⇄ small int code."""
+    __slots__ = ("values", "_codes")
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def intern(self, value) -> int:
+        if value is None:
+            return MISSING
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def code(self, value) -> int | None:
+        return None if value is None else self._codes.get(value)
+
+
+class LedgerColumns:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.built = False
+        self.generation = 0     # bumped whenever row positions are invalidated
+        self._clear()
+
+    def _clear(self):
+        self._cats = {f: Categories() for f in CATEGORICAL}
+        self._codes = {f: array("i") for f in CATEGORICAL}
+        self._num = {f: array("d") for f in NUMERIC}
+        self._int = {f: array("i") for f in INTEGER}
+        self._int.update({f: array("q") for f in INT64})
+
+    def __len__(self):
+        return len(self._int["doc_id"])
+
+    # ── maintenance ─────────────────────────────────────────────────────
+    def reset(self):
+        with self._lock:
+            self._clear()
+            self.built = False
+            self.generation += 1
+
+    def build(self, rows, archived=()):
+        """Archived rows (as given) first, then *rows* in doc order."""
+        with self._lock:
+            self._clear()
+            self.generation += 1
+            for row in archived:
+                self._append(row)
+            for row in sorted(rows, key=lambda r: r.doc_id):
+                self._append(row)
+            self.built = True
+
+    def append(self, row):
+        with self._lock:
+            if self.built:
+                self._append(row)
+
+    def _append(self, row):
+        for f in ("account_type", "entry_type", "currency"):
+            self._codes[f].append(self._cats[f].intern(row.get(f)))
+        for f in ("account_id", "store_id", "item_id"):
+            v = row.get(f)
+            self._codes[f].append(self._cats[f].intern(None if v is None else str(v)))
+        for f in NUMERIC:
+            self._num[f].append(_as_float(row.get(f)))
+        self._int["doc_id"].append(_as_int32(getattr(row, "doc_id", None)))
+        self._int["related_id"].append(_as_int32(row.get("related_id")))
+        self._int["date"].append(date_ordinal(row.get("date")))
+        self._int["amount_minor"].append(amount_minor(row))
+
+    def on_ledger_event(self, event, payload):
+        if event == "add":
+            self.append(payload)
+        else:  # delete / reset – positions shift, rebuild on next use
+            self.reset()
+
+    # ── accessors ───────────────────────────────────────────────────────
+    def codes(self, field: str) -> array:
+        return self._codes[field]
+
+    def categories(self, field: str) -> list:
+        """Code → value table for a categorical field (IDs are str)."""
+        return self._cats[field].values
+
+    def code(self, field: str, value) -> int | None:
+        """Code of *value* in a categorical field, None if never seen."""
+        if field in ("account_id", "store_id", "item_id") and value is not None:
+            value = str(value)
+        return self._cats[field].code(value)
+
+    def numeric(self, field: str) -> array:
+        return self._num[field]
+
+    def integers(self, field: str) -> array:
+        return self._int[field]
+
+    def column(self, field: str) -> array:
+        if field in self._num:
+            return self._num[field]
+        if field in self._int:
+            return self._int[field]
+        return self._codes[field]
+
+    def as_numpy(self, field: str):
+        """NumPy snapshot of a column (float64 / int32 / int64)."""
+        if np is None:
+            raise RuntimeError("NumPy is not installed")
+        col = self.column(field)
+        dtype = {"d": np.float64, "q": np.int64}.get(col.typecode, np.int32)
+        return np.frombuffer(col.tobytes(), dtype=dtype)
+
+    def sum_minor(self, rows=None) -> int:
+        """
+        Exact integer total of amount_minor, over all rows or the given
+        row positions (NumPy int64 when available).
+        """
+        col = self._int["amount_minor"]
+        if np is not None:
+            arr = np.frombuffer(col.tobytes(), dtype=np.int64)
+            return int(arr.sum() if rows is None else arr[np.asarray(rows, dtype=np.intp)].sum())
+        return sum(col) if rows is None else sum(col[i] for i in rows)
+
+    def nbytes(self) -> int:
+        cols = (*self._codes.values(), *self._num.values(), *self._int.values())
+        return sum(c.itemsize * len(c) for c in cols)
+
+
+_columns = LedgerColumns()
+add_ledger_listener(_columns.on_ledger_event)
+
+
+def ledger_columns() -> LedgerColumns:
+    """The session's columnar ledger mirror, built on first use."""
+    if not _columns.built:
+        idx = _index()
+        _columns.build(idx.all.rows)
+    return _columns
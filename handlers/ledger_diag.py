@@ -0,0 +1,105 @@
+# handlers/ledger_diag.py
+"""
+Ledger write diagnostics.
+
+Replaces the old inspect.stack() + print() debug block in add_ledger_entry.
+When diagnostics are OFF (the default) the writer only pays for one bool
+check.  When ON:
+
+  • the caller is tagged via sys._getframe (no source reads),
+  • a structured record is logged to "ledger.diag" (formatted lazily by
+    the logging framework, only if a handler actually emits it),
+  • the record is kept in an in-memory ring buffer, viewable with
+    /ledgerdiag.
+
+config.py knobs (both optional):
+    LEDGER_DIAGNOSTICS = False     # start with diagnostics on/off
+    LEDGER_DIAG_BUFFER = 200       # ring-buffer size
+"""
+
+import logging
+import os
+import sys
+from collections import deque
+
+from telegram import Update
+from telegram.ext import CommandHandler, ContextTypes
+
+import config
+from handlers.utils import require_unlock_and_admin
+
+logger = logging.getLogger("ledger.diag")
+
+enabled = bool(getattr(config, "LEDGER_DIAGNOSTICS", False))
+_recent = deque(maxlen=int(getattr(config, "LEDGER_DIAG_BUFFER", 200)))
+
+
+def set_enabled(on: bool):
+    global enabled
+    enabled = bool(on)
+    logger.info("Ledger diagnostics %s", "ON" if enabled else "OFF")
+
+
+def caller_tag(depth: int = 2) -> str:
+    """
+    'file.py:123 (func)' for the frame *depth* levels above this call.
+    depth=2 ⇒ the caller of the function that called caller_tag().
+    """
+    try:
+        f = sys._getframe(depth)
+    except ValueError:
+        return "?"
+    return f"{os.path.basename(f.f_code.co_filename)}:{f.f_lineno} ({f.f_code.co_name})"
+
+
+def record_write(entry: dict, doc_id, caller: str):
+    """Log + buffer one ledger write.  Only call when `enabled` is True."""
+    rec = {"doc_id": doc_id, "caller": caller, "entry": dict(entry)}
+    _recent.append(rec)
+    logger.debug("write #%s from %s: %s", doc_id, caller, entry,
+                 extra={"ledger_doc_id": doc_id, "ledger_caller": caller})
+
+
+def recent(n: int | None = None) -> list[dict]:
+    """Most recent buffered writes, newest last."""
+    rows = list(_recent)
+    return rows if n is None else rows[-n:]
+
+
+def clear():
+    _recent.clear()
+
+
+def _fmt_record(rec: dict) -> str:
+    e = rec["entry"]
+    return (
+        f"#{rec['doc_id']} {e.get('account_type')}:{e.get('account_id')} "
+        f"{e.get('entry_type')} rel={e.get('related_id')} "
+        f"{e.get('amount')} {e.get('currency')}  ← {rec['caller']}"
+    )
+
+
+# ─────────────────────────────────────────────────────────────────────────
+#  /ledgerdiag [on|off|clear|N]
+# ─────────────────────────────────────────────────────────────────────────
+@require_unlock_and_admin
+async def ledger_diag_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    arg = (context.args[0].lower() if context.args else "")
+    if arg in ("on", "off"):
+        set_enabled(arg == "on")
+        await update.message.reply_text(f"🩺 Ledger diagnostics {'ON' if enabled else 'OFF'}.")
+        return
+    if arg == "clear":
+        clear()
+        await update.message.reply_text("🧹 Ledger diagnostics buffer cleared.")
+        return
+
+    n = int(arg) if arg.isdigit() else 10
+    rows = recent(n)
+    head = f"🩺 Ledger diagnostics: {'ON' if enabled else 'OFF'} — {len(_recent)}/{_recent.maxlen} buffered"
+    body = "\n".join(_fmt_record(r) for r in rows) if rows else "(no writes recorded)"
+    await update.message.reply_text(f"{head}\n\n{body}"[:4096])
+
+
+def register_ledger_diag_handlers(app):
+    app.add_handler(CommandHandler("ledgerdiag", ledger_diag_command))
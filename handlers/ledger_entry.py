@@ -0,0 +1,157 @@
+# handlers/ledger_entry.py
+"""
+Typed, slotted view of one ledger row.
+
+Handlers used to read ledger rows as generic dicts –
+`e.get("quantity", 0)`, `e.get("unit_price", e.get("unit_cost", 0))` … –
+paying a hash lookup per field and a full dict per row.  LedgerEntry keeps
+the same fields in __slots__ with None defaults for the optional ones:
+
+    rows = get_ledger("store", sid, as_entries=True)      # or iter_ledger(…, as_entries=True)
+    qty  = sum(e.quantity or 0 for e in rows if e.entry_type == "stockin")
+
+The customer report reads its sales and payments this way.
+
+Converters:
+    LedgerEntry.from_dict(row)  – row may be a TinyDB Document (doc_id kept);
+                                  legacy `unit_cost` fills `unit_price`
+    entry.to_dict()             – the stored shape (absent optionals omitted;
+                                  a legacy row keeps `unit_cost` only)
+
+For gradual migration an entry also answers `e["amount"]` and
+`e.get("quantity", 0)` like the dict it replaces (None ⇒ default).
+"""
+
+REQUIRED = ("account_type", "account_id", "entry_type", "related_id",
+            "amount", "currency", "note", "date", "timestamp")
+OPTIONAL = ("item_id", "quantity", "unit_price", "store_id",
+            "fee_perc", "fee_amt", "fx_rate", "usd_amt", "amount_minor")
+FIELDS = REQUIRED + OPTIONAL
+_FIELD_SET = frozenset(FIELDS)
+
+
+class LedgerEntry:
+    __slots__ = FIELDS + ("doc_id", "extra", "_cost_alias")
+
+    account_type: str
+    account_id: int | str
+    entry_type: str
+    related_id: int | str | None
+    amount: float
+    currency: str
+    note: str
+    date: str                       # DDMMYYYY
+    timestamp: str                  # ISO-8601 (UTC)
+    item_id: int | str | None
+    quantity: int | float | None
+    unit_price: float | None
+    store_id: int | str | None
+    fee_perc: float | None
+    fee_amt: float | None
+    fx_rate: float | None
+    usd_amt: float | None
+    amount_minor: int | None        # exact amount in minor units
+    doc_id: int | None
+    extra: dict | None              # unknown keys, kept for round-trips
+    _cost_alias: bool               # unit_price was read from legacy unit_cost
+
+    def __init__(self, account_type: str, account_id, entry_type: str, related_id=None,
+                 amount: float = 0.0, currency: str = "", note: str = "",
+                 date: str = "", timestamp: str = "",
+                 item_id=None, quantity=None, unit_price=None, store_id=None,
+                 fee_perc=None, fee_amt=None, fx_rate=None, usd_amt=None,
+                 amount_minor=None, doc_id: int | None = None, extra: dict | None = None):
+        self.account_type = account_type
+        self.account_id = account_id
+        self.entry_type = entry_type
+        self.related_id = related_id
+        self.amount = amount
+        self.currency = currency
+        self.note = note
+        self.date = date
+        self.timestamp = timestamp
+        self.item_id = item_id
+        self.quantity = quantity
+        self.unit_price = unit_price
+        self.store_id = store_id
+        self.fee_perc = fee_perc
+        self.fee_amt = fee_amt
+        self.fx_rate = fx_rate
+        self.usd_amt = usd_amt
+        self.amount_minor = amount_minor
+        self.doc_id = doc_id
+        self.extra = extra
+        self._cost_alias = False
+
+    # ── converters ──────────────────────────────────────────────────────
+    @classmethod
+    def from_dict(cls, row, doc_id: int | None = None) -> "LedgerEntry":
+        get = row.get
+        e = cls.__new__(cls)
+        e.account_type = get("account_type")
+        e.account_id = get("account_id")
+        e.entry_type = get("entry_type")
+        e.related_id = get("related_id")
+        e.amount = get("amount", 0.0)
+        e.currency = get("currency", "")
+        e.note = get("note", "")
+        e.date = get("date", "")
+        e.timestamp = get("timestamp", "")
+        e.item_id = get("item_id")
+        e.quantity = get("quantity")
+        up = get("unit_price")
+        e._cost_alias = up is None and get("unit_cost") is not None
+        e.unit_price = get("unit_cost") if e._cost_alias else up
+        e.store_id = get("store_id")
+        e.fee_perc = get("fee_perc")
+        e.fee_amt = get("fee_amt")
+        e.fx_rate = get("fx_rate")
+        e.usd_amt = get("usd_amt")
+        e.amount_minor = get("amount_minor")
+        e.doc_id = doc_id if doc_id is not None else getattr(row, "doc_id", None)
+        e.extra = None
+        if not _FIELD_SET.issuperset(row):
+            e.extra = {k: v for k, v in row.items() if k not in _FIELD_SET}
+        return e
+
+    def to_dict(self) -> dict:
+        d = {f: getattr(self, f) for f in REQUIRED}
+        for f in OPTIONAL:
+            v = getattr(self, f)
+            if v is not None:
+                d[f] = v
+        if self._cost_alias:
+            del d["unit_price"]         # the row only had unit_cost (kept in extra)
+        if self.extra:
+            for k, v in self.extra.items():
+                d.setdefault(k, v)
+        return d
+
+    # ── dict compatibility ──────────────────────────────────────────────
+    def get(self, key, default=None):
+        if key in _FIELD_SET:
+            v = getattr(self, key)
+            return default if v is None else v
+        if key == "unit_cost":
+            return default if self.unit_price is None else self.unit_price
+        if self.extra:
+            return self.extra.get(key, default)
+        return default
+
+    def __getitem__(self, key):
+        v = self.get(key)
+        if v is None and key not in REQUIRED:
+            raise KeyError(key)
+        return v
+
+    def __eq__(self, other):
+        if not isinstance(other, LedgerEntry):
+            return NotImplemented
+        return self.doc_id == other.doc_id and self.to_dict() == other.to_dict()
+
+    __hash__ = None
+
+    def __repr__(self):
+        return (f"LedgerEntry(#{self.doc_id} {self.account_type}:{self.account_id} "
+                f"{self.entry_type} rel={self.related_id} {self.amount} {self.currency} "
+                f"{self.date})")
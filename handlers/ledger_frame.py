@@ -0,0 +1,189 @@
+# handlers/ledger_frame.py
+"""
+Vectorised ledger frame for report math.
+
+The owner report built its per-item unit / value / average tables and its
+per-currency totals row by row in Python, over lists gathered with one
+get_ledger() call per account.  LedgerFrame keeps the whole ledger –
+archived segments first, then the hot rows – as NumPy columns and answers
+those questions with masks and bincounts:
+
+    frame = ledger_frame()
+    m = frame.mask(entry_types="sale", accounts={"partner": partner_ids})
+    frame.item_sales(m)        # {item: {"units": n, "value": v}}
+    frame.currency_totals(m)   # {cur: {"local": x, "usd": y, "currency": cur}}
+    frame.group_sum("item_id", weights, m)
+
+The rows come from a LedgerColumns mirror (handlers/ledger_columns.py)
+owned by the frame: appended to on every ledger write, rebuilt after a
+delete, lock/unlock or period close.  The NumPy columns are growable
+buffers; ledger_frame() copies only the rows appended since the last call,
+so a refresh after a write is O(new rows) and queries stay vectorised at
+any ledger size.
+
+Category-coded fields (IDs, item, currency …) are compared on str(value),
+as in LedgerColumns; group keys come back as those strings.  Hot
+`opening_balance` rows are in the frame but no report mask selects them.
+"""
+
+import threading
+
+import numpy as np
+
+from handlers.ledger import _index, add_ledger_listener, archive_store
+from handlers.ledger_columns import INT64, MISSING, NUMERIC, LedgerColumns
+from handlers.ledger_index import to_ordinal
+
+_FIELDS = ("account_type", "entry_type", "currency", "account_id", "store_id",
+           "item_id", "date", *NUMERIC, *INT64)
+
+
+def _plain(x):
+    """NumPy scalar → int when integral, else float (report formatting)."""
+    x = float(x)
+    return int(x) if x.is_integer() else x
+
+
+class LedgerFrame:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.cols = LedgerColumns()
+        self._buf = {}          # field → NumPy buffer (capacity ≥ n)
+        self._n = 0
+        self._gen = None
+        self._archives = None
+
+    def on_ledger_event(self, event, payload):
+        self.cols.on_ledger_event(event, payload)
+
+    # ── refresh ─────────────────────────────────────────────────────────
+    def refresh(self) -> "LedgerFrame":
+        with self._lock:
+            segments = len(archive_store.manifest())
+            if not self.cols.built or self._archives != segments:
+                archived = [row for seg in archive_store.indexes_for(None, None)
+                            for row in seg.all.rows]
+                self.cols.build(_index().all.rows, archived)
+                self._archives = segments
+            with self.cols._lock:
+                if self.cols.generation != self._gen:
+                    self._buf, self._n, self._gen = {}, 0, self.cols.generation
+                n = len(self.cols)
+                if n > self._n:
+                    self._extend(n)
+        return self
+
+    def _extend(self, n):
+        for f in _FIELDS:
+            col = self.cols.column(f)
+            buf = self._buf.get(f)
+            if buf is None or len(buf) < n:
+                grown = np.empty(max(1024, 2 * n), dtype=np.dtype(col.typecode))
+                if buf is not None:
+                    grown[:self._n] = buf[:self._n]
+                buf = self._buf[f] = grown
+            # view of the array tail, copied out at once (a kept view would
+            # pin the array's buffer and block appends)
+            tail = np.frombuffer(col, dtype=buf.dtype, count=n - self._n,
+                                 offset=self._n * col.itemsize)
+            buf[self._n:n] = tail
+            del tail
+        self._n = n
+
+    def __len__(self):
+        return self._n
+
+    def col(self, field: str) -> np.ndarray:
+        return self._buf[field][:self._n] if self._n else np.empty(0, dtype=np.int32)
+
+    def _codes(self, field, values) -> list:
+        codes = (self.cols.code(field, v) for v in values)
+        return [c for c in codes if c is not None]
+
+    # ── selection ───────────────────────────────────────────────────────
+    def mask(self, entry_types=None, accounts: dict | None = None,
+             start=None, end=None) -> np.ndarray:
+        """
+        Boolean row mask.  `entry_types`: str or iterable; `accounts`:
+        {account_type: account_ids | None (any id)}; `start` / `end`:
+        inclusive whole-day bounds (rows with unparseable dates drop out).
+        """
+        m = np.ones(self._n, dtype=bool)
+        if entry_types is not None:
+            if isinstance(entry_types, str):
+                entry_types = (entry_types,)
+            m &= np.isin(self.col("entry_type"), self._codes("entry_type", entry_types))
+        if accounts is not None:
+            am = np.zeros(self._n, dtype=bool)
+            types, ids = self.col("account_type"), self.col("account_id")
+            for acct_type, acct_ids in accounts.items():
+                tc = self.cols.code("account_type", acct_type)
+                if tc is None:
+                    continue
+                sel = types == tc
+                if acct_ids is not None:
+                    sel &= np.isin(ids, self._codes("account_id", acct_ids))
+                am |= sel
+            m &= am
+        if start is not None or end is not None:
+            d = self.col("date")
+            m &= d >= 0
+            if start is not None:
+                m &= d >= to_ordinal(start)
+            if end is not None:
+                m &= d <= to_ordinal(end)
+        return m
+
+    def num(self, field: str, fill: float = 0.0) -> np.ndarray:
+        """Numeric column with absent values (NaN) replaced by *fill*."""
+        return np.nan_to_num(self.col(field), nan=fill)
+
+    # ── group-by ────────────────────────────────────────────────────────
+    def group_sum(self, field, weights, m, missing=None) -> dict:
+        """
+        {value of *field*: Σ weights} over the masked rows, keys in order of
+        first appearance; rows without the field are keyed *missing*.
+        """
+        keys = self.col(field)[m] + 1           # MISSING (-1) → bucket 0
+        if not len(keys):
+            return {}
+        w = np.asarray(weights)[m]
+        sums = np.bincount(keys, weights=w)
+        present, first = np.unique(keys, return_index=True)
+        labels = self.cols.categories(field)
+        out = {}
+        for k in present[np.argsort(first)]:
+            out[missing if k == 0 else labels[k - 1]] = sums[k]
+        return out
+
+    def item_sales(self, m) -> dict:
+        """{item_id: {"units": Σ|qty|, "value": Σ|qty × unit_price (else unit_cost)|}}."""
+        units = np.abs(self.num("quantity"))
+        price = self.col("unit_price")
+        price = np.where(np.isnan(price), self.num("unit_cost"), price)
+        value = np.abs(units * price)
+        u = self.group_sum("item_id", units, m, missing="?")
+        v = self.group_sum("item_id", value, m, missing="?")
+        return {iid: {"units": _plain(n), "value": float(v[iid])} for iid, n in u.items()}
+
+    def currency_totals(self, m) -> dict:
+        """{currency: {"local", "usd", "currency"}} – usd_amt, else amount for USD rows."""
+        amount = self.num("amount")
+        usd_amt = self.col("usd_amt")
+        usd_code = self.cols.code("currency", "USD")
+        cur = self.col("currency")
+        is_usd = (cur == MISSING) | (cur == (MISSING if usd_code is None else usd_code))
+        usd = np.where(np.isnan(usd_amt), np.where(is_usd, amount, 0.0), usd_amt)
+        local = self.group_sum("currency", amount, m, missing="USD")
+        conv = self.group_sum("currency", usd, m, missing="USD")
+        return {cur: {"local": float(x), "usd": float(conv[cur]), "currency": cur}
+                for cur, x in local.items()}
+
+
+_frame = LedgerFrame()
+add_ledger_listener(_frame.on_ledger_event)
+
+
+def ledger_frame() -> LedgerFrame:
+    """The session's ledger frame, refreshed to the current ledger."""
+    return _frame.refresh()
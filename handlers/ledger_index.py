@@ -0,0 +1,181 @@
+# handlers/ledger_index.py
+"""
+In-memory index over `ledger_entries`.
+
+TinyDB re-reads (and here: decrypts) the whole DB file for every .all(), so
+the ledger is loaded once per unlocked session and kept in date-sorted
+buckets:
+
+  • all rows
+  • per (account_type, str(account_id))
+  • per entry_type
+  • chained rows in write order (chain_seq, see handlers/ledger_chain.py)
+  • per str(related_id) – the legs of one transaction group (unordered)
+
+Every bucket is ordered by (date ordinal, timestamp, doc_id), which lets
+date windows be answered with a bisect instead of a scan.  The index is
+maintained on write/delete by handlers/ledger.py and dropped on lock/unlock.
+
+Rows are the cached TinyDB Documents themselves – treat them as read-only.
+"""
+
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+from functools import lru_cache
+
+from handlers.utils import to_minor
+
+
+@lru_cache(maxsize=8192)
+def date_ordinal(ddmmyyyy) -> int:
+    """'15062025' → date(2025, 6, 15).toordinal();  -1 if unparseable."""
+    try:
+        s = str(ddmmyyyy)
+        if len(s) != 8:
+            return -1
+        return date(int(s[4:8]), int(s[2:4]), int(s[0:2])).toordinal()
+    except (TypeError, ValueError):
+        return -1
+
+
+def to_ordinal(value) -> int | None:
+    """
+    Normalise a date bound to an ordinal.  Accepts None, datetime/date or a
+    'DDMMYYYY' string.  Times are ignored – bounds are whole days.
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date().toordinal()
+    if isinstance(value, date):
+        return value.toordinal()
+    o = date_ordinal(value)
+    if o < 0:
+        raise ValueError(f"Bad date bound {value!r} (expected DDMMYYYY)")
+    return o
+
+
+def amount_minor(row) -> int:
+    """Integer minor-unit amount of a ledger row (older rows: derived)."""
+    m = row.get("amount_minor")
+    return m if m is not None else to_minor(row.get("amount"), row.get("currency"))
+
+
+def row_key(row) -> tuple:
+    return (date_ordinal(row.get("date")), row.get("timestamp") or "", getattr(row, "doc_id", 0))
+
+
+class Bucket:
+    __slots__ = ("keys", "rows")
+
+    def __init__(self):
+        self.keys = []
+        self.rows = []
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, key, row):
+        if not self.keys or key >= self.keys[-1]:
+            self.keys.append(key)
+            self.rows.append(row)
+        else:  # back-dated entry
+            i = bisect_right(self.keys, key)
+            self.keys.insert(i, key)
+            self.rows.insert(i, row)
+
+    def discard(self, doc_ids: set):
+        keep = [i for i, r in enumerate(self.rows) if r.doc_id not in doc_ids]
+        self.keys = [self.keys[i] for i in keep]
+        self.rows = [self.rows[i] for i in keep]
+
+    def span(self, lo: int | None, hi: int | None) -> tuple[int, int]:
+        """Index range [i, j) of rows whose date ordinal is within [lo, hi]."""
+        if lo is None and hi is None:
+            return 0, len(self.rows)
+        # bad dates (ordinal -1) never match a date-bounded query
+        i = bisect_left(self.keys, (max(lo if lo is not None else 0, 0),))
+        j = len(self.keys) if hi is None else bisect_left(self.keys, (hi + 1,))
+        return i, j
+
+
+class LedgerIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.version = 0
+        self.built = False
+        self.all = Bucket()
+        self.by_account = {}
+        self.by_type = {}
+        self.chained = Bucket()
+        self.by_related = {}
+
+    def reset(self):
+        with self._lock:
+            self.built = False
+            self.all = Bucket()
+            self.by_account = {}
+            self.by_type = {}
+            self.chained = Bucket()
+            self.by_related = {}
+            self.version += 1
+
+    def build(self, rows):
+        with self._lock:
+            self.all = Bucket()
+            self.by_account = {}
+            self.by_type = {}
+            self.chained = Bucket()
+            self.by_related = {}
+            keyed = sorted(((row_key(r), r) for r in rows), key=lambda kr: kr[0])
+            for key, row in keyed:
+                self._place(key, row, chain=False)
+            chained = sorted((r for r in rows if r.get("chain_seq") is not None),
+                             key=lambda r: r["chain_seq"])
+            self.chained.keys = [(r["chain_seq"],) for r in chained]
+            self.chained.rows = chained
+            self.built = True
+            self.version += 1
+
+    def _place(self, key, row, chain=True):
+        self.all.add(key, row)
+        acct = (row.get("account_type"), str(row.get("account_id")))
+        self.by_account.setdefault(acct, Bucket()).add(key, row)
+        self.by_type.setdefault(row.get("entry_type"), Bucket()).add(key, row)
+        self.by_related.setdefault(str(row.get("related_id")), []).append(row)
+        seq = row.get("chain_seq") if chain else None
+        if seq is not None:
+            self.chained.add((seq,), row)
+
+    def add(self, row):
+        with self._lock:
+            if self.built:
+                self._place(row_key(row), row)
+            self.version += 1
+
+    def chained_since(self, seq: int) -> list:
+        """Chained rows with chain_seq > *seq*, in write order."""
+        with self._lock:
+            return self.chained.rows[bisect_right(self.chained.keys, (seq,)):]
+
+    def group(self, related_id) -> list:
+        """Rows sharing *related_id* (a copy; empty if none)."""
+        with self._lock:
+            return list(self.by_related.get(str(related_id), ()))
+
+    def discard(self, doc_ids):
+        doc_ids = set(doc_ids)
+        with self._lock:
+            if self.built:
+                rids = {str(r.get("related_id")) for r in self.all.rows if r.doc_id in doc_ids}
+                for rid in rids:
+                    rows = [r for r in self.by_related[rid] if r.doc_id not in doc_ids]
+                    if rows:
+                        self.by_related[rid] = rows
+                    else:
+                        del self.by_related[rid]
+                for bucket in (self.all, self.chained,
+                               *self.by_account.values(), *self.by_type.values()):
+                    bucket.discard(doc_ids)
+            self.version += 1
@@ -0,0 +1,174 @@
+# handlers/ledger_txn.py
+"""
+Write-time invariant checks for multi-leg ledger writes.
+
+A business operation (sale, payment, payout …) writes several legs under
+one related_id.  Written one add_ledger_entry() at a time, a crash or a bug
+between legs leaves a half-written group that only /verifyledger finds
+later.  LedgerTransaction buffers the legs instead:
+
+    with LedgerTransaction() as txn:
+        rid = txn.add("customer", cid, "payment", None, 100, "EUR", usd_amt=110)
+        txn.add("owner", "POT", "payment_recv", rid, 110, "USD")
+    # → both legs written with one DB write, or LedgerInvariantError
+
+While legs are added the transaction keeps, per related_id, the leg kinds
+seen, a leg count and the running Σ amount_minor per currency.  commit()
+checks every group with the same rules as the offline validator
+(handlers/verify_ledger.py check_group) – O(legs), cheap enough to leave on –
+and writes nothing if any group is malformed, e.g. a sale without its store
+leg or a payout whose owner leg is not −usd_amt.
+
+Groups whose related_id already has rows in the ledger (edits: stock-in
+qty/cost changes, re-added legs) are checked as continuations of the
+existing legs, looked up in the ledger index by related_id.
+
+Edits that replace a group queue the old legs and the record change in the
+same transaction, so a rejected edit changes nothing:
+
+    txn = LedgerTransaction()
+    txn.remove("customer", cid, rid); txn.remove("owner", "POT", rid)
+    txn.update_row("customer_payments", doc_id, {"local_amt": 120, …})
+    txn.add(…); txn.add(…)
+    txn.commit()    # checked with the old legs gone, then one atomic write
+
+Legs queued by remove() don't count as existing legs in the check.  A
+transaction that removes legs or touches business rows is written with
+write_ledger_changes() (one secure_db.atomic_update); plain inserts keep
+using write_ledger_entries().
+"""
+
+import logging
+
+from handlers.ledger import _index, build_entry, write_ledger_changes, write_ledger_entries
+from handlers.verify_ledger import Leg, Report, check_group, leg_kind
+
+logger = logging.getLogger("ledger.txn")
+
+
+class LedgerInvariantError(ValueError):
+    """A transaction group failed its write-time checks; nothing was written."""
+
+    def __init__(self, report: Report):
+        self.report = report
+        problems = "; ".join(
+            f"{reason} (rel={rid}{', ' + detail if detail else ''})"
+            for reason, examples in report.examples.items()
+            for rid, detail in examples
+        )
+        super().__init__(f"Ledger transaction rejected: {problems}")
+
+
+class _Group:
+    __slots__ = ("legs", "bits", "minor")
+
+    def __init__(self):
+        self.legs = []
+        self.bits = 0
+        self.minor = {}     # currency → running Σ amount_minor
+
+    def add(self, leg: Leg):
+        self.legs.append(leg)
+        self.bits |= leg.kind
+        self.minor[leg.currency] = self.minor.get(leg.currency, 0) + leg.minor
+
+
+class LedgerTransaction:
+    """Buffer ledger legs, check each related_id group, write all-or-nothing."""
+
+    def __init__(self):
+        self._entries = []
+        self._groups = {}       # str(related_id) → _Group
+        self._removed = []      # hot ledger rows to remove
+        self._updates = []      # (table, doc_id, fields)
+        self._deletes = []      # (table, doc_id)
+        self.doc_ids = None
+
+    def add(self, account_type, account_id, entry_type, related_id, amount, currency,
+            **optional):
+        """Same arguments as add_ledger_entry(); returns the leg's related_id."""
+        self._check_open()
+        entry = build_entry(account_type, account_id, entry_type, related_id,
+                            amount, currency, **optional)
+        kind = leg_kind(entry)
+        if not kind:
+            raise LedgerInvariantError(self._single_issue(
+                "unknown entry type", entry["related_id"], f"{account_type}:{entry_type}"))
+        self._entries.append(entry)
+        self._groups.setdefault(str(entry["related_id"]), _Group()).add(Leg(entry, kind))
+        return entry["related_id"]
+
+    def remove(self, account_type, account_id, related_id) -> int:
+        """Queue the hot legs of one account under *related_id* for removal."""
+        self._check_open()
+        queued = {r.doc_id for r in self._removed}
+        rows = [r for r in _index().group(related_id)
+                if r.get("account_type") == account_type
+                and str(r.get("account_id")) == str(account_id)
+                and r.doc_id not in queued]
+        self._removed += rows
+        return len(rows)
+
+    def update_row(self, table: str, doc_id: int, fields: dict):
+        """Queue an update of a business record, written with the legs."""
+        self._check_open()
+        self._updates.append((table, doc_id, dict(fields)))
+
+    def delete_row(self, table: str, doc_id: int):
+        """Queue the removal of a business record, written with the legs."""
+        self._check_open()
+        self._deletes.append((table, doc_id))
+
+    def _check_open(self):
+        if self.doc_ids is not None:
+            raise RuntimeError("Ledger transaction already committed")
+
+    def legs(self, related_id) -> int:
+        g = self._groups.get(str(related_id))
+        return len(g.legs) if g else 0
+
+    def net(self, related_id) -> dict:
+        """{currency: Σ amount_minor} over the buffered legs of *related_id*."""
+        g = self._groups.get(str(related_id))
+        return dict(g.minor) if g else {}
+
+    @staticmethod
+    def _single_issue(reason, rid, detail) -> Report:
+        report = Report()
+        report.issue(reason, rid, detail)
+        return report
+
+    def check(self) -> Report:
+        report = Report()
+        idx = _index()
+        removed = {r.doc_id for r in self._removed}
+        for rid, g in self._groups.items():
+            prior = 0
+            for row in idx.group(rid):
+                if row.doc_id not in removed:
+                    prior |= leg_kind(row)
+            check_group(rid, g.legs, prior, report)
+        return report
+
+    def commit(self) -> list[int]:
+        """Check every group and write all legs; raises LedgerInvariantError."""
+        if self.doc_ids is not None:
+            return self.doc_ids
+        report = self.check()
+        if not report.ok:
+            logger.warning("Rejected ledger transaction: %s", report.issues)
+            raise LedgerInvariantError(report)
+        if self._removed or self._updates or self._deletes:
+            self.doc_ids = write_ledger_changes(self._entries, self._removed,
+                                                self._updates, self._deletes)
+        else:
+            self.doc_ids = write_ledger_entries(self._entries)
+        return self.doc_ids
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        return False
@@ -14,7 +14,8 @@ from telegram.ext import (
 )
 from secure_db import secure_db
 from handlers.utils import require_unlock
-from handlers.ledger import add_ledger_entry, get_balance
+from handlers.ledger import get_balance
+from handlers.ledger_txn import LedgerTransaction
 
 # --- Import backup/restore actions from your backup module ---
 from handlers.backup import (
@@ -186,17 +187,18 @@ async def save_pot(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await show_owner_menu(update, context)
         return ConversationHandler.END
 
-    add_ledger_entry(
-        account_type="owner",
-        account_id="POT",
-        entry_type="pot_adjustment",
-        related_id=None,
-        amount=adj,
-        currency="USD",
-        note=note,
-        date=datetime.utcnow().strftime("%d%m%Y"),
-        timestamp=datetime.utcnow().isoformat(),
-    )
+    with LedgerTransaction() as txn:
+        txn.add(
+            account_type="owner",
+            account_id="POT",
+            entry_type="pot_adjustment",
+            related_id=None,
+            amount=adj,
+            currency="USD",
+            note=note,
+            date=datetime.utcnow().strftime("%d%m%Y"),
+            timestamp=datetime.utcnow().isoformat(),
+        )
     await update.callback_query.edit_message_text(
         "✅ POT adjustment recorded.",
         reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="owner_menu")]])
@@ -7,7 +7,6 @@
 # ────────────────────────────────────────────────────────────────
 import logging
 from datetime import datetime
-from collections import defaultdict
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import (
     ConversationHandler,
@@ -18,17 +17,11 @@ from telegram.ext import (
     filters,
 )
 from tinydb import Query
-from handlers.reports.report_utils import (
-    build_sales_summary,
-    build_partner_sales_summary,
-    get_global_store_inventory,
-    compute_partner_inventory,
-    get_inventory_to_reconcile
-)
-
 
 from handlers.utils   import require_unlock, fmt_money, fmt_date
-from handlers.ledger  import add_ledger_entry, get_ledger
+from handlers.ledger_txn import LedgerTransaction
+from handlers.stock_projection import stock_projection
+from handlers.reconciliation   import reconciliation
 from secure_db        import secure_db
 
 logger = logging.getLogger("partner_sales")
@@ -51,32 +44,9 @@ def _filter_by_time(rows: list[dict], period: str) -> list[dict]:
     return rows
 
 def calc_total_reconciliation_needed():
-    from handlers.ledger import get_ledger
-    needed = {}
-    partner_names = set(p["name"] for p in secure_db.all("partners"))
-    partner_cust_sales = {}
-    for cust in secure_db.all("customers"):
-        if cust["name"] in partner_names:
-            c_ledger = get_ledger("customer", cust.doc_id)
-            for e in c_ledger:
-                if e.get("entry_type") == "sale":
-                    iid = e.get("item_id")
-                    qty = abs(e.get("quantity", 0))
-                    partner_cust_sales[iid] = partner_cust_sales.get(iid, 0) + qty
-    partner_sales = {}
-    for p in secure_db.all("partners"):
-        p_ledger = get_ledger("partner", p.doc_id)
-        for e in p_ledger:
-            if e.get("entry_type") == "sale":
-                iid = e.get("item_id")
-                qty = abs(e.get("quantity", 0))
-                partner_sales[iid] = partner_sales.get(iid, 0) + qty
-    for iid, total in partner_cust_sales.items():
-        done = partner_sales.get(iid, 0)
-        unreconciled = total - done
-        if unreconciled > 0:
-            needed[iid] = unreconciled
-    return needed
+    """{item_id: units} sold to partner-named customers not yet covered by partner sales."""
+    return reconciliation.needed()
+
 def _format_psale_row(r):
     # Use related_id if present, else fallback to doc_id (for backward compatibility)
     ref = r.get("related_id", r.doc_id)
@@ -95,44 +65,12 @@ def _format_psale_row(r):
 # ║   LEDGER-BASED PARTNER INVENTORY CALCULATION                ║
 # ╚══════════════════════════════════════════════════════════════╝
 def calc_partner_inventory_from_ledger(partner_id):
-    """Return {item_id: available_qty, ...} for this partner from the ledger, including stockin deletes/edits."""
-    pledger = get_ledger("partner", partner_id)
-    cledger = get_ledger("customer", partner_id)
+    """Return {item_id: available_qty, ...} for this partner from the ledger, including stockin deletes/edits.
 
-    # 1. Track deletes and edits
-    deleted_ids = set(
-        e.get("related_id") for e in pledger if e.get("entry_type") == "stockin_delete"
-    )
-    edit_qty_map = {}
-    for e in pledger:
-        if e.get("entry_type") == "stockin_edit_qty":
-            edit_qty_map[e.get("related_id")] = e
-
-    # 2. Collect valid stockins with latest quantity from edits
-    stockin = {}
-    for e in pledger:
-        if e.get("entry_type") != "stockin":
-            continue
-        relid = e.get("related_id")
-        if relid in deleted_ids:
-            continue
-        iid = e.get("item_id")
-        qty = edit_qty_map.get(relid, {}).get("quantity", e.get("quantity", 0))
-        stockin[iid] = stockin.get(iid, 0) + qty
-
-    # 3. Subtract all customer account sales for this partner
-    for e in cledger:
-        if e.get("entry_type") == "sale":
-            iid = e.get("item_id")
-            stockin[iid] = stockin.get(iid, 0) - abs(e.get("quantity", 0))
-    # 4. Subtract all direct partner sales
-    for e in pledger:
-        if e.get("entry_type") == "sale":
-            iid = e.get("item_id")
-            stockin[iid] = stockin.get(iid, 0) - abs(e.get("quantity", 0))
-
-    # Remove 0/neg items (optional)
-    return {iid: qty for iid, qty in stockin.items() if qty > 0}
+    Served by the stock projection (handlers/stock_projection.py), which
+    folds stockin / edit / delete / sale events as they are written.
+    """
+    return stock_projection.inventory(partner_id)
 
 
 # ────────────────────────────────────────────────────────────────
@@ -191,21 +129,8 @@ async def psale_choose_partner(update: Update, context: ContextTypes.DEFAULT_TYP
     pid = int(update.callback_query.data.split("_")[-1])
     context.user_data.update({"ps_partner": pid, "ps_items": {}})
 
-    # --- Compute inventories, just like owner report ---
-    store_inventory = get_global_store_inventory(secure_db, get_ledger)  # {item_id: qty, ...}
-    partner_inventories = compute_partner_inventory(secure_db, get_ledger)  # {partner_id: {item_id: qty, ...}, ...}
-
-    # Combine all partners for system-wide, or just show for this partner:
-    # Here, we'll sum partner inventories (all partners) to match owner report logic:
-    partner_inventory_units = defaultdict(int)
-    for inv in partner_inventories.values():
-        for iid, qty in inv.items():
-            partner_inventory_units[iid] += qty
-    # OR: for just this partner, use partner_inventories[pid]
-
-    store_inventory_units = {iid: qty for iid, qty in store_inventory.items() if qty > 0}
-
-    to_reconcile = get_inventory_to_reconcile(partner_inventory_units, store_inventory_units)
+    # --- Partner inventory − store inventory, from the reconciliation tracker ---
+    to_reconcile = reconciliation.inventory_to_reconcile()
 
     # --- Display Inventory to Reconcile (matches owner report) ---
     if to_reconcile:
@@ -326,6 +251,7 @@ async def psale_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.info("Partner-sale confirm: partner=%s items=%s", pid, items)
 
     inserted_ids: list[tuple[str, int, int, int]] = []   # [(item_id, doc_id, qty, related_id)]
+    txn = LedgerTransaction()
     try:
         inv_now = calc_partner_inventory_from_ledger(pid)
         for iid, det in items.items():
@@ -338,8 +264,8 @@ async def psale_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
             if available < qty:
                 raise Exception(f"Insufficient stock for '{iid}'. Have {available}, need {qty}.")
 
-            # 1. Create LEDGER entry FIRST to get related_id
-            related_id = add_ledger_entry(
+            # 1. Buffer LEDGER entry FIRST to get related_id
+            related_id = txn.add(
                 account_type="partner",
                 account_id=pid,
                 entry_type="sale",
@@ -368,7 +294,7 @@ async def psale_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
             inserted_ids.append((iid, sale_doc_id, qty, related_id))
 
             # 3. Owner ledger, linked with same related_id
-            add_ledger_entry(
+            txn.add(
                 account_type="owner",
                 account_id=OWNER_ACCOUNT_ID,
                 entry_type="partner_sale",
@@ -381,6 +307,9 @@ async def psale_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 quantity=qty,
                 unit_price=unit_price,
             )
+
+        # 4. Check every item's group and write all legs at once
+        txn.commit()
     except Exception as e:
         # ── Rollback everything for this confirm action ──
         logger.error("Partner-sale ERROR, rolling back: %s", e, exc_info=True)
@@ -746,8 +675,11 @@ async def confirm_delete_psale(update: Update, context: ContextTypes.DEFAULT_TYP
         return ConversationHandler.END
 
     try:
+        # Row removal, inventory restore and reversal legs go in one write
+        txn = LedgerTransaction()
+
         # 1️⃣ remove partner_sales row
-        secure_db.remove("partner_sales", [sid])
+        txn.delete_row("partner_sales", sid)
 
         # 2️⃣ restore partner inventory (legacy only, if needed)
         Q   = Query()
@@ -755,13 +687,12 @@ async def confirm_delete_psale(update: Update, context: ContextTypes.DEFAULT_TYP
             (Q.partner_id == rec["partner_id"]) & (Q.item_id == rec["item_id"])
         )
         if row:
-            secure_db.update("partner_inventory",
-                             {"quantity": row["quantity"] + rec["quantity"]},
-                             [row.doc_id])
+            txn.update_row("partner_inventory", row.doc_id,
+                           {"quantity": row["quantity"] + rec["quantity"]})
 
         # 3️⃣ reverse LEDGER entries (credit owner, debit partner) — use related_id=rid
         total_value = rec["quantity"] * rec["unit_price"]
-        add_ledger_entry(
+        txn.add(
             account_type="partner",
             account_id=rec["partner_id"],
             entry_type="sale_delete",
@@ -774,7 +705,7 @@ async def confirm_delete_psale(update: Update, context: ContextTypes.DEFAULT_TYP
             quantity=rec["quantity"],
             unit_price=rec["unit_price"],
         )
-        add_ledger_entry(
+        txn.add(
             account_type="owner",
             account_id=OWNER_ACCOUNT_ID,
             entry_type="partner_sale_delete",
@@ -787,6 +718,7 @@ async def confirm_delete_psale(update: Update, context: ContextTypes.DEFAULT_TYP
             quantity=rec["quantity"],
             unit_price=rec["unit_price"],
         )
+        txn.commit()
 
     except Exception as e:
         logger.error("Delete partner sale failed: %s", e, exc_info=True)
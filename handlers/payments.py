@@ -16,7 +16,7 @@ from telegram.ext import (
 )
 
 from handlers.utils import require_unlock, fmt_money, fmt_date
-from handlers.ledger import add_ledger_entry, delete_ledger_entries_by_related
+from handlers.ledger_txn import LedgerTransaction
 from secure_db import secure_db
 from tinydb import Query
 
@@ -256,8 +256,10 @@ async def confirm_add_payment(update: Update,
     payment_id = None
 
     try:
-        # 1. Write ledger for customer (local currency, related_id=None)
-        related_id = add_ledger_entry(
+        # 1+2. Customer leg (local currency) and owner leg (USD/POT) under one
+        #      related_id, checked and written together
+        txn = LedgerTransaction()
+        related_id = txn.add(
             account_type="customer",
             account_id=d["customer_id"],
             entry_type="payment",
@@ -271,8 +273,7 @@ async def confirm_add_payment(update: Update,
             fx_rate=fx,
             usd_amt=d["usd_amt"]
         )
-        # 2. Write ledger for owner (USD/POT, same related_id)
-        add_ledger_entry(
+        txn.add(
             account_type="owner",
             account_id="POT",
             entry_type="payment_recv",
@@ -286,6 +287,7 @@ async def confirm_add_payment(update: Update,
             fx_rate=fx,
             usd_amt=d["usd_amt"]
         )
+        txn.commit()
         # 3. Insert payment record with related_id
         payment_id = secure_db.insert("customer_payments", {
             "customer_id": d["customer_id"],
@@ -634,24 +636,21 @@ async def edit_save(update: Update, context: ContextTypes.DEFAULT_TYPE):
     cur = _cust_currency(cid)
     d = context.user_data
 
-    # Save new values to DB (using doc_id)
-    secure_db.update("customer_payments", {
-        "local_amt": d["new_local"],
-        "fee_perc":  d["new_fee"],
-        "usd_amt":   d["new_usd"],
-        "date":      d["new_date"],
-    }, [rec.doc_id])
-
     try:
-        # Remove ledger entries by related_id
-        delete_ledger_entries_by_related("customer", cid, rid)
-        delete_ledger_entries_by_related("owner", "POT", rid)
-
         fee_amt = d["new_local"] * d["new_fee"] / 100
         fx      = (d["new_local"] - fee_amt) / d["new_usd"] if d["new_usd"] else 0
 
-        # Re-add ledger with updated values (using related_id for linkage)
-        add_ledger_entry(
+        # Replace the ledger legs and update the record in one checked write
+        txn = LedgerTransaction()
+        txn.remove("customer", cid, rid)
+        txn.remove("owner", "POT", rid)
+        txn.update_row("customer_payments", rec.doc_id, {
+            "local_amt": d["new_local"],
+            "fee_perc":  d["new_fee"],
+            "usd_amt":   d["new_usd"],
+            "date":      d["new_date"],
+        })
+        txn.add(
             account_type="customer",
             account_id=cid,
             entry_type="payment",
@@ -665,7 +664,7 @@ async def edit_save(update: Update, context: ContextTypes.DEFAULT_TYPE):
             fx_rate=fx,
             usd_amt=d["new_usd"]
         )
-        add_ledger_entry(
+        txn.add(
             account_type="owner",
             account_id="POT",
             entry_type="payment_recv",
@@ -679,6 +678,7 @@ async def edit_save(update: Update, context: ContextTypes.DEFAULT_TYPE):
             fx_rate=fx,
             usd_amt=d["new_usd"]
         )
+        txn.commit()
     except Exception as e:
         logger.error(f"Ledger update failed for payment {rid}: {e}")
         await update.callback_query.edit_message_text(
@@ -831,14 +831,16 @@ async def del_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
     cid = rec["customer_id"]
     rid = context.user_data["del_rid"]
 
-    secure_db.remove("customer_payments", [rec.doc_id])
     try:
-        delete_ledger_entries_by_related("customer", cid, rid)
-        delete_ledger_entries_by_related("owner", "POT", rid)
+        txn = LedgerTransaction()
+        txn.remove("customer", cid, rid)
+        txn.remove("owner", "POT", rid)
+        txn.delete_row("customer_payments", rec.doc_id)
+        txn.commit()
     except Exception as e:
         logger.error(f"Ledger delete failed for payment {rid}: {e}")
         await update.callback_query.edit_message_text(
-            "❌ Error: Failed to update ledger. Payment deleted in DB but not in ledger.",
+            "❌ Error: Failed to update ledger. Payment not deleted.",
             reply_markup=InlineKeyboardMarkup(
                 [[InlineKeyboardButton("🔙 Back", callback_data="payment_menu")]]
             ),
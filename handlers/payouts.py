@@ -20,7 +20,8 @@ from telegram.ext import (
 )
 from tinydb import Query
 from handlers.utils import require_unlock, fmt_money, fmt_date
-from handlers.ledger import add_ledger_entry, delete_ledger_entries_by_related
+from handlers.ledger import delete_ledger_entries_by_related
+from handlers.ledger_txn import LedgerTransaction
 from secure_db import secure_db
 
 logger = logging.getLogger("payouts")
@@ -201,8 +202,9 @@ async def confirm_add_payout(update: Update, context: ContextTypes.DEFAULT_TYPE)
     payout_id = None
     ledger_related_id = None
     try:
-        # 1️⃣ Write partner ledger entry FIRST, get unique related_id
-        ledger_related_id = add_ledger_entry(
+        # 1️⃣ Partner ledger entry FIRST, get unique related_id
+        txn = LedgerTransaction()
+        ledger_related_id = txn.add(
             account_type="partner",
             account_id=d["partner_id"],
             entry_type="payment",
@@ -217,8 +219,9 @@ async def confirm_add_payout(update: Update, context: ContextTypes.DEFAULT_TYPE)
             fx_rate=fx,
             usd_amt=d["usd_amt"],
         )
-        # 2️⃣ Write owner's ledger entry, link with same related_id
-        add_ledger_entry(
+        # 2️⃣ Owner's ledger entry, same related_id; both legs are checked
+        #    (owner leg = −usd_amt) and written together
+        txn.add(
             account_type="owner",
             account_id=OWNER_ACCOUNT_ID,
             entry_type="payout_sent",
@@ -233,6 +236,7 @@ async def confirm_add_payout(update: Update, context: ContextTypes.DEFAULT_TYPE)
             fx_rate=fx,
             usd_amt=d["usd_amt"],
         )
+        txn.commit()
         # 3️⃣ Write payout row in DB, store related_id for future UI/edits
         payout_id = secure_db.insert("partner_payouts", {
             "partner_id": d["partner_id"],
@@ -249,7 +253,7 @@ async def confirm_add_payout(update: Update, context: ContextTypes.DEFAULT_TYPE)
     except Exception as e:
         logger.error(f"Payout ledger write failed: {e}", exc_info=True)
         # Roll back ledger and DB insert if any
-        if ledger_related_id is not None:
+        if ledger_related_id is not None and txn.doc_ids is not None:
             delete_ledger_entries_by_related("partner", d["partner_id"], ledger_related_id)
             delete_ledger_entries_by_related("owner", OWNER_ACCOUNT_ID, ledger_related_id)
         if payout_id is not None:
@@ -524,19 +528,17 @@ async def edit_save_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
     partner_id = rec["partner_id"]
     update_fields = context.user_data["update_fields"]
 
-    # Remove old ledger entries
-    delete_ledger_entries_by_related("partner", partner_id, related_id)
-    delete_ledger_entries_by_related("owner", OWNER_ACCOUNT_ID, related_id)
-
-    # Update DB
-    secure_db.update("partner_payouts", update_fields, [doc_id])
-
-    # Insert new ledger entries
+    # The record as it will be saved
     cur = _partner_currency(partner_id)
-    payout = secure_db.table("partner_payouts").get(doc_id=doc_id)
+    payout = {**secure_db.table("partner_payouts").get(doc_id=doc_id), **update_fields}
     try:
+        # Old legs out, record update and new legs in – one checked write
+        txn = LedgerTransaction()
+        txn.remove("partner", partner_id, related_id)
+        txn.remove("owner", OWNER_ACCOUNT_ID, related_id)
+        txn.update_row("partner_payouts", doc_id, update_fields)
         # Partner ledger entry
-        add_ledger_entry(
+        txn.add(
             account_type="partner",
             account_id=partner_id,
             entry_type="payment",
@@ -552,7 +554,7 @@ async def edit_save_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
             usd_amt=payout.get("usd_amt", 0),
         )
         # Owner ledger entry
-        add_ledger_entry(
+        txn.add(
             account_type="owner",
             account_id=OWNER_ACCOUNT_ID,
             entry_type="payout_sent",
@@ -567,6 +569,7 @@ async def edit_save_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
             fx_rate=payout.get("fx_rate", 0),
             usd_amt=payout.get("usd_amt", 0),
         )
+        txn.commit()
         await update.callback_query.edit_message_text("✅ Payout updated.", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="payout_menu")]]))
     except Exception as e:
         logger.error(f"Failed to update payout: {e}")
@@ -702,11 +705,12 @@ async def confirm_delete_payout(update: Update, context: ContextTypes.DEFAULT_TY
     doc_id = rec.doc_id
 
     try:
-        # Remove from ledger (both partner and owner accounts)
-        delete_ledger_entries_by_related("partner", partner_id, related_id)
-        delete_ledger_entries_by_related("owner", OWNER_ACCOUNT_ID, related_id)
-        # Remove payout row
-        secure_db.remove("partner_payouts", [doc_id])
+        # Ledger legs (partner and owner) and payout row go in one write
+        txn = LedgerTransaction()
+        txn.remove("partner", partner_id, related_id)
+        txn.remove("owner", OWNER_ACCOUNT_ID, related_id)
+        txn.delete_row("partner_payouts", doc_id)
+        txn.commit()
         await update.callback_query.edit_message_text("✅ Payout deleted.", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="payout_menu")]]))
     except Exception as e:
         logger.error(f"Failed to delete payout: {e}")
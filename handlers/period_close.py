@@ -0,0 +1,216 @@
+# handlers/period_close.py
+"""
+/closeperiod DDMMYYYY – archive ledger rows dated before the cutoff.
+
+  1. rows dated < cutoff (plus the previous period's opening entries) are
+     summed per (account_type, account_id, currency, item_id, store_id)
+  2. the rows are sealed into an encrypted segment (handlers/ledger_archive.py)
+  3. in ONE DB write: the rows leave `ledger_entries`, one `opening_balance`
+     entry per non-zero group is added (dated the day before the cutoff),
+     the segment is recorded in the `ledger_archives` manifest and the
+     superseded opening entries get chain tombstones
+
+Rows with an unparseable date stay in the hot ledger.  The command shows a
+preview first and only closes on the ✅ button.
+"""
+
+import logging
+from datetime import date, datetime
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.ext import CallbackQueryHandler, CommandHandler, ContextTypes
+
+from secure_db import secure_db
+from handlers.utils import require_unlock_and_admin, from_minor
+from handlers.ledger import (
+    LEDGER_TABLE, _index, archive_store, get_next_related_id, reset_chain_head, seal_entry,
+)
+from handlers.ledger_archive import MANIFEST_TABLE, OPENING_ENTRY, seal_segment
+from handlers.ledger_chain import TOMBSTONE_TABLE, tombstone
+from handlers.ledger_index import amount_minor, date_ordinal, to_ordinal
+
+logger = logging.getLogger("ledger.archive")
+
+
+def _ddmmyyyy(ordinal: int) -> str:
+    return date.fromordinal(ordinal).strftime("%d%m%Y")
+
+
+def _rows_to_close(cutoff_ord: int):
+    idx = _index()
+    i, j = idx.all.span(0, cutoff_ord - 1)   # lo=0 keeps bad-date rows hot
+    rows = idx.all.rows[i:j]
+    archived = [r for r in rows if r.get("entry_type") != OPENING_ENTRY]
+    old_openings = [r for r in rows if r.get("entry_type") == OPENING_ENTRY]
+    return archived, old_openings
+
+
+def preview_close(cutoff) -> dict:
+    co = to_ordinal(cutoff)
+    archived, old_openings = _rows_to_close(co)
+    accounts = {(r.get("account_type"), str(r.get("account_id"))) for r in archived}
+    return {"rows": len(archived), "openings": len(old_openings), "accounts": len(accounts)}
+
+
+def close_period(cutoff) -> dict:
+    """
+    Archive every ledger row dated before *cutoff* (datetime/date/'DDMMYYYY').
+    Returns a summary dict; raises ValueError if there is nothing to close.
+    """
+    co = to_ordinal(cutoff)
+    if co is None:
+        raise ValueError("A cutoff date is required")
+    current = archive_store.cutoff()
+    if current is not None and co <= current:
+        raise ValueError(f"Ledger is already closed up to {_ddmmyyyy(current - 1)}")
+
+    archived, old_openings = _rows_to_close(co)
+    if not archived:
+        raise ValueError("No ledger entries before the cutoff")
+
+    # 1) opening entries: one per (account, currency, item, store)
+    groups = {}
+    for r in (*old_openings, *archived):
+        key = (r.get("account_type"), r.get("account_id"), r.get("currency"),
+               r.get("item_id"), r.get("store_id"))
+        g = groups.setdefault(key, [0, 0])
+        g[0] += amount_minor(r)
+        g[1] += r.get("quantity") or 0
+
+    cutoff_str = _ddmmyyyy(co)
+    opening_date = _ddmmyyyy(co - 1)
+    now = datetime.utcnow().isoformat()
+    openings = []
+    for (acct_type, acct_id, cur, item_id, store_id), (minor, qty) in groups.items():
+        if not minor and not qty:
+            continue
+        entry = {
+            "account_type": acct_type,
+            "account_id":   acct_id,
+            "entry_type":   OPENING_ENTRY,
+            "related_id":   get_next_related_id(secure_db),
+            "amount":       from_minor(minor, cur),
+            "amount_minor": minor,
+            "currency":     cur,
+            "note":         f"Opening balance at {cutoff_str}",
+            "date":         opening_date,
+            "timestamp":    now,
+        }
+        if item_id is not None:  entry["item_id"] = item_id
+        if qty:                  entry["quantity"] = qty
+        if store_id is not None: entry["store_id"] = store_id
+        openings.append(entry)
+
+    # 2) seal the segment before touching the DB – a crash here only
+    #    leaves an unreferenced file behind
+    removed = (*archived, *old_openings)
+    chained = [r for r in removed if r.get("chain_seq") is not None]
+    head = max(chained, key=lambda r: r["chain_seq"], default=None)
+    first = min(date_ordinal(r.get("date")) for r in archived)
+    last = max(date_ordinal(r.get("date")) for r in archived)
+    fname, sha = seal_segment(archived, secure_db.fernet, _ddmmyyyy(first), _ddmmyyyy(last))
+    meta = {
+        "file":       fname,
+        "first_date": _ddmmyyyy(first),
+        "last_date":  _ddmmyyyy(last),
+        "cutoff":     cutoff_str,
+        "rows":       len(archived),
+        "sha256":     sha,
+        "created":    now,
+    }
+    if head is not None:
+        meta["chain_head"] = {"chain_seq": head["chain_seq"], "chain_hash": head["chain_hash"]}
+    stones = [tombstone(r) for r in old_openings if r.get("chain_seq") is not None]
+
+    # 3) one atomic DB write
+    drop = {str(r.doc_id) for r in removed}
+
+    def mutate(tables):
+        ledger = tables.setdefault(LEDGER_TABLE, {})
+        next_id = max((int(k) for k in ledger), default=0) + 1
+        for k in drop:
+            ledger.pop(k, None)
+        for entry in openings:
+            ledger[str(next_id)] = entry
+            next_id += 1
+        manifest = tables.setdefault(MANIFEST_TABLE, {})
+        manifest[str(max((int(k) for k in manifest), default=0) + 1)] = meta
+        graves = tables.setdefault(TOMBSTONE_TABLE, {})
+        next_grave = max((int(k) for k in graves), default=0) + 1
+        for t in stones:
+            graves[str(next_grave)] = t
+            next_grave += 1
+
+    try:
+        for entry in openings:
+            seal_entry(entry)
+        secure_db.atomic_update(mutate)
+    except Exception:
+        reset_chain_head()
+        raise
+    logger.info("Closed ledger before %s: %d rows → %s, %d opening entries",
+                cutoff_str, len(archived), fname, len(openings))
+    return {"file": fname, "rows": len(archived), "openings": len(openings),
+            "cutoff": cutoff_str}
+
+
+# ─────────────────────────────────────────────────────────────────────────
+#  /closeperiod DDMMYYYY
+# ─────────────────────────────────────────────────────────────────────────
+@require_unlock_and_admin
+async def close_period_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    arg = context.args[0] if context.args else ""
+    try:
+        co = to_ordinal(arg) if arg else None
+    except ValueError:
+        co = None
+    if co is None:
+        await update.message.reply_text(
+            "Usage: /closeperiod DDMMYYYY\n"
+            "Archives every ledger entry dated BEFORE that day."
+        )
+        return
+    try:
+        p = preview_close(arg)
+    except Exception as e:
+        await update.message.reply_text(f"❌ {e}")
+        return
+    if not p["rows"]:
+        await update.message.reply_text("Nothing to archive before that date.")
+        return
+    context.user_data["closeperiod_cutoff"] = arg
+    await update.message.reply_text(
+        f"📦 Close period before {datetime.strptime(arg, '%d%m%Y').strftime('%d/%m/%Y')}?\n"
+        f"• {p['rows']} ledger entries across {p['accounts']} accounts will be archived\n"
+        f"• they are replaced by opening-balance entries\n"
+        f"• reports reaching back before the cutoff read the archive",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("✅ Close period", callback_data="closeperiod_confirm"),
+            InlineKeyboardButton("❌ Cancel", callback_data="closeperiod_cancel"),
+        ]]),
+    )
+
+
+@require_unlock_and_admin
+async def close_period_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    q = update.callback_query
+    await q.answer()
+    cutoff = context.user_data.pop("closeperiod_cutoff", None)
+    if q.data == "closeperiod_cancel" or not cutoff:
+        await q.edit_message_text("Period close cancelled.")
+        return
+    try:
+        res = close_period(cutoff)
+    except Exception as e:
+        logger.exception("Period close failed")
+        await q.edit_message_text(f"❌ Period close failed: {e}")
+        return
+    await q.edit_message_text(
+        f"✅ Closed before {res['cutoff']}: {res['rows']} entries archived to "
+        f"{res['file']}, {res['openings']} opening entries written."
+    )
+
+
+def register_period_close_handlers(app):
+    app.add_handler(CommandHandler("closeperiod", close_period_command))
+    app.add_handler(CallbackQueryHandler(close_period_callback, pattern="^closeperiod_"))
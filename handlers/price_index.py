@@ -0,0 +1,117 @@
+# handlers/price_index.py
+"""
+Latest priced event per (account, item), for valuing stock at market.
+
+Reports valued inventory with get_last_sale_price / get_last_market_price,
+which filtered and sorted all sales (then all stock-ins) once per item on
+every render.  The index keeps, per account and item, the newest `sale`
+and the newest `stockin` row in ledger order (date, timestamp, doc_id),
+updated on every ledger add:
+
+    sale price     unit_price, else unit_cost (older rows), else 0
+    stock-in cost  unit_price, else 0
+
+prices() merges the accounts a report looks at into {item: price} once –
+latest sale price, falling back to the latest stock-in cost when there is
+no sale or it is 0 – so valuation is one dict lookup per item.  The owner
+report passes zero_fallback=False: it always valued at the latest sale
+price, even 0, and only used the stock-in cost for items never sold.  Accounts
+are (account_type, account_id) pairs; `with_store=True` only considers
+rows carrying a store_id (owner report's inventory on hand).  A third
+element pins the store for that account instead: ("partner", pid, sid)
+only looks at rows with store_id == sid, ("store", sid, None) at all rows.
+
+Deletes and lock/unlock drop the index; it is rebuilt from the ledger index
+(and archived segments) on the next query.
+"""
+
+import threading
+
+from handlers.ledger import _index, add_ledger_listener, archive_store
+from handlers.ledger_index import row_key
+
+
+class PriceIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.loaded = False
+            # (account_type, str(account_id)) → {store_id: {item: (row_key, price)}}
+            self._sales = {}
+            self._stockins = {}
+
+    def apply(self, row):
+        et = row.get("entry_type")
+        if et == "sale":
+            table, price = self._sales, row.get("unit_price", row.get("unit_cost", 0))
+        elif et == "stockin":
+            table, price = self._stockins, row.get("unit_price", 0)
+        else:
+            return
+        acct = (row.get("account_type"), str(row.get("account_id")))
+        latest = table.setdefault(acct, {}).setdefault(row.get("store_id"), {})
+        key = row_key(row)
+        item = row.get("item_id")
+        cur = latest.get(item)
+        if cur is None or key >= cur[0]:
+            latest[item] = (key, price)
+
+    def on_ledger_event(self, event, payload):
+        with self._lock:
+            if not self.loaded:
+                return
+            if event == "add":
+                self.apply(payload)
+            else:       # delete / reset: the previous latest row is unknown
+                self.reset()
+
+    def ensure_loaded(self):
+        with self._lock:
+            if self.loaded:
+                return
+            for seg in archive_store.indexes_for(None, None):
+                for row in seg.all.rows:
+                    self.apply(row)
+            for row in _index().all.rows:
+                self.apply(row)
+            self.loaded = True
+
+    @staticmethod
+    def _latest(table, accounts, with_store) -> dict:
+        merged = {}
+        for acct in accounts:
+            by_store = table.get((acct[0], str(acct[1])), {})
+            if len(acct) > 2:
+                slices = by_store.values() if acct[2] is None else [by_store.get(acct[2], {})]
+            else:
+                slices = [v for k, v in by_store.items() if k is not None or not with_store]
+            for items in slices:
+                for item, kp in items.items():
+                    cur = merged.get(item)
+                    if cur is None or kp[0] > cur[0]:
+                        merged[item] = kp
+        return merged
+
+    def prices(self, sale_accounts, stockin_accounts=(), with_store: bool = False,
+               zero_fallback: bool = True) -> dict:
+        """
+        {item_id: market price} over the given (account_type, account_id)
+        pairs.  Items absent from the result are priced 0.  zero_fallback:
+        a latest sale priced 0 yields the stock-in cost instead.
+        """
+        self.ensure_loaded()
+        with self._lock:
+            sales = self._latest(self._sales, sale_accounts, with_store)
+            stockins = self._latest(self._stockins, stockin_accounts, with_store)
+        out = {item: kp[1] for item, kp in stockins.items()}
+        for item, (_, price) in sales.items():
+            if price or not zero_fallback or item not in out:
+                out[item] = price
+        return out
+
+
+price_index = PriceIndex()
+add_ledger_listener(price_index.on_ledger_event)
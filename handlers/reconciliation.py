@@ -0,0 +1,185 @@
+# handlers/reconciliation.py
+"""
+Partner ↔ customer sales reconciliation, tracked as ledger rows are written.
+
+Partner sales reconcile what partners' stock sold to customers.  The figures
+behind the "Inventory to Reconcile" prompt and calc_total_reconciliation_needed
+used to be rebuilt by scanning every customer and partner ledger.  The
+tracker keeps per-account unit sums instead:
+
+  cust_sales[customer][item]    |qty| of customer `sale` rows
+  partner_sales[partner][item]  |qty| of partner `sale` rows
+  partner_in[partner][item]     qty of partner `stockin` rows
+
+Adds and deletes adjust the sums directly (deletes by doc_id, via a small
+map of the rows each doc_id contributed), so nothing is rescanned.  Views
+join the sums with the customers / partners tables (one snapshot read) and
+keep the semantics of the scans they replace:
+
+  sales_summary()          build_sales_summary
+  partner_sales_summary()  build_partner_sales_summary
+  partner_inventory()      compute_partner_inventory
+  needed()                 calc_total_reconciliation_needed
+  pending(partner_id)      the same, for one partner (customer of that name)
+  inventory_to_reconcile() partner stock − store stock (partner-sale prompt)
+"""
+
+import threading
+from collections import defaultdict
+
+from secure_db import secure_db
+from handlers.ledger import _index, add_ledger_listener, archive_store
+from handlers.store_stock import store_stock
+
+_KINDS = {
+    ("customer", "sale"):   "cust_sales",
+    ("partner", "sale"):    "partner_sales",
+    ("partner", "stockin"): "partner_in",
+}
+
+
+class ReconciliationTracker:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.loaded = False
+            self._sums = {kind: {} for kind in _KINDS.values()}   # kind → str(id) → {item: units}
+            self._docs = {}     # hot doc_id → (kind, acct, item, units)
+
+    # ── folding ─────────────────────────────────────────────────────────
+    def _bump(self, kind, acct, item, units):
+        items = self._sums[kind].setdefault(acct, {})
+        items[item] = items.get(item, 0) + units
+
+    def apply(self, row, doc_id=None):
+        kind = _KINDS.get((row.get("account_type"), row.get("entry_type")))
+        if kind is None:
+            return
+        qty = row.get("quantity") or 0
+        units = qty if kind == "partner_in" else abs(qty)
+        acct, item = str(row.get("account_id")), row.get("item_id")
+        self._bump(kind, acct, item, units)
+        if doc_id is not None:
+            self._docs[doc_id] = (kind, acct, item, units)
+
+    def on_ledger_event(self, event, payload):
+        with self._lock:
+            if not self.loaded:
+                return
+            if event == "add":
+                self.apply(payload, payload.doc_id)
+            elif event == "delete":
+                for doc_id in payload:
+                    ref = self._docs.pop(doc_id, None)
+                    if ref is not None:
+                        kind, acct, item, units = ref
+                        self._bump(kind, acct, item, -units)
+            else:
+                self.reset()
+
+    def ensure_loaded(self):
+        with self._lock:
+            if self.loaded:
+                return
+            for seg in archive_store.indexes_for(None, None):
+                for row in seg.all.rows:
+                    self.apply(row)
+            for row in _index().all.rows:
+                self.apply(row, row.doc_id)
+            self.loaded = True
+
+    def _sum(self, kind, accounts, default_item=None) -> dict:
+        """{item: Σ units} of *kind* over *accounts* (str ids)."""
+        out = {}
+        sums = self._sums[kind]
+        for acct in accounts:
+            for item, units in sums.get(acct, {}).items():
+                if item is None:
+                    item = default_item
+                out[item] = out.get(item, 0) + units
+        return out
+
+    @staticmethod
+    def _tables(tables):
+        return tables if tables is not None else secure_db.snapshot()
+
+    # ── views ───────────────────────────────────────────────────────────
+    def sales_summary(self, tables: dict | None = None) -> dict:
+        """{item_id: {'units': n}} over all customers' sales."""
+        tables = self._tables(tables)
+        self.ensure_loaded()
+        with self._lock:
+            sums = self._sum("cust_sales", tables.get("customers", {}))
+        return {iid: {"units": n} for iid, n in sums.items()}
+
+    def partner_sales_summary(self, tables: dict | None = None) -> dict:
+        """{item_id: {'units': n}} over all partners' sales."""
+        tables = self._tables(tables)
+        self.ensure_loaded()
+        with self._lock:
+            sums = self._sum("partner_sales", tables.get("partners", {}))
+        return {iid: {"units": n} for iid, n in sums.items()}
+
+    def partner_inventory(self, tables: dict | None = None) -> dict:
+        """{partner doc_id: {item_id: stock-in − sold}}."""
+        tables = self._tables(tables)
+        self.ensure_loaded()
+        out = {}
+        with self._lock:
+            for pid in tables.get("partners", {}):
+                stock = defaultdict(int)
+                for item, n in self._sum("partner_in", (pid,), "?").items():
+                    stock[item] += n
+                for item, n in self._sum("partner_sales", (pid,), "?").items():
+                    stock[item] -= n
+                out[int(pid)] = dict(stock)
+        return out
+
+    def _pending(self, customer_ids, partner_ids) -> dict:
+        sold = self._sum("cust_sales", customer_ids)
+        done = self._sum("partner_sales", partner_ids)
+        return {iid: n - done.get(iid, 0) for iid, n in sold.items() if n - done.get(iid, 0) > 0}
+
+    def needed(self, tables: dict | None = None) -> dict:
+        """{item_id: units} partner-named customers sold but no partner sale covers yet."""
+        tables = self._tables(tables)
+        self.ensure_loaded()
+        partners = tables.get("partners", {})
+        names = {p.get("name") for p in partners.values()}
+        customers = [cid for cid, c in tables.get("customers", {}).items() if c.get("name") in names]
+        with self._lock:
+            return self._pending(customers, partners)
+
+    def pending(self, partner_id, tables: dict | None = None) -> dict:
+        """needed() for one partner: its namesake customer's sales − its partner sales."""
+        tables = self._tables(tables)
+        self.ensure_loaded()
+        partner = tables.get("partners", {}).get(str(partner_id))
+        if partner is None:
+            return {}
+        customers = [cid for cid, c in tables.get("customers", {}).items()
+                     if c.get("name") == partner.get("name")]
+        with self._lock:
+            return self._pending(customers, (str(partner_id),))
+
+    def inventory_to_reconcile(self, tables: dict | None = None) -> dict:
+        """{item_id: units} Σ partner inventory − positive global store stock (non-zero only)."""
+        tables = self._tables(tables)
+        partner_units = defaultdict(int)
+        for inv in self.partner_inventory(tables).values():
+            for iid, qty in inv.items():
+                partner_units[iid] += qty
+        store_units = {iid: q for iid, q in store_stock.global_stock(tables).items() if q > 0}
+        out = {}
+        for iid in set(partner_units) | set(store_units):
+            units = partner_units.get(iid, 0) - store_units.get(iid, 0)
+            if units != 0:
+                out[iid] = units
+        return out
+
+
+reconciliation = ReconciliationTracker()
+add_ledger_listener(reconciliation.on_ledger_event)
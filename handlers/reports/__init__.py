@@ -1 +1,3 @@
- 
\ No newline at end of file
+from handlers.reports.engine import ReportEngine, report_engine
+
+__all__ = ["ReportEngine", "report_engine"]
@@ -0,0 +1,134 @@
+# handlers/reports/aggregate.py
+"""
+Single-pass report aggregation.
+
+The report_utils compute_* helpers each looped over stores / partners /
+customers and called get_ledger() per account, so the owner and store
+reports walked the ledger dozens of times per render.  aggregate() reads
+the ledger once – one iter_ledger() pass over the entry types the helpers
+use, optionally bounded to a date window – buckets the rows per
+(account_type, account_id, entry_type) and fills every result shape from
+those buckets:
+
+  store_sales        {store_id: {item_id: [sale]}}
+  partner_sales      {partner_id: {item_id: [sale]}}
+  customer_sales     {customer_id: {item_id: [sale]}}
+  handling_fees      {store_id: {item_id: [handling_fee]}}
+  store_payments     {store_id: [payment]}   (customers named like the store,
+                                              or store_customer_ids)
+  store_expenses     {store_id: [expense]}
+  store_stockins     {store_id: [stockin]}   (store + partner stock-ins there)
+  customer_payments  {customer_id: [payment]}
+  payouts            [payout | payment_sent] (all partners)
+
+Shapes, key types, account membership and row order are exactly those of
+the compute_* helpers it replaced.  Report builders take one result per
+request from LedgerContext.aggregate() (handlers/reports/context.py).
+"""
+
+from collections import defaultdict
+
+from handlers.ledger import iter_ledger
+
+AGG_TYPES = ("sale", "handling_fee", "expense", "stockin", "payment",
+             "payout", "payment_sent")
+
+
+def _nested():
+    return defaultdict(lambda: defaultdict(list))
+
+
+class ReportAggregates:
+    """All compute_* result shapes, filled from one ledger pass."""
+
+    def __init__(self, tables: dict, buckets: dict, store_customer_ids=None):
+        self._buckets = buckets
+        stores = tables.get("stores", {})
+        partners = tables.get("partners", {})
+        customers = tables.get("customers", {})
+
+        self.store_sales = self._by_item("store", stores, "sale")
+        self.partner_sales = self._by_item("partner", partners, "sale")
+        self.customer_sales = self._by_item("customer", customers, "sale")
+        self.handling_fees = self._by_item("store", stores, "handling_fee")
+        self.store_expenses = self._flat("store", stores, "expense")
+        self.customer_payments = self._flat("customer", customers, "payment")
+
+        self.store_stockins = defaultdict(list)
+        self.store_payments = defaultdict(list)
+        for key, store in stores.items():
+            sid = int(key)
+            rows = self._rows("store", key, "stockin")
+            for pid in partners:
+                rows += [e for e in self._rows("partner", pid, "stockin")
+                         if e.get("store_id") == sid]
+            if rows:
+                self.store_stockins[sid] = rows
+
+            if store_customer_ids and sid in store_customer_ids:
+                cust_ids = store_customer_ids[sid]
+            else:
+                cust_ids = [int(c) for c, cust in customers.items()
+                            if cust.get("name") == store.get("name")]
+            rows = []
+            for cid in cust_ids:
+                for acct_type in ("customer", "store_customer"):
+                    rows += self._rows(acct_type, cid, "payment")
+            if rows:
+                self.store_payments[sid] = rows
+
+        self.payouts = []
+        for pid in partners:
+            self.payouts += self._rows("partner", pid, "payout", "payment_sent")
+
+    def _rows(self, account_type, account_id, *entry_types) -> list:
+        """The account's rows of *entry_types*, in ledger order."""
+        by_type = self._buckets.get((account_type, str(account_id)), {})
+        buckets = [by_type[t] for t in entry_types if t in by_type]
+        if len(buckets) == 1:
+            return list(buckets[0])
+        return [e for _, e in sorted((pos, e) for b in buckets for pos, e in zip(b.positions, b))]
+
+    def _by_item(self, account_type, accounts, entry_type):
+        out = _nested()
+        for key in accounts:
+            for e in self._rows(account_type, key, entry_type):
+                out[int(key)][e.get("item_id", "?")].append(e)
+        return out
+
+    def _flat(self, account_type, accounts, entry_type):
+        out = defaultdict(list)
+        for key in accounts:
+            rows = self._rows(account_type, key, entry_type)
+            if rows:
+                out[int(key)] = rows
+        return out
+
+
+class _Bucket(list):
+    """Rows of one (account, entry_type), with their position in the pass."""
+    __slots__ = ("positions",)
+
+    def __init__(self):
+        super().__init__()
+        self.positions = []
+
+
+def aggregate(secure_db, start=None, end=None, store_customer_ids=None,
+              tables: dict | None = None) -> ReportAggregates:
+    """
+    One ledger pass → ReportAggregates.  The window applies only when both
+    *start* and *end* are given (inclusive whole days), as in the helpers.
+    """
+    if not (start and end):
+        start = end = None
+    tables = tables if tables is not None else secure_db.snapshot()
+    buckets = {}
+    for pos, e in enumerate(iter_ledger(entry_types=AGG_TYPES, start=start, end=end)):
+        acct = (e.get("account_type"), str(e.get("account_id")))
+        bucket = buckets.setdefault(acct, {}).get(e.get("entry_type"))
+        if bucket is None:
+            bucket = buckets[acct][e.get("entry_type")] = _Bucket()
+        bucket.append(e)
+        bucket.positions.append(pos)
+    return ReportAggregates(tables, buckets, store_customer_ids)
@@ -0,0 +1,140 @@
+# handlers/reports/cache.py
+"""
+Computed-report cache.
+
+Customer, partner and store reports used to rebuild everything – ledger
+fetches, per-item sums, stock valuation – on every page flip and again for
+"Export PDF".  Report handlers now ask the cache for their model:
+
+    model = report_cache.get_or_build("partner", pid, start, end, scope,
+                                      lambda: _partner_model(pid, start, end))
+
+Entries are keyed (report, entity id, start, end, scope, data_version()),
+so a model is only reused while the ledger and the tables it reads
+(customers, partners, stores – names, currencies, types) are unchanged:
+every ledger write / delete, every secure_db insert / update / remove and
+every lock bumps the version.  The ledger listener below and put() drop
+the entries built against an older one.  Least recently used entries are
+evicted past REPORT_CACHE_ENTRIES or once the estimated size of the cached
+models passes REPORT_CACHE_MB (ledger rows in a model are counted in full
+even though they are shared with the ledger index – the cap errs high).
+
+config.py knobs (optional):
+    REPORT_CACHE_ENTRIES = 64
+    REPORT_CACHE_MB = 32
+"""
+
+import logging
+import sys
+import threading
+from collections import OrderedDict
+
+import config
+from handlers.ledger import add_ledger_listener, data_version
+
+logger = logging.getLogger("reports.cache")
+
+MAX_ENTRIES = int(getattr(config, "REPORT_CACHE_ENTRIES", 64))
+MAX_BYTES = int(float(getattr(config, "REPORT_CACHE_MB", 32)) * 1024 * 1024)
+
+
+def approx_size(obj, _seen=None) -> int:
+    """Rough deep size of a model (dicts, lists, tuples, sets, __slots__ objects, scalars)."""
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approx_size(k, seen) + approx_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approx_size(v, seen) for v in obj)
+    elif hasattr(type(obj), "__slots__"):
+        size += sum(approx_size(getattr(obj, s, None), seen) for s in type(obj).__slots__)
+    return size
+
+
+class ReportCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES):
+        self._lock = threading.RLock()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key → (model, size)
+        self.bytes = 0
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(report, entity_id, start, end, scope=None) -> tuple:
+        return (report, str(entity_id), start, end, scope, data_version())
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, model):
+        size = approx_size(model)
+        with self._lock:
+            if size > self.max_bytes:
+                logger.debug("Report model for %s too large to cache (%d bytes)", key[:2], size)
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._drop_stale(key[-1])
+            self._entries[key] = (model, size)
+            self.bytes += size
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or self.bytes > self.max_bytes):
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+
+    def get_or_build(self, report, entity_id, start, end, scope, build):
+        """Cached model for the request, else build() and cache it."""
+        key = self.key(report, entity_id, start, end, scope)
+        model = self.get(key)
+        if model is None:
+            model = build()
+            # the build may itself have loaded the ledger index (a version bump)
+            self.put(self.key(report, entity_id, start, end, scope), model)
+        return model
+
+    async def get_or_build_async(self, report, entity_id, start, end, scope, build):
+        """get_or_build() for an awaitable build() (report workers)."""
+        version = data_version()
+        model = self.get(self.key(report, entity_id, start, end, scope))
+        if model is None:
+            model = await build()
+            # built from a snapshot: only cache it if the data didn't move meanwhile
+            if data_version() == version:
+                self.put(self.key(report, entity_id, start, end, scope), model)
+        return model
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def on_ledger_event(self, event, payload):
+        """Drop entries built against an older data version."""
+        if event == "reset":
+            self.clear()
+            return
+        self._drop_stale(data_version())
+
+    def _drop_stale(self, version):
+        with self._lock:
+            for key in [k for k in self._entries if k[-1] != version]:
+                self.bytes -= self._entries.pop(key)[1]
+
+
+report_cache = ReportCache()
+add_ledger_listener(report_cache.on_ledger_event)
@@ -0,0 +1,83 @@
+# handlers/reports/context.py
+"""
+Request-scoped read memo for report builders.
+
+A store report asked get_ledger() for the same store ledger five times and
+walked secure_db.all("customers") once per section.  A LedgerContext is
+created per report request and handed to the builders in place of the raw
+(secure_db, get_ledger) pair:
+
+    lc = LedgerContext()
+    lc.ledger("store", sid)         # fetched once, then served from the memo
+    lc("store", sid)                # same – drop-in for a get_ledger callable
+    lc.all("customers")             # served from the request's one snapshot()
+    lc.aggregate()                  # one ledger pass per request and window
+    store_stock.per_store(lc.snapshot())    # trackers take it as tables=
+
+Every secure_db.all() / snapshot() decrypts and parses the whole DB file,
+ledger included, so all table reads of a request – all(), get(), the
+trackers' tables= – come from one memoized snapshot(): one decrypt per
+request.
+
+Returned lists / dicts are the memoized objects – filter them, don't
+mutate them.
+A context is only valid for the request that created it: it does not
+listen for ledger writes, so build a new one for every report.
+"""
+
+from tinydb.table import Document
+
+from handlers.ledger import get_ledger
+from handlers.reports.aggregate import aggregate
+from secure_db import secure_db as _secure_db
+
+
+class LedgerContext:
+    def __init__(self, db=None, fetch=None):
+        self.db = db if db is not None else _secure_db
+        self._fetch = fetch if fetch is not None else get_ledger
+        self._ledgers = {}
+        self._tables = {}
+        self._snapshot = None
+        self._aggregates = {}
+        self.reads = 0          # underlying get_ledger calls (diagnostics)
+
+    # ── ledger ──────────────────────────────────────────────────────────
+    def ledger(self, account_type: str, account_id) -> list:
+        key = (account_type, str(account_id))
+        rows = self._ledgers.get(key)
+        if rows is None:
+            rows = self._ledgers[key] = self._fetch(account_type, account_id)
+            self.reads += 1
+        return rows
+
+    __call__ = ledger
+
+    # ── secure_db reads ─────────────────────────────────────────────────
+    def all(self, table: str) -> list:
+        docs = self._tables.get(table)
+        if docs is None:
+            rows = self.snapshot().get(table, {})
+            docs = self._tables[table] = [Document(row, int(k)) for k, row in rows.items()]
+        return docs
+
+    def get(self, table: str, doc_id: int):
+        row = self.snapshot().get(table, {}).get(str(doc_id))
+        return None if row is None else Document(row, int(doc_id))
+
+    def table(self, name: str):
+        return self.db.table(name)
+
+    def snapshot(self) -> dict:
+        if self._snapshot is None:
+            self._snapshot = self.db.snapshot()
+        return self._snapshot
+
+    # ── ledger sums ─────────────────────────────────────────────────────
+    def aggregate(self, start=None, end=None, store_customer_ids=None):
+        """aggregate(self, …) (handlers/reports/aggregate.py), memoized per arguments."""
+        key = (start, end, tuple(store_customer_ids) if store_customer_ids is not None else None)
+        agg = self._aggregates.get(key)
+        if agg is None:
+            agg = self._aggregates[key] = aggregate(self, start, end, store_customer_ids)
+        return agg
@@ -1,4 +1,5 @@
 import logging
+from io import BytesIO
 from datetime import datetime, timedelta
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import (
@@ -8,8 +9,13 @@ from telegram.ext import (
     ContextTypes,
 )
 from secure_db import secure_db
-from handlers.utils import require_unlock, fmt_money, fmt_date
-from handlers.ledger import get_ledger
+from handlers.utils import require_unlock, fmt_money, fmt_date, sum_money
+from handlers.ledger import iter_ledger, get_balance
+from handlers.ledger_entry import LedgerEntry
+from handlers.reports.engine import report_engine
+from handlers.reports.model import ReportModel, render_text
+from handlers.reports.pdf import export_pdf
+from handlers.reports.workers import ReportCancelled, ReportTimeout
 
 _PAGE_SIZE = 8
 
@@ -125,103 +131,103 @@ async def choose_report_scope(update: Update, context: ContextTypes.DEFAULT_TYPE
     else:
         await update.callback_query.edit_message_text("Choose report scope:", reply_markup=kb)
 
-def _paginate(items, page):
-    start = page * _PAGE_SIZE
-    return items[start:start + _PAGE_SIZE], len(items)
-
-def _filter_ledger(entries, start_date, end_date):
-    out = []
-    for e in entries:
-        try:
-            d = datetime.strptime(e["date"], "%d%m%Y")
-        except Exception:
-            continue
-        if start_date <= d <= end_date:
-            out.append(e)
-    return out
+def _customer_entries(cid, entry_type, start_date, end_date) -> list[LedgerEntry]:
+    """Entries of one type for the customer (customer + general ledgers) in the period."""
+    return [
+        e
+        for acct_type in ("customer", "general")
+        for e in iter_ledger(acct_type, cid, entry_types=entry_type, start=start_date, end=end_date,
+                             as_entries=True)
+    ]
 
-@require_unlock
-async def show_customer_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    scope = update.callback_query.data.split("_")[-1]
-    context.user_data["scope"] = scope
-    context.user_data.setdefault("page", 0)
+def _customer_balance(cid):
+    return get_balance("customer", cid) + get_balance("general", cid)
+
+def _sale_row(s: LedgerEntry, currency):
+    qty = 1 if s.quantity is None else s.quantity
+    price = s.unit_price or 0
+    return f"• {fmt_date(s.date)}: {qty} × {fmt_money(price, currency)} = {fmt_money(qty * price, currency)}"
+
+def _payment_row(p: LedgerEntry, currency):
+    fee_perc = p.fee_perc or 0
+    fx = p.fx_rate
+    inv_fx = 1 / fx if fx else 0
+    row = (
+        f"• {fmt_date(p.date)}: {fmt_money(p.amount, currency)}"
+        f" | {fee_perc:.2f}%"
+        f" | {inv_fx:.4f}"
+        f" | {fmt_money(p.usd_amt or 0, 'USD')}"
+    )
+    if p.note:
+        row += f"  📝 {p.note}"
+    return row
 
-    cid = context.user_data["customer_id"]
-    start_date = context.user_data["start_date"]
-    end_date = context.user_data["end_date"]
-    page = context.user_data["page"]
+def _customer_model(cid, start_date, end_date) -> ReportModel:
+    """The report as one model, rendered by both the screen and the PDF view."""
     customer = secure_db.table("customers").get(doc_id=cid)
-    currency = customer['currency']
-
-    ledger_entries_all = get_ledger("customer", cid) + get_ledger("general", cid)
-    filtered_entries = _filter_ledger(ledger_entries_all, start_date, end_date)
-    sales = [e for e in filtered_entries if e["entry_type"] == "sale"]
-    payments = [e for e in filtered_entries if e["entry_type"] == "payment"]
-
-    total_sales = sum(-e["amount"] for e in sales)
-    total_payments_local = sum(e["amount"] for e in payments)
-    sales_page, sales_count = _paginate(sales, page) if scope in ["full", "sales"] else ([], 0)
-    payments_page, payments_count = _paginate(payments, page) if scope in ["full", "payments"] else ([], 0)
-    balance = sum(e["amount"] for e in ledger_entries_all)
-
-    lines = [
+    currency = customer["currency"]
+    sales = _customer_entries(cid, "sale", start_date, end_date)
+    payments = _customer_entries(cid, "payment", start_date, end_date)
+    total_sales = -sum_money((e.amount for e in sales), currency)
+    total_payments_local = sum_money((e.amount for e in payments), currency)
+    total_payments_usd = sum_money(p.usd_amt or 0 for p in payments)
+    balance = _customer_balance(cid)
+
+    model = ReportModel(
         f"📄 *Report — {customer['name']}*",
-        f"Period: {fmt_date(start_date.strftime('%d%m%Y'))} → {fmt_date(end_date.strftime('%d%m%Y'))}",
-        f"Currency: {currency}\n"
-    ]
+        [
+            f"Period: {fmt_date(start_date.strftime('%d%m%Y'))} → {fmt_date(end_date.strftime('%d%m%Y'))}",
+            f"Currency: {currency}\n",
+        ],
+        data={
+            "name": customer["name"],
+            "currency": currency,
+            "total_sales": total_sales,
+            "total_payments_local": total_payments_local,
+            "total_payments_usd": total_payments_usd,
+            "balance": balance,
+        },
+    )
+    model.add(
+        "sales", "🛒 *Sales*", [_sale_row(s, currency) for s in sales],
+        totals=[f"📊 *Total Sales:* {fmt_money(total_sales, currency)}"],
+        scopes=("full", "sales"), empty="  (No sales on this page)", paged=True,
+    )
+    model.add(
+        "payments", "\n💵 *Payments*", [_payment_row(p, currency) for p in payments],
+        totals=[f"📊 *Total Payments:* {fmt_money(total_payments_local, currency)} → {fmt_money(total_payments_usd, 'USD')}"],
+        scopes=("full", "payments"), empty="  (No payments on this page)", paged=True,
+    )
+    model.add("balance", f"\n📊 *Current Balance:* {fmt_money(balance, currency)}")
+    return model
 
-    if scope in ["full", "sales"]:
-        lines.append("🛒 *Sales*")
-        if sales_page:
-            for s in sales_page:
-                qty = s.get("quantity", 1)
-                price = s.get("unit_price", 0)
-                total_val = qty * price
-                lines.append(
-                    f"• {fmt_date(s['date'])}: {qty} × {fmt_money(price, currency)} = {fmt_money(total_val, currency)}"
-                )
-        else:
-            lines.append("  (No sales on this page)")
-        if page == 0:
-            lines.append(f"📊 *Total Sales:* {fmt_money(total_sales, currency)}")
+def _model(user_data) -> ReportModel:
+    # one model serves every scope; scopes only pick the sections to render
+    return report_engine.customer_report(
+        user_data["customer_id"], user_data["start_date"], user_data["end_date"])
 
-    if scope in ["full", "payments"]:
-        lines.append("\n💵 *Payments*")
-        if payments_page:
-            for p in payments_page:
-                fee_perc = p.get('fee_perc', 0)
-                fx = p.get('fx_rate', 0)
-                inv_fx = 1 / fx if fx else 0
-                usd_amt = p.get('usd_amt', 0)
-                line = (
-                    f"• {fmt_date(p['date'])}: {fmt_money(p['amount'], currency)}"
-                    f" | {fee_perc:.2f}%"
-                    f" | {inv_fx:.4f}"
-                    f" | {fmt_money(usd_amt, 'USD')}"
-                )
-                if p.get('note'):
-                    line += f"  📝 {p['note']}"
-                lines.append(line)
-        else:
-            lines.append("  (No payments on this page)")
-        if page == 0:
-            lines.append(
-                f"📊 *Total Payments:* {fmt_money(total_payments_local, currency)} → {fmt_money(sum(p.get('usd_amt',0) for p in payments), 'USD')}"
-            )
+@require_unlock
+async def show_customer_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.callback_query.data.startswith("scope_"):     # not on page flips
+        context.user_data["scope"] = update.callback_query.data.split("_")[-1]
+    scope = context.user_data["scope"]
+    context.user_data.setdefault("page", 0)
 
-    lines.append(f"\n📊 *Current Balance:* {fmt_money(balance, currency)}")
+    page = context.user_data["page"]
+    model = _model(context.user_data)
+    listed = model.section("sales" if scope in ("full", "sales") else "payments")
 
     nav = []
     if page > 0:
         nav.append(InlineKeyboardButton("⬅️ Prev", callback_data="page_prev"))
-    if (page + 1) * _PAGE_SIZE < (sales_count if scope in ['full','sales'] else payments_count):
+    if (page + 1) * _PAGE_SIZE < len(listed.rows):
         nav.append(InlineKeyboardButton("➡️ Next", callback_data="page_next"))
     nav.append(InlineKeyboardButton("📄 Export PDF", callback_data="export_pdf"))
     nav.append(InlineKeyboardButton("🔙 Back", callback_data="rep_cust"))
     nav.append(InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu"))
 
     await update.callback_query.edit_message_text(
-        "\n".join(lines),
+        render_text(model, scope, page=page, page_size=_PAGE_SIZE),
         reply_markup=InlineKeyboardMarkup([nav]),
         parse_mode="Markdown"
     )
@@ -237,92 +243,20 @@ async def paginate_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
 @require_unlock
 async def export_pdf_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.callback_query.answer()
-    cid = context.user_data.get('customer_id')
-    customer = secure_db.table('customers').get(doc_id=cid)
     start = context.user_data.get('start_date')
-    end = context.user_data.get('end_date')
     scope = context.user_data.get('scope')
-    currency = customer['currency']
-
-    ledger_entries = get_ledger("customer", cid) + get_ledger("general", cid)
-    filtered_entries = _filter_ledger(ledger_entries, start, end)
-    sales = [e for e in filtered_entries if e["entry_type"] == "sale"]
-    payments = [e for e in filtered_entries if e["entry_type"] == "payment"]
-
-    from io import BytesIO
-    from reportlab.lib.pagesizes import letter
-    from reportlab.pdfgen import canvas
-
-    buffer = BytesIO()
-    pdf = canvas.Canvas(buffer, pagesize=letter)
-    width, height = letter
-    y = height - 50
-
-    pdf.setFont('Helvetica-Bold', 14)
-    pdf.drawString(50, y, f"Report — {customer['name']}")
-    y -= 20
-    pdf.setFont('Helvetica', 10)
-    pdf.drawString(50, y, f"Period: {fmt_date(start.strftime('%d%m%Y'))} → {fmt_date(end.strftime('%d%m%Y'))}")
-    y -= 15
-    pdf.drawString(50, y, f"Currency: {currency}")
-    y -= 30
-
-    if scope in ('full','sales'):
-        pdf.setFont('Helvetica-Bold', 12)
-        pdf.drawString(50, y, 'Sales:')
-        y -= 20
-        pdf.setFont('Helvetica', 10)
-        for s in sales:
-            qty = s.get("quantity", 1)
-            price = s.get("unit_price", 0)
-            total_val = qty * price
-            line = f"{fmt_date(s['date'])}: {qty} × {fmt_money(price, currency)} = {fmt_money(total_val, currency)}"
-            pdf.drawString(60, y, line)
-            y -= 15
-            if y<50:
-                pdf.showPage(); y=height-50
-        total_sales = sum(-s['amount'] for s in sales)
-        pdf.setFont('Helvetica-Bold',10)
-        pdf.drawString(50, y, f"Total Sales: {fmt_money(total_sales, currency)}")
-        y -= 30
-
-    if scope in ('full','payments'):
-        pdf.setFont('Helvetica-Bold', 12)
-        pdf.drawString(50, y, 'Payments:')
-        y -= 20
-        pdf.setFont('Helvetica', 10)
-        for p in payments:
-            fee_perc = p.get('fee_perc', 0)
-            fx = p.get('fx_rate', 0)
-            inv_fx = 1 / fx if fx else 0
-            usd_amt = p.get('usd_amt', 0)
-            line = (
-                f"{fmt_date(p['date'])}: {fmt_money(p['amount'], currency)}"
-                f" | {fee_perc:.2f}%"
-                f" | {inv_fx:.4f}"
-                f" | {fmt_money(usd_amt, 'USD')}"
-            )
-            pdf.drawString(60, y, line)
-            y -= 15
-            if y<50:
-                pdf.showPage(); y=height-50
-        total_local = sum(p['amount'] for p in payments)
-        pdf.setFont('Helvetica-Bold',10)
-        pdf.drawString(50, y, f"Total Payments: {fmt_money(total_local, currency)} → {fmt_money(sum(p.get('usd_amt',0) for p in payments), 'USD')}")
-        y -= 30
-
-    # All-time balance
-    balance = sum(e["amount"] for e in ledger_entries)
-    pdf.setFont('Helvetica-Bold',12)
-    pdf.drawString(50, y, f"Current Balance: {fmt_money(balance, currency)}")
-
-    pdf.showPage()
-    pdf.save()
-    buffer.seek(0)
+    model = _model(context.user_data)
+    try:
+        buffer = BytesIO(await export_pdf(update.effective_user.id, model, scope, "customer"))
+    except ReportCancelled:
+        return
+    except ReportTimeout:
+        await update.callback_query.message.reply_text("⏳ The PDF took too long – try a shorter period.")
+        return
 
     await update.callback_query.message.reply_document(
         document=buffer,
-        filename=f"report_{customer['name']}_{start.strftime('%Y%m%d')}.pdf"
+        filename=f"report_{model.data['name']}_{start.strftime('%Y%m%d')}.pdf"
     )
 
 def register_customer_report_handlers(app):
@@ -0,0 +1,80 @@
+# handlers/reports/engine.py
+"""
+Headless report API – the one entry point for the bot, CLI tools and tests.
+
+The report logic used to sit inside Telegram handlers next to their
+update.callback_query calls, and testreport.py imported a ReportEngine
+that was never written.  ReportEngine exposes the reports as plain methods
+that take an ID and a period and return the report's data model:
+
+    engine = ReportEngine()
+    model = engine.partner_report(pid, start, end)     # ReportModel
+    render_text(model, "full"); render_pdf(model)       # handlers/reports/model.py
+    pos, as_of = engine.owner_position()                # all-time figures
+
+Models are served from the report cache (handlers/reports/cache.py, keyed
+on the data version) and built on the ledger index / price index /
+LedgerContext like the handlers always did.  The bot awaits the *_async
+variants (partner, store, owner), which build on a miss in the report
+worker pool (handlers/reports/workers.py); `key` (the user id) makes a
+newer request, or navigating away, cancel the previous one.  The sync
+methods compute in process – scripts, tests, the /statements job and the
+(light) customer report.
+
+The report modules import the engine, so it imports their builders lazily.
+"""
+
+from handlers.reports.cache import report_cache
+from handlers.reports.context import LedgerContext
+from handlers.reports.workers import report_executor
+
+
+class ReportEngine:
+    def __init__(self, cache=report_cache, executor=report_executor):
+        self.cache = cache
+        self.executor = executor
+
+    # ── sync (scripts, tests, worker jobs) ──────────────────────────────
+    def customer_report(self, customer_id, start, end):
+        from handlers.reports.customer_report import _customer_model
+        return self.cache.get_or_build(
+            "customer", customer_id, start, end, None,
+            lambda: _customer_model(customer_id, start, end))
+
+    def partner_report(self, partner_id, start, end, lc: LedgerContext | None = None):
+        from handlers.reports.partner_report import _partner_model
+        return self.cache.get_or_build(
+            "partner", partner_id, start, end, None,
+            lambda: _partner_model(partner_id, start, end, lc))
+
+    def store_report(self, store_id, start, end, lc: LedgerContext | None = None, currency=None):
+        """currency=None: the store's own, read only when the model is built."""
+        from handlers.reports.store_report import build_store_report
+        return self.cache.get_or_build(
+            "store", store_id, start, end, None,
+            lambda: build_store_report({}, start, end, store_id, currency, lc))
+
+    def owner_position(self):
+        """(position dict, as_of) – all time; see owner_report.compute_owner_position."""
+        from handlers.reports.owner_report import owner_snapshot
+        return owner_snapshot.get()
+
+    # ── async (bot handlers: built in the report workers) ──────────────
+    async def partner_report_async(self, partner_id, start, end, key=None):
+        from handlers.reports.partner_report import _partner_model
+        return await self.cache.get_or_build_async(
+            "partner", partner_id, start, end, None,
+            lambda: self.executor.run(key, _partner_model, partner_id, start, end))
+
+    async def store_report_async(self, store_id, start, end, key=None, currency=None):
+        from handlers.reports.store_report import _store_report_job
+        return await self.cache.get_or_build_async(
+            "store", store_id, start, end, None,
+            lambda: self.executor.run(key, _store_report_job, start, end, store_id, currency))
+
+    async def owner_position_async(self, key=None):
+        from handlers.reports.owner_report import owner_snapshot
+        return await owner_snapshot.get_async(key if key is not None else "owner_snapshot")
+
+
+report_engine = ReportEngine()
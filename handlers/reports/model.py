@@ -0,0 +1,162 @@
+# handlers/reports/model.py
+"""
+Report model shared by the Telegram view and the PDF export.
+
+Each report builds one ReportModel – a title, header lines and ordered
+sections of rows and totals – and both outputs render that same object,
+so the screen and the PDF can no longer drift apart (they used to be two
+copies of the same computation).
+
+    model = ReportModel("📄 Account: Ann", ["🗓️ Period: …"], separator="────")
+    model.add("sales", "🛒 Sales", rows, totals=[…], scopes=("full", "sales"))
+    text = render_text(model, scope="full")
+    data = render_pdf(model, scope="full")      # bytes
+
+Rows and totals are preformatted strings (money already through
+fmt_money); a row may contain "\\n" for a blank line before it.  A section
+with `paged=True` is sliced by render_text(page=…) and shows its totals on
+the first page only.  Models are plain data (picklable) so they can be
+cached and handed to worker processes.
+"""
+
+from io import BytesIO
+
+ALL_SCOPES = ("full", "sales", "payments")
+
+
+class Section:
+    __slots__ = ("key", "title", "rows", "totals", "scopes", "empty", "paged")
+
+    def __init__(self, key, title, rows=(), totals=(), scopes=ALL_SCOPES,
+                 empty=None, paged=False):
+        self.key = key
+        self.title = title
+        self.rows = list(rows)
+        self.totals = list(totals)
+        self.scopes = tuple(scopes)
+        self.empty = empty          # row shown when there are no rows
+        self.paged = paged
+
+    def __getstate__(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __setstate__(self, state):
+        for k, v in state.items():
+            setattr(self, k, v)
+
+
+class ReportModel:
+    __slots__ = ("title", "header", "sections", "separator", "data")
+
+    def __init__(self, title, header=(), separator=None, data=None):
+        self.title = title
+        self.header = list(header)
+        self.sections = []
+        self.separator = separator  # line after each section (None: nothing)
+        self.data = data or {}      # raw figures for callers (totals, counts …)
+
+    def add(self, key, title, rows=(), **kw) -> Section:
+        sec = Section(key, title, rows, **kw)
+        self.sections.append(sec)
+        return sec
+
+    def section(self, key) -> Section | None:
+        return next((s for s in self.sections if s.key == key), None)
+
+    def visible(self, scope=None) -> list:
+        return [s for s in self.sections if scope is None or scope in s.scopes]
+
+    def __getstate__(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __setstate__(self, state):
+        for k, v in state.items():
+            setattr(self, k, v)
+
+
+def render_lines(model: ReportModel, scope=None, page=None, page_size=8) -> list:
+    lines = [model.title, *model.header]
+    for sec in model.visible(scope):
+        lines.append(sec.title)
+        rows = sec.rows
+        if sec.paged and page is not None:
+            rows = rows[page * page_size:(page + 1) * page_size]
+        if rows:
+            lines += rows
+        elif sec.empty is not None:
+            lines.append(sec.empty)
+        if not (sec.paged and page):
+            lines += sec.totals
+        if model.separator is not None:
+            lines.append(model.separator)
+    return lines
+
+
+def render_text(model: ReportModel, scope=None, page=None, page_size=8) -> str:
+    """Telegram message text (Markdown as written by the report)."""
+    return "\n".join(render_lines(model, scope, page, page_size))
+
+
+def _plain(text: str) -> str:
+    return text.replace("*", "")
+
+
+# ── PDF ────────────────────────────────────────────────────────────────
+# A PDF is drawn from "parts": the header, then one part per section, each
+# a list of (text, bold, size) lines.  layout_lines() wraps a part to the
+# page width and draw_pdf() paginates the concatenated result, so parts can
+# be laid out independently (in parallel, see handlers/reports/pdf.py).
+_LEFT, _TOP, _BOTTOM = 50, 40, 50
+
+
+def pdf_parts(model: ReportModel, scope=None) -> list:
+    parts = [[(model.title, True, 14), *((h, False, 10) for h in model.header)]]
+    for sec in model.visible(scope):
+        part = [(sec.title, True, 11)]
+        part += [(row, False, 10) for row in sec.rows or ([sec.empty] if sec.empty is not None else [])]
+        part += [(total, True, 10) for total in sec.totals]
+        if model.separator is not None:
+            part.append((model.separator, False, 10))
+        parts.append(part)
+    return parts
+
+
+def layout_lines(part: list) -> list:
+    """Split on newlines, strip Markdown and wrap to the page width."""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.utils import simpleSplit
+
+    width = letter[0] - 2 * _LEFT
+    out = []
+    for text, bold, size in part:
+        font = "Helvetica-Bold" if bold else "Helvetica"
+        for sub in _plain(text).split("\n"):
+            out += [(w, bold, size) for w in simpleSplit(sub, font, size, width) or [""]]
+    return out
+
+
+def draw_pdf(lines: list) -> tuple[bytes, int]:
+    """(PDF bytes, page count) for laid-out lines on letter pages."""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    buf = BytesIO()
+    pdf = canvas.Canvas(buf, pagesize=letter)
+    height = letter[1]
+    y, pages = height - _TOP, 1
+    for text, bold, size in lines:
+        if y < _BOTTOM:     # break before drawing: no trailing blank page
+            pdf.showPage()
+            y, pages = height - _TOP, pages + 1
+        pdf.setFont("Helvetica-Bold" if bold else "Helvetica", size)
+        pdf.drawString(_LEFT, y, text)
+        y -= 14 if size <= 11 else 20
+    pdf.showPage()
+    pdf.save()
+    return buf.getvalue(), pages
+
+
+def render_pdf(model: ReportModel, scope=None) -> bytes:
+    """The whole report (no paging) as a letter-size PDF."""
+    lines = [line for part in pdf_parts(model, scope) for line in layout_lines(part)]
+    return draw_pdf(lines)[0]
@@ -1,13 +1,23 @@
 # owner summary
+import asyncio
 import logging
 from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import CallbackQueryHandler, CommandHandler, ContextTypes
 
+import config
 from handlers.utils import require_unlock, fmt_money
-from handlers.ledger import get_balance, get_ledger
+from handlers.ledger import add_ledger_listener, data_version, get_balance
+from handlers.ledger_frame import ledger_frame
 from secure_db import secure_db
+from handlers.price_index import price_index
+from handlers.reports.context import LedgerContext
+from handlers.reports.engine import report_engine
+from handlers.reports.workers import ReportCancelled, ReportTimeout, report_executor
 from handlers.reports.report_utils import get_global_store_inventory, get_inventory_to_reconcile
 
 OWNER_ACCOUNT_ID = "POT"
@@ -17,40 +27,12 @@ OWNER_ACCOUNT_ID = "POT"
 
 logger = logging.getLogger("owner_position")
 
-def get_last_market_price(sales_entries, stockin_entries, item_id):
-    relevant_sales = [e for e in sales_entries if e.get("item_id") == item_id]
-    if relevant_sales:
-        latest = sorted(relevant_sales, key=lambda x: (x.get("date", ""), x.get("timestamp", "")), reverse=True)[0]
-        return latest.get("unit_price", latest.get("unit_cost", 0))
-    relevant_stockins = [e for e in stockin_entries if e.get("item_id") == item_id]
-    if relevant_stockins:
-        latest = sorted(relevant_stockins, key=lambda x: (x.get("date", ""), x.get("timestamp", "")), reverse=True)[0]
-        return latest.get("unit_price", 0)
-    return 0
-
-def get_all_sales_payments(secure_db, get_ledger):
-    all_sales = []
-    all_payments = []
-    for cust in secure_db.all("customers"):
-        for acct_type in ["customer", "store_customer"]:
-            for e in get_ledger(acct_type, cust.doc_id):
-                if e.get("entry_type") == "sale":
-                    all_sales.append(e)
-                elif e.get("entry_type") == "payment":
-                    all_payments.append(e)
-    return all_sales, all_payments
-
-def get_all_partner_sales(secure_db, get_ledger):
-    partner_sales = []
-    for partner in secure_db.all("partners"):
-        for e in get_ledger("partner", partner.doc_id):
-            if e.get("entry_type") == "sale":
-                partner_sales.append(e)
-    return partner_sales
-
-def get_verified_partner_payouts(secure_db, get_ledger):
+# seconds without ledger writes before the snapshot is recomputed
+SNAPSHOT_DELAY = float(getattr(config, "OWNER_SNAPSHOT_DELAY", 5))
+
+def get_verified_partner_payouts(lc: LedgerContext):
     owner_payouts = []
-    for e in get_ledger("owner", OWNER_ACCOUNT_ID):
+    for e in lc.ledger("owner", OWNER_ACCOUNT_ID):
         if e.get("entry_type") in ("payout", "payment_sent", "payout_sent"):
             owner_payouts.append(e)
     owner_set = set(
@@ -62,8 +44,8 @@ def get_verified_partner_payouts(secure_db, get_ledger):
         for e in owner_payouts
     )
     all_verified_payouts = []
-    for partner in secure_db.all("partners"):
-        for e in get_ledger("partner", partner.doc_id):
+    for partner in lc.all("partners"):
+        for e in lc.ledger("partner", partner.doc_id):
             if e.get("entry_type") in ("payout", "payment_sent", "payment"):
                 key = (
                     e.get("date"),
@@ -90,119 +72,118 @@ def payments_by_currency(payments):
         currency_groups[cur]["currency"] = cur
     return currency_groups
 
-def get_current_partner_inventory_with_value(secure_db, get_ledger):
-    partner_inventory = defaultdict(int)
-    all_sales = []
-    all_stockins = []
-    for partner in secure_db.all("partners"):
-        # Stockin (in)
-        for e in get_ledger("partner", partner.doc_id):
-            if e.get("entry_type") == "stockin":
-                partner_inventory[e.get("item_id")] += e.get("quantity", 0)
-                all_stockins.append(e)
-        # Customer sales (out, assigned to partner)
-        for e in get_ledger("customer", partner.doc_id):
-            if e.get("entry_type") == "sale":
-                partner_inventory[e.get("item_id")] -= abs(e.get("quantity", 0))
-                all_sales.append(e)
-        # Partner sales (out)
-        for e in get_ledger("partner", partner.doc_id):
-            if e.get("entry_type") == "sale":
-                partner_inventory[e.get("item_id")] -= abs(e.get("quantity", 0))
-                all_sales.append(e)
+def get_current_partner_inventory_with_value(secure_db, frame):
+    partner_ids = [p.doc_id for p in secure_db.all("partners")]
+    # stock-ins in, customer (assigned to partner) and partner sales out
+    stockin = frame.mask("stockin", {"partner": partner_ids})
+    sold = frame.mask("sale", {"customer": partner_ids, "partner": partner_ids})
+    qty = frame.num("quantity")
+    partner_inventory = frame.group_sum("item_id", np.where(stockin, qty, -np.abs(qty)),
+                                        stockin | sold)
+    accounts = [(t, pid) for pid in partner_ids for t in ("customer", "partner")]
+    prices = price_index.prices(accounts, [a for a in accounts if a[0] == "partner"],
+                                zero_fallback=False)
     value_by_item = {}
     for item_id, qty in partner_inventory.items():
         if qty > 0:
-            price = get_last_market_price(all_sales, all_stockins, item_id)
+            qty = int(qty) if float(qty).is_integer() else float(qty)
+            price = prices.get(item_id) or 0
             value_by_item[item_id] = {"units": qty, "value": qty * price, "price": price}
     return value_by_item
 
-@require_unlock
-async def show_owner_position(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if update.callback_query:
-        await update.callback_query.answer()
+def compute_owner_position(lc: LedgerContext) -> dict:
+    """Every figure of the owner position, as plain data (see render_owner_position)."""
+    frame = ledger_frame()
+    customer_ids = [c.doc_id for c in lc.all("customers")]
+    partner_ids = [p.doc_id for p in lc.all("partners")]
+    customer_accounts = {"customer": customer_ids, "store_customer": customer_ids}
 
-    lines = []
-    lines.append(f"📊 **Current Owner Position** 📊\n")
-
-    # --- Cash Position ---
-    cash = get_balance("owner", OWNER_ACCOUNT_ID)
-    lines.append(f"• Cash Position (Owner USD account): {fmt_money(cash, 'USD')}\n")
-
-    # --- Sales (All Customers, All Time) ---
-    all_sales, all_payments = get_all_sales_payments(secure_db, get_ledger)
-    sales_summary = defaultdict(lambda: {"units": 0, "value": 0.0})
-    for s in all_sales:
-        iid = s.get("item_id", "?")
-        units = abs(s.get("quantity", 0))
-        value = abs(units * s.get("unit_price", s.get("unit_cost", 0)))
-        sales_summary[iid]["units"] += units
-        sales_summary[iid]["value"] += value
+    partner_inv = get_current_partner_inventory_with_value(lc, frame)
 
-    lines.append(f"• Sales (All Customers, All Time):")
-    if sales_summary:
-        for iid, d in sales_summary.items():
-            avg = (d["value"] / d["units"]) if d["units"] else 0.0
-            lines.append(f"   -  {iid}: {d['units']} units, {fmt_money(d['value'], 'USD')} (Avg: {fmt_money(avg, 'USD')})")
+    # Global store inventory, valued at the latest store-side sale price
+    # (even 0), else the latest stock-in cost
+    stock_balance = get_global_store_inventory(lc)
+    partners = [("partner", pid) for pid in partner_ids]
+    prices = price_index.prices(
+        sale_accounts=[("customer", cid) for cid in customer_ids] + partners,
+        stockin_accounts=[("store", s.doc_id, None) for s in lc.all("stores")] + partners,
+        with_store=True,
+        zero_fallback=False,
+    )
+    inventory = []
+    for item_id, qty in stock_balance.items():
+        if qty > 0:
+            price = prices.get(item_id) or 0
+            inventory.append((item_id, qty, price, qty * price))
+
+    # Inventory to Reconcile (Partner Inventory - Store Inventory)
+    partner_inventory_units = {iid: v["units"] for iid, v in partner_inv.items()}
+    store_inventory_units = {iid: qty for iid, qty in stock_balance.items() if qty > 0}
+
+    return {
+        "cash":          get_balance("owner", OWNER_ACCOUNT_ID),
+        "sales":         frame.item_sales(frame.mask("sale", customer_accounts)),
+        "partner_sales": frame.item_sales(frame.mask("sale", {"partner": partner_ids})),
+        "payments":      frame.currency_totals(frame.mask("payment", customer_accounts)),
+        "payouts":       dict(payments_by_currency(get_verified_partner_payouts(lc))),
+        "partner_inv":   partner_inv,
+        "inventory":     inventory,
+        "to_reconcile":  get_inventory_to_reconcile(partner_inventory_units, store_inventory_units),
+    }
+
+
+def _owner_position_job() -> dict:
+    """Report worker entry (handlers/reports/workers.py)."""
+    return compute_owner_position(LedgerContext())
+
+
+def _currency_lines(lines, groups, total_label):
+    total = 0.0
+    if groups:
+        for cur, group in groups.items():
+            local_str = fmt_money(group["local"], cur)
+            usd_str = fmt_money(group["usd"], "USD")
+            lines.append(f"   -  {cur}: {local_str} → {usd_str} USD")
+            total += group["usd"]
+        lines.append(f"   {total_label}: {fmt_money(total, 'USD')}")
     else:
         lines.append("   None")
     lines.append("")
 
-    # --- Partner Sales (All Partners, All Time) ---
-    partner_sales = get_all_partner_sales(secure_db, get_ledger)
-    partner_sales_summary = defaultdict(lambda: {"units": 0, "value": 0.0})
-    for s in partner_sales:
-        iid = s.get("item_id", "?")
-        units = abs(s.get("quantity", 0))
-        value = abs(units * s.get("unit_price", s.get("unit_cost", 0)))
-        partner_sales_summary[iid]["units"] += units
-        partner_sales_summary[iid]["value"] += value
 
-    lines.append(f"• Partner Sales (All Partners, All Time):")
-    if partner_sales_summary:
-        for iid, d in partner_sales_summary.items():
+def _item_sales_lines(lines, summary):
+    if summary:
+        for iid, d in summary.items():
             avg = (d["value"] / d["units"]) if d["units"] else 0.0
             lines.append(f"   -  {iid}: {d['units']} units, {fmt_money(d['value'], 'USD')} (Avg: {fmt_money(avg, 'USD')})")
     else:
         lines.append("   None")
     lines.append("")
 
-    # --- Payments (All Customers, All Time) ---
+
+def render_owner_position(pos: dict, as_of: datetime) -> str:
+    lines = []
+    lines.append(f"📊 **Current Owner Position** 📊")
+    lines.append(f"_As of {as_of:%d/%m/%Y %H:%M:%S}_\n")
+
+    lines.append(f"• Cash Position (Owner USD account): {fmt_money(pos['cash'], 'USD')}\n")
+
+    lines.append(f"• Sales (All Customers, All Time):")
+    _item_sales_lines(lines, pos["sales"])
+
+    lines.append(f"• Partner Sales (All Partners, All Time):")
+    _item_sales_lines(lines, pos["partner_sales"])
+
     lines.append(f"• Payments (All Customers, All Time):")
-    pay_cur = payments_by_currency(all_payments)
-    total_usd = 0.0
-    if pay_cur:
-        for cur, group in pay_cur.items():
-            local_str = fmt_money(group["local"], cur)
-            usd_str = fmt_money(group["usd"], "USD")
-            lines.append(f"   -  {cur}: {local_str} → {usd_str} USD")
-            total_usd += group["usd"]
-        lines.append(f"   Total USD received: {fmt_money(total_usd, 'USD')}")
-    else:
-        lines.append("   None")
-    lines.append("")
+    _currency_lines(lines, pos["payments"], "Total USD received")
 
-    # --- Payouts (All Partners, All Time, cross-verified) ---
-    all_payouts = get_verified_partner_payouts(secure_db, get_ledger)
-    payout_cur = payments_by_currency(all_payouts)
-    total_payouts_usd = 0.0
     lines.append(f"• Payouts (All Partners, All Time):")
-    if payout_cur:
-        for cur, group in payout_cur.items():
-            local_str = fmt_money(group["local"], cur)
-            usd_str = fmt_money(group["usd"], "USD")
-            lines.append(f"   -  {cur}: {local_str} → {usd_str} USD")
-            total_payouts_usd += group["usd"]
-        lines.append(f"   Total USD paid: {fmt_money(total_payouts_usd, 'USD')}")
-    else:
-        lines.append("   None")
-    lines.append("")
+    _currency_lines(lines, pos["payouts"], "Total USD paid")
 
-    # --- Current Partner Inventory on hand ---
-    partner_inv = get_current_partner_inventory_with_value(secure_db, get_ledger)
     lines.append(f"• Current Partner Inventory on hand:")
-    total_partner_inv_value = 0
+    partner_inv = pos["partner_inv"]
     if partner_inv:
+        total_partner_inv_value = 0
         for iid, v in partner_inv.items():
             lines.append(
                 f"   -  {iid}: {v['units']} units × {fmt_money(v['price'], 'USD')} = {fmt_money(v['value'], 'USD')}"
@@ -213,59 +194,118 @@ async def show_owner_position(update: Update, context: ContextTypes.DEFAULT_TYPE
         lines.append("   None")
     lines.append("")
 
-    # --- Inventory on hand ---
-    # Use new utility for global store inventory
-    stock_balance = get_global_store_inventory(secure_db, get_ledger)
-    # Gather all sale and stockin entries for price lookup
-    all_sales_for_price, all_stockins = [], []
-    for store in secure_db.all("stores"):
-        for e in get_ledger("store", store.doc_id):
-            if e.get("entry_type") == "stockin":
-                all_stockins.append(e)
-    for partner in secure_db.all("partners"):
-        for e in get_ledger("partner", partner.doc_id):
-            if e.get("entry_type") == "stockin" and e.get("store_id") is not None:
-                all_stockins.append(e)
-    for ledger_type in ["customer", "store_customer", "partner"]:
-        for acct in secure_db.all(ledger_type + "s"):
-            for e in get_ledger(ledger_type, acct.doc_id):
-                if e.get("entry_type") == "sale" and e.get("store_id") is not None:
-                    all_sales_for_price.append(e)
-
     lines.append(f"• Inventory on hand:")
-    inventory_lines = []
-    total_market_value = 0
-    for item_id, qty in stock_balance.items():
-        if qty > 0:
-            last_price = get_last_market_price(all_sales_for_price, all_stockins, item_id)
-            item_value = qty * last_price
-            total_market_value += item_value
-            inventory_lines.append(f"   -  {item_id}: {qty} units × {fmt_money(last_price, 'USD')} = {fmt_money(item_value, 'USD')}")
-    if inventory_lines:
-        lines.extend(inventory_lines)
+    if pos["inventory"]:
+        for item_id, qty, price, value in pos["inventory"]:
+            lines.append(f"   -  {item_id}: {qty} units × {fmt_money(price, 'USD')} = {fmt_money(value, 'USD')}")
+        total_market_value = sum(value for *_, value in pos["inventory"])
         lines.append(f"   Total Inventory Market Value: {fmt_money(total_market_value, 'USD')}")
     else:
         lines.append("   None")
     lines.append("")
 
-        # --- Inventory to Reconcile (Partner Inventory - Store Inventory) ---
-    partner_inventory_units = {iid: v['units'] for iid, v in partner_inv.items()}
-    store_inventory_units = {iid: qty for iid, qty in stock_balance.items() if qty > 0}
-    to_reconcile = get_inventory_to_reconcile(partner_inventory_units, store_inventory_units)
     lines.append("• Inventory to Reconcile:")
-    if to_reconcile:
-        for iid, units in to_reconcile.items():
+    if pos["to_reconcile"]:
+        for iid, units in pos["to_reconcile"].items():
             lines.append(f"   - {iid}: {units} units")
     else:
         lines.append("   All inventory reconciled.")
     lines.append("")
+    return "\n".join(lines)
+
+
+class OwnerPositionSnapshot:
+    """
+    Last computed owner position and the data version (ledger + tables,
+    handlers.ledger.data_version) it reflects.
+
+    Ledger writes mark it stale and schedule a recompute on the bot's event
+    loop once writes have settled for SNAPSHOT_DELAY seconds, so a Refresh
+    normally renders without touching the ledger.  Table writes (a partner
+    removed, a store renamed …) mark it stale too; it is then recomputed on
+    the next request.  Lock/unlock drops it.
+    """
+
+    def __init__(self):
+        self.pos = None
+        self.as_of = None
+        self.version = None
+        self._pending = None    # asyncio TimerHandle of the scheduled refresh
+
+    def current(self):
+        """(pos, as_of) if the snapshot matches the ledger and tables, else None."""
+        if self.pos is not None and self.version == data_version():
+            return self.pos, self.as_of
+        return None
+
+    def refresh(self):
+        pos = compute_owner_position(LedgerContext())
+        # read after computing: the first query may build the index (a bump)
+        self.pos, self.as_of, self.version = pos, datetime.now(), data_version()
+        return self.pos, self.as_of
+
+    async def refresh_async(self, key="owner_snapshot"):
+        """refresh() in a report worker; the snapshot is of the version read here."""
+        version = data_version()
+        pos = await report_executor.run(key, _owner_position_job)
+        self.pos, self.as_of, self.version = pos, datetime.now(), version
+        return self.pos, self.as_of
+
+    def get(self):
+        return self.current() or self.refresh()
+
+    async def get_async(self, key="owner_snapshot"):
+        return self.current() or await self.refresh_async(key)
+
+    async def _run(self):
+        self._pending = None
+        if not secure_db.is_unlocked() or self.current():
+            return
+        try:
+            await self.refresh_async()
+        except ReportCancelled:
+            pass
+        except Exception:
+            logger.exception("Background owner position refresh failed")
+
+    def on_ledger_event(self, event, payload):
+        if event == "reset":
+            self.pos = self.as_of = self.version = None
+            if self._pending is not None:
+                self._pending.cancel()
+                self._pending = None
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:    # no bot loop (scripts, tests): refresh on demand
+            return
+        if self._pending is not None:
+            self._pending.cancel()
+        self._pending = loop.call_later(SNAPSHOT_DELAY, lambda: loop.create_task(self._run()))
+
+
+owner_snapshot = OwnerPositionSnapshot()
+add_ledger_listener(owner_snapshot.on_ledger_event)
+
+
+@require_unlock
+async def show_owner_position(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.callback_query:
+        await update.callback_query.answer()
 
+    try:
+        pos, as_of = await report_engine.owner_position_async(update.effective_user.id)
+    except ReportCancelled:
+        return SHOW_POSITION
+    except ReportTimeout:
+        await update.effective_message.reply_text("⏳ The owner position took too long – try again shortly.")
+        return SHOW_POSITION
 
     kb = InlineKeyboardMarkup([
         [InlineKeyboardButton("🔄 Refresh", callback_data="rep_owner")],
         [InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu")],
     ])
-    msg = "\n".join(lines)
+    msg = render_owner_position(pos, as_of)
     if update.callback_query:
         await update.callback_query.edit_message_text(msg[:4096], reply_markup=kb, parse_mode="Markdown")
     else:
@@ -0,0 +1,127 @@
+# handlers/reports/pdf.py
+"""
+PDF exports off the event loop.
+
+Customer, partner and store exports drew their reportlab canvas inside the
+async handler, so a long statement blocked the bot for seconds.  They now
+await:
+
+    data = await export_pdf(user_id, model, scope, "partner")
+
+which lays the ReportModel out and draws it in the report worker pool
+(handlers/reports/workers.py) and returns the PDF bytes.  The model is
+plain data, so only the model goes to the workers and only bytes come back.
+
+Reports with several sections and at least PDF_PARALLEL_ROWS rows are laid
+out section-parallel – each section's lines are split, cleaned and wrapped
+to the page width in its own job – and the laid-out sections are
+concatenated and drawn as one document in a single pass (there is no PDF
+merge library here, and a single draw keeps the page flow of the old
+export).  Smaller reports go to one worker as a whole.
+
+Every export is recorded (render time, pages, bytes, sections) in a ring
+buffer and logged to "reports.pdf"; admins see the recent ones with
+/pdfstats.
+
+config.py knobs (optional):
+    PDF_PARALLEL_ROWS = 400
+    PDF_STATS_BUFFER = 100
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+from telegram import Update
+from telegram.ext import CommandHandler, ContextTypes
+
+import config
+from handlers.utils import require_unlock_and_admin
+from handlers.reports.model import ReportModel, draw_pdf, layout_lines, pdf_parts
+from handlers.reports.workers import report_executor
+
+logger = logging.getLogger("reports.pdf")
+
+PARALLEL_ROWS = int(getattr(config, "PDF_PARALLEL_ROWS", 400))
+_recent = deque(maxlen=int(getattr(config, "PDF_STATS_BUFFER", 100)))
+
+
+def _render(parts: list) -> tuple[bytes, int]:
+    """Worker entry: lay out and draw in one job."""
+    return draw_pdf([line for part in parts for line in layout_lines(part)])
+
+
+async def export_pdf(key, model: ReportModel, scope=None, report: str = "report") -> bytes:
+    """PDF bytes of *model* rendered in the worker pool; see module doc."""
+    started = time.perf_counter()
+    parts = pdf_parts(model, scope)
+    rows = sum(len(p) for p in parts)
+    parallel = len(parts) > 2 and rows >= PARALLEL_ROWS and report_executor.workers > 0
+    if parallel:
+        laid = await asyncio.gather(*(report_executor.call(None, layout_lines, p) for p in parts))
+        data, pages = await report_executor.call(
+            key, draw_pdf, [line for part in laid for line in part])
+    else:
+        data, pages = await report_executor.call(key, _render, parts)
+    record_export(report, time.perf_counter() - started, pages, len(data), len(parts) - 1, parallel)
+    return data
+
+
+async def render_many(models: list, report: str = "batch", progress=None) -> list:
+    """
+    [(name, PDF bytes)] for [(name, model)], one worker job per model, in
+    input order.  `progress(done, total)` is awaited after every PDF.
+    """
+    async def one(model):
+        started = time.perf_counter()
+        parts = pdf_parts(model)
+        data, pages = await report_executor.call(None, _render, parts)
+        record_export(report, time.perf_counter() - started, pages, len(data), len(parts) - 1)
+        return data
+
+    tasks = [asyncio.ensure_future(one(model)) for _, model in models]
+    try:
+        for done, fut in enumerate(asyncio.as_completed(tasks), 1):
+            await fut
+            if progress is not None:
+                await progress(done, len(tasks))
+    except BaseException:
+        for t in tasks:
+            t.cancel()
+        raise
+    return [(name, t.result()) for (name, _), t in zip(models, tasks)]
+
+
+def record_export(report, seconds, pages, size, sections, parallel=False):
+    rec = {"report": report, "seconds": seconds, "pages": pages, "bytes": size,
+           "sections": sections, "parallel": parallel, "at": time.time()}
+    _recent.append(rec)
+    logger.info("%s PDF: %d page(s), %d bytes, %d section(s)%s in %.3fs",
+                report, pages, size, sections, " (parallel)" if parallel else "", seconds)
+    return rec
+
+
+def recent(n: int | None = None) -> list[dict]:
+    items = list(_recent)
+    return items[-n:] if n else items
+
+
+@require_unlock_and_admin
+async def show_pdf_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    items = recent(15)
+    if not items:
+        await update.message.reply_text("No PDF exports recorded yet.")
+        return
+    lines = ["🖨️ Recent PDF exports:"]
+    for r in reversed(items):
+        lines.append(
+            f"• {time.strftime('%d/%m %H:%M:%S', time.localtime(r['at']))} {r['report']}: "
+            f"{r['pages']} p, {r['bytes'] // 1024} KB, {r['seconds']:.2f}s"
+            + (" ⚡" if r["parallel"] else "")
+        )
+    await update.message.reply_text("\n".join(lines))
+
+
+def register_pdf_stats_handlers(app):
+    app.add_handler(CommandHandler("pdfstats", show_pdf_stats))
@@ -1,43 +1,24 @@
-from collections import defaultdict
-from datetime import datetime
-
-def compute_store_inventory(secure_db, get_ledger):
-    inventory = {}
-    for store in secure_db.all("stores"):
-        stock = defaultdict(int)
-        # 1. Add stock-ins from the store's own ledger
-        for e in get_ledger("store", store.doc_id):
-            item_id = e.get("item_id", "?")
-            if e.get("entry_type") == "stockin":
-                stock[item_id] += e.get("quantity", 0)
-        # 2. Add stock-ins from partners
-        for partner in secure_db.all("partners"):
-            for e in get_ledger("partner", partner.doc_id):
-                item_id = e.get("item_id", "?")
-                if e.get("entry_type") == "stockin" and e.get("store_id") == store.doc_id:
-                    stock[item_id] += e.get("quantity", 0)
-        # 3. Subtract sales made by this store's own store-customer account
-        for cust in secure_db.all("customers"):
-            if cust["name"] == store["name"]:
-                for e in get_ledger("store_customer", cust.doc_id):
-                    item_id = e.get("item_id", "?")
-                    if e.get("entry_type") == "sale" and e.get("store_id") == store.doc_id:
-                        stock[item_id] -= abs(e.get("quantity", 0))
-        inventory[store.doc_id] = dict(stock)
-    return inventory
-
-def compute_partner_inventory(secure_db, get_ledger):
-    inventory = {}
-    for partner in secure_db.all("partners"):
-        stock = defaultdict(int)
-        for e in get_ledger("partner", partner.doc_id):
-            item_id = e.get("item_id", "?")
-            if e.get("entry_type") == "stockin":
-                stock[item_id] += e.get("quantity", 0)
-            elif e.get("entry_type") == "sale":
-                stock[item_id] -= abs(e.get("quantity", 0))
-        inventory[partner.doc_id] = dict(stock)
-    return inventory
+"""
+Shared report helpers.  `secure_db` may be the database or a request's
+LedgerContext (handlers/reports/context.py); its snapshot() is handed to
+the running stock / reconciliation counters as their tables, so a request
+decrypts the DB once however many helpers it calls.  None of them reads a
+ledger.
+
+Ledger sums (sales, fees, payments, expenses, stock-ins, payouts per
+account) come from one aggregate() pass – take `lc.aggregate()` once per
+request and read its fields.
+"""
+from handlers.store_stock import store_stock
+from handlers.reconciliation import reconciliation
+
+def compute_store_inventory(secure_db):
+    """{store_id: {item_id: qty}} – served by handlers/store_stock.py (no ledger scan)."""
+    return store_stock.per_store(secure_db.snapshot())
+
+def compute_partner_inventory(secure_db):
+    """{partner_id: {item_id: qty}} – served by handlers/reconciliation.py (no ledger scan)."""
+    return reconciliation.partner_inventory(secure_db.snapshot())
 
 def get_unreconciled_units(sales_summary, partner_sales_summary):
     """
@@ -55,230 +36,30 @@ def get_unreconciled_units(sales_summary, partner_sales_summary):
             reconciliation[iid] = rec_units
     return reconciliation
 
-def compute_store_sales(secure_db, get_ledger, start=None, end=None):
-    sales = defaultdict(lambda: defaultdict(list))
-    for store in secure_db.all("stores"):
-        for e in get_ledger("store", store.doc_id):
-            if e.get("entry_type") == "sale":
-                if start and end:
-                    dt = e.get("date", "")
-                    try:
-                        dt_obj = datetime.strptime(dt, "%d%m%Y")
-                        if not (start <= dt_obj <= end):
-                            continue
-                    except Exception:
-                        continue
-                item_id = e.get("item_id", "?")
-                sales[store.doc_id][item_id].append(e)
-    return sales
-
-def compute_partner_sales(secure_db, get_ledger, start=None, end=None):
-    sales = defaultdict(lambda: defaultdict(list))
-    for partner in secure_db.all("partners"):
-        for e in get_ledger("partner", partner.doc_id):
-            if e.get("entry_type") == "sale":
-                if start and end:
-                    dt = e.get("date", "")
-                    try:
-                        dt_obj = datetime.strptime(dt, "%d%m%Y")
-                        if not (start <= dt_obj <= end):
-                            continue
-                    except Exception:
-                        continue
-                item_id = e.get("item_id", "?")
-                sales[partner.doc_id][item_id].append(e)
-    return sales
-
-def compute_store_handling_fees(secure_db, get_ledger, start=None, end=None):
-    fees = defaultdict(lambda: defaultdict(list))
-    for store in secure_db.all("stores"):
-        for e in get_ledger("store", store.doc_id):
-            if e.get("entry_type") == "handling_fee":
-                if start and end:
-                    dt = e.get("date", "")
-                    try:
-                        dt_obj = datetime.strptime(dt, "%d%m%Y")
-                        if not (start <= dt_obj <= end):
-                            continue
-                    except Exception:
-                        continue
-                item_id = e.get("item_id", "?")
-                fees[store.doc_id][item_id].append(e)
-    return fees
-
-def compute_store_payments(secure_db, get_ledger, store_customer_ids=None, start=None, end=None):
-    payments = defaultdict(list)
-    for store in secure_db.all("stores"):
-        cust_ids = []
-        if store_customer_ids and store.doc_id in store_customer_ids:
-            cust_ids = store_customer_ids[store.doc_id]
-        else:
-            # fallback: match customer name to store name
-            cust_ids = [c.doc_id for c in secure_db.all("customers") if c.get("name") == store.get("name")]
-        for cust_id in cust_ids:
-            for acct_type in ["customer", "store_customer"]:
-                for e in get_ledger(acct_type, cust_id):
-                    if e.get("entry_type") == "payment":
-                        if start and end:
-                            dt = e.get("date", "")
-                            try:
-                                dt_obj = datetime.strptime(dt, "%d%m%Y")
-                                if not (start <= dt_obj <= end):
-                                    continue
-                            except Exception:
-                                continue
-                        payments[store.doc_id].append(e)
-    return payments
-
-def compute_store_expenses(secure_db, get_ledger, start=None, end=None):
-    expenses = defaultdict(list)
-    for store in secure_db.all("stores"):
-        for e in get_ledger("store", store.doc_id):
-            if e.get("entry_type") == "expense":
-                if start and end:
-                    dt = e.get("date", "")
-                    try:
-                        dt_obj = datetime.strptime(dt, "%d%m%Y")
-                        if not (start <= dt_obj <= end):
-                            continue
-                    except Exception:
-                        continue
-                expenses[store.doc_id].append(e)
-    return expenses
-
-def compute_store_stockins(secure_db, get_ledger, start=None, end=None):
-    stockins = defaultdict(list)
-    for store in secure_db.all("stores"):
-        # stockins from store ledger
-        for e in get_ledger("store", store.doc_id):
-            if e.get("entry_type") == "stockin":
-                if start and end:
-                    dt = e.get("date", "")
-                    try:
-                        dt_obj = datetime.strptime(dt, "%d%m%Y")
-                        if not (start <= dt_obj <= end):
-                            continue
-                    except Exception:
-                        continue
-                stockins[store.doc_id].append(e)
-        # stockins from partner ledger where store_id matches
-        for partner in secure_db.all("partners"):
-            for e in get_ledger("partner", partner.doc_id):
-                if e.get("entry_type") == "stockin" and e.get("store_id") == store.doc_id:
-                    if start and end:
-                        dt = e.get("date", "")
-                        try:
-                            dt_obj = datetime.strptime(dt, "%d%m%Y")
-                            if not (start <= dt_obj <= end):
-                                continue
-                        except Exception:
-                            continue
-                    stockins[store.doc_id].append(e)
-    return stockins
-
-def compute_payouts(secure_db, get_ledger, start=None, end=None):
-    payouts = []
-    for partner in secure_db.all("partners"):
-        for e in get_ledger("partner", partner.doc_id):
-            if e.get("entry_type") in ("payout", "payment_sent"):
-                if start and end:
-                    dt = e.get("date", "")
-                    try:
-                        dt_obj = datetime.strptime(dt, "%d%m%Y")
-                        if not (start <= dt_obj <= end):
-                            continue
-                    except Exception:
-                        continue
-                payouts.append(e)
-    return payouts
-
-def compute_customer_sales(secure_db, get_ledger, start=None, end=None):
-    sales = defaultdict(lambda: defaultdict(list))
-    for customer in secure_db.all("customers"):
-        for e in get_ledger("customer", customer.doc_id):
-            if e.get("entry_type") == "sale":
-                if start and end:
-                    dt = e.get("date", "")
-                    try:
-                        dt_obj = datetime.strptime(dt, "%d%m%Y")
-                        if not (start <= dt_obj <= end):
-                            continue
-                    except Exception:
-                        continue
-                item_id = e.get("item_id", "?")
-                sales[customer.doc_id][item_id].append(e)
-    return sales
-
-def compute_customer_payments(secure_db, get_ledger, start=None, end=None):
-    payments = defaultdict(list)
-    for customer in secure_db.all("customers"):
-        for e in get_ledger("customer", customer.doc_id):
-            if e.get("entry_type") == "payment":
-                if start and end:
-                    dt = e.get("date", "")
-                    try:
-                        dt_obj = datetime.strptime(dt, "%d%m%Y")
-                        if not (start <= dt_obj <= end):
-                            continue
-                    except Exception:
-                        continue
-                payments[customer.doc_id].append(e)
-    return payments
-
-def build_sales_summary(secure_db, get_ledger):
+def build_sales_summary(secure_db):
     """
     Returns a dict {item_id: {'units': int}} for all customer sales (all customers, all items).
+    Served by handlers/reconciliation.py from running per-account sums.
     """
-    summary = {}
-    for cust in secure_db.all("customers"):
-        ledger = get_ledger("customer", cust.doc_id)
-        for e in ledger:
-            if e.get("entry_type") == "sale":
-                iid = e.get("item_id")
-                qty = abs(e.get("quantity", 0))
-                d = summary.setdefault(iid, {"units": 0})
-                d["units"] += qty
-    return summary
+    return reconciliation.sales_summary(secure_db.snapshot())
 
-def build_partner_sales_summary(secure_db, get_ledger):
+def build_partner_sales_summary(secure_db):
     """
     Returns a dict {item_id: {'units': int}} for all partner sales (all partners, all items).
+    Served by handlers/reconciliation.py from running per-account sums.
     """
-    summary = {}
-    for partner in secure_db.all("partners"):
-        ledger = get_ledger("partner", partner.doc_id)
-        for e in ledger:
-            if e.get("entry_type") == "sale":
-                iid = e.get("item_id")
-                qty = abs(e.get("quantity", 0))
-                d = summary.setdefault(iid, {"units": 0})
-                d["units"] += qty
-    return summary
+    return reconciliation.partner_sales_summary(secure_db.snapshot())
 
-def get_global_store_inventory(secure_db, get_ledger):
+def get_global_store_inventory(secure_db):
     """
     Calculates current global inventory across all stores.
     Sums all stock-ins (store and partner ledgers, all stores)
     and subtracts all sales (from any ledger, for any store).
     Returns dict {item_id: total_units_on_hand}
+
+    Served by handlers/store_stock.py from per-account running sums.
     """
-    stock_balance = defaultdict(int)
-    # 1. All stock-ins for all stores (store and partner ledgers)
-    for store in secure_db.all("stores"):
-        for e in get_ledger("store", store.doc_id):
-            if e.get("entry_type") == "stockin":
-                stock_balance[e.get("item_id")] += e.get("quantity", 0)
-    for partner in secure_db.all("partners"):
-        for e in get_ledger("partner", partner.doc_id):
-            if e.get("entry_type") == "stockin" and e.get("store_id") is not None:
-                stock_balance[e.get("item_id")] += e.get("quantity", 0)
-    # 2. Subtract all sales for all stores (from any ledger)
-    for ledger_type in ["general", "store", "partner"]:
-        for acct in secure_db.all(ledger_type + "s"):
-            for e in get_ledger(ledger_type, acct.doc_id):
-                if e.get("entry_type") == "sale" and e.get("store_id") is not None:
-                    stock_balance[e.get("item_id")] -= abs(e.get("quantity", 0))
-    return stock_balance
+    return store_stock.global_stock(secure_db.snapshot())
 
 def get_inventory_to_reconcile(partner_inventory, store_inventory):
     """
@@ -0,0 +1,145 @@
+# handlers/reports/statements.py
+"""
+/statements – every customer, partner and store statement for a period.
+
+Month-end used to mean one multi-step report conversation (and one PDF
+export) per entity.  `/statements 012025` (a month, MMYYYY) or
+`/statements 01012025 31012025` (a range, DDMMYYYY) instead:
+
+  1. builds all the report models in one report-worker job over one table
+     snapshot: the ledger index is built once in the worker and partner /
+     store reports share one LedgerContext, so each ledger and table is
+     read once for the whole batch (handlers/reports/workers.py);
+  2. renders the PDFs in the worker pool, one job per statement, editing
+     a progress message as they finish (handlers/reports/pdf.py);
+  3. replies with a single zip: customers/, partners/, stores/.
+
+Only general customers get statements, as in the customer report menu.
+
+config.py knob (optional):
+    STATEMENTS_TIMEOUT = 600   # seconds for building all the models
+"""
+
+import asyncio
+import calendar
+import logging
+import re
+import zipfile
+from datetime import datetime
+from io import BytesIO
+
+from telegram import InputFile, Update
+from telegram.ext import CommandHandler, ContextTypes
+
+import config
+from handlers.utils import require_unlock_and_admin
+from handlers.reports.context import LedgerContext
+from handlers.reports.engine import report_engine
+from handlers.reports.pdf import render_many
+from handlers.reports.workers import ReportCancelled, ReportTimeout, report_executor
+
+logger = logging.getLogger("reports.statements")
+
+TIMEOUT = float(getattr(config, "STATEMENTS_TIMEOUT", 600))
+
+USAGE = ("Usage: /statements MMYYYY  (a month)\n"
+         "   or: /statements DDMMYYYY DDMMYYYY  (a date range)")
+
+
+def parse_period(args) -> tuple[datetime, datetime] | None:
+    """(start, end) for ["MMYYYY"] or ["DDMMYYYY", "DDMMYYYY"] / ["DDMMYYYY-DDMMYYYY"]."""
+    args = [a for arg in args for a in arg.split("-") if a]
+    try:
+        if len(args) == 1 and len(args[0]) == 6:
+            month = datetime.strptime(args[0], "%m%Y")
+            last = calendar.monthrange(month.year, month.month)[1]
+            return month, month.replace(day=last)
+        if len(args) == 2:
+            start, end = (datetime.strptime(a, "%d%m%Y") for a in args)
+            return (start, end) if start <= end else None
+    except ValueError:
+        pass
+    return None
+
+
+def _safe(name) -> str:
+    return re.sub(r"[^\w.-]+", "_", str(name)).strip("_") or "unnamed"
+
+
+def build_statements(start, end) -> list:
+    """[(zip path, ReportModel)] for every entity; one request context for all."""
+    lc = LedgerContext()
+    out = []
+    for c in lc.all("customers"):
+        if c.get("type", "general") == "general":
+            out.append((f"customers/{_safe(c['name'])}_{c.doc_id}.pdf",
+                        report_engine.customer_report(c.doc_id, start, end)))
+    for p in lc.all("partners"):
+        out.append((f"partners/{_safe(p['name'])}_{p.doc_id}.pdf",
+                    report_engine.partner_report(p.doc_id, start, end, lc)))
+    for s in lc.all("stores"):
+        out.append((f"stores/{_safe(s['name'])}_{s.doc_id}.pdf",
+                    report_engine.store_report(s.doc_id, start, end, lc, s["currency"])))
+    return out
+
+
+def zip_files(files: list) -> bytes:
+    buf = BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in files:
+            zf.writestr(name, data)
+    return buf.getvalue()
+
+
+async def statements_zip(key, start, end, progress=None) -> tuple[bytes, int]:
+    """(zip bytes, statement count) – the whole batch, off the event loop."""
+    models = await report_executor.run(key, build_statements, start, end, timeout=TIMEOUT)
+    if progress is not None:
+        await progress(0, len(models))
+    files = await render_many(models, "statement", progress)
+    return await asyncio.to_thread(zip_files, files), len(files)
+
+
+@require_unlock_and_admin
+async def statements_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    period = parse_period(context.args or [])
+    if period is None:
+        await update.message.reply_text(USAGE)
+        return
+    start, end = period
+    label = f"{start:%d/%m/%Y} → {end:%d/%m/%Y}"
+    status = await update.message.reply_text(f"🧮 Building statements for {label} …")
+
+    last = {"shown": -1}
+
+    async def progress(done, total):
+        # every ~10% (Telegram rate-limits message edits)
+        if done == total or done - last["shown"] >= max(1, total // 10):
+            last["shown"] = done
+            try:
+                await status.edit_text(f"🖨️ Statements {label}: {done}/{total} PDFs rendered")
+            except Exception:
+                logger.debug("Progress update skipped", exc_info=True)
+
+    try:
+        data, count = await statements_zip(update.effective_user.id, start, end, progress)
+    except ReportCancelled:
+        await status.edit_text("Statements cancelled.")
+        return
+    except ReportTimeout:
+        await status.edit_text("⏳ Building the statements took too long – try a shorter period.")
+        return
+    except Exception as e:
+        logger.exception("Statement batch failed")
+        await status.edit_text(f"❌ Statements failed: {e}")
+        return
+
+    await update.message.reply_document(
+        InputFile(BytesIO(data), filename=f"statements_{start:%Y%m%d}_{end:%Y%m%d}.zip"),
+        caption=f"📦 {count} statements, {label}",
+    )
+    await status.edit_text(f"✅ Statements {label}: {count} PDFs")
+
+
+def register_statements_handlers(app):
+    app.add_handler(CommandHandler("statements", statements_command))
@@ -5,22 +5,21 @@ from datetime import datetime, timedelta
 from typing import List, Dict
 from collections import defaultdict
 from io import BytesIO
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update, InputFile
 from telegram.ext import CallbackQueryHandler, ConversationHandler, ContextTypes
 
 from handlers.utils import require_unlock, fmt_money, fmt_date
-from handlers.ledger import get_ledger
+from handlers.price_index import price_index
 from secure_db import secure_db
 
 # === Import shared report utilities ===
-from handlers.reports.report_utils import (
-    compute_store_inventory,
-    compute_store_sales,
-    compute_payouts,
-)
+from handlers.reports.report_utils import compute_store_inventory
+from handlers.reports.engine import report_engine
+from handlers.reports.context import LedgerContext
+from handlers.reports.model import ReportModel, render_text
+from handlers.reports import pdf as report_pdf
+from handlers.reports.workers import ReportCancelled, ReportTimeout
 
 (
     STORE_SELECT,
@@ -30,6 +29,8 @@ from handlers.reports.report_utils import (
     REPORT_PAGE,
 ) = range(5)
 
+_RULE = "──────────────────────────────\n"
+
 def _reset_state(ctx):
     for k in ("store_id", "start_date", "end_date", "page", "scope"):
         ctx.user_data.pop(k, None)
@@ -46,83 +47,63 @@ def _between(date_str: str, start: datetime, end: datetime) -> bool:
         return False
     return start <= dt <= end
 
-def get_last_sale_price(ledger, item_id):
-    sales = [e for e in ledger if e.get("entry_type") == "sale" and e.get("item_id") == item_id]
-    if sales:
-        latest = sorted(sales, key=lambda x: (x.get("date", ""), x.get("timestamp", "")), reverse=True)[0]
-        return latest.get("unit_price", latest.get("unit_cost", 0))
-    return 0
-
 # === Diagnostics function using shared logic ===
-def store_report_diagnostic(sid, secure_db, get_ledger):
+def store_report_diagnostic(sid, lc: LedgerContext):
     print(f"\n==== STORE REPORT DIAGNOSTIC (Store {sid}) ====")
-    store_inventory = compute_store_inventory(secure_db, get_ledger)
-    store_sales = compute_store_sales(secure_db, get_ledger)
-    payouts = compute_payouts(secure_db, get_ledger)
+    store_inventory = compute_store_inventory(lc)
+    agg = lc.aggregate()
+    store_sales, payouts = agg.store_sales, agg.payouts
     print(f"Store Inventory: {store_inventory.get(sid, {})}")
     print(f"Store Sales: {store_sales.get(sid, {})}")
     print(f"Payouts: {[p for p in payouts if p.get('store_id') == sid]}")
     print("==== END STORE REPORT DIAGNOSTIC ====\n")
 
-def build_store_report_lines(ctx, start, end, sid, cur, secure_db, get_ledger):
-    store = secure_db.table("stores").get(doc_id=sid)
+def build_store_report(ctx, start, end, sid, cur=None, lc: LedgerContext | None = None) -> ReportModel:
+    """
+    The store report as one model, rendered by both the screen and the PDF
+    view.  cur=None: the store's own currency.
+    """
+    lc = lc or LedgerContext()
+    store = lc.get("stores", sid)
+    if store is None:
+        raise KeyError(f"store {sid} not found")
     store_name = store["name"]
-    store_customer_ids = [cust.doc_id for cust in secure_db.all("customers") if cust["name"] == store_name]
+    cur = cur or store["currency"]
+    store_customer_ids = [cust.doc_id for cust in lc.all("customers") if cust["name"] == store_name]
 
     # SALES
     store_sales = []
-    for c in secure_db.all("customers"):
-        if c["name"] == store["name"]:
-            store_sales += [
-                e for e in get_ledger("store_customer", c.doc_id)
-                if (
-                    e.get("entry_type") == "sale"
-                    and e.get("store_id") == sid
-                    and _between(e.get("date", ""), start, end)
-                )
-            ]
-
-    sale_items = defaultdict(list)
-    for s in store_sales:
-        sale_items[s.get("item_id", "?")].append(s)
+    for cust_id in store_customer_ids:
+        store_sales += [
+            e for e in lc.ledger("store_customer", cust_id)
+            if (
+                e.get("entry_type") == "sale"
+                and e.get("store_id") == sid
+                and _between(e.get("date", ""), start, end)
+            )
+        ]
 
     sales_sorted = sorted(store_sales, key=lambda x: (x.get("date", ""), x.get("timestamp", "")), reverse=True)
 
-    # HANDLING FEES (from store ledger only)
-    sledger = get_ledger("store", sid)
+    # HANDLING FEES / EXPENSES (from store ledger only)
+    sledger = lc.ledger("store", sid)
     handling_fees = [e for e in sledger if e.get("entry_type") == "handling_fee" and _between(e.get("date", ""), start, end)]
     fees_sorted = sorted(handling_fees, key=lambda x: (x.get("date", ""), x.get("timestamp", "")), reverse=True)
+    expenses = [e for e in sledger if e.get("entry_type") == "expense" and _between(e.get("date", ""), start, end)]
 
     # PAYMENTS
     store_payments = []
     for cust_id in store_customer_ids:
         for acct_type in ["customer", "store"]:
-            cust_ledger = get_ledger(acct_type, cust_id)
+            cust_ledger = lc.ledger(acct_type, cust_id)
             for p in cust_ledger:
                 if p.get("entry_type") == "payment" and _between(p.get("date", ""), start, end):
                     store_payments.append(p)
-    payment_lines = []
-    for p in sorted(store_payments, key=lambda x: (x.get("date", ""), x.get("timestamp", "")), reverse=True):
-        amount = p.get('amount', 0)
-        fee_perc = p.get('fee_perc', 0)
-        fx_rate = p.get('fx_rate', 0)
-        usd_amt = p.get('usd_amt', 0)
-        payment_lines.append(
-            f"• {fmt_date(p.get('date', ''))}: {fmt_money(amount, cur)}  |  Fee: {fee_perc:g}%  |  FX: {fx_rate:.4f}  |  USD: {fmt_money(usd_amt, 'USD')}"
-        )
-    total_pay_local = sum(p.get('amount', 0) for p in store_payments)
-    total_pay_usd = sum(p.get('usd_amt', 0) for p in store_payments)
 
     # INVENTORY: all-time for current, in-period for ins
-    all_stockins = []
-    for e in get_ledger("store", sid):
-        if e.get("entry_type") == "stockin":
-            all_stockins.append(e)
-    for partner in secure_db.all("partners"):
-        pledger = get_ledger("partner", partner.doc_id)
-        for e in pledger:
-            if e.get("entry_type") == "stockin" and e.get("store_id") == sid:
-                all_stockins.append(e)
+    # the request's one ledger pass (shared with the diagnostic)
+    agg = lc.aggregate()
+    all_stockins = agg.store_stockins.get(sid, [])
 
     stockin_lines = []
     for e in sorted(all_stockins, key=lambda x: (x.get("date", ""), x.get("timestamp", "")), reverse=True):
@@ -131,24 +112,6 @@ def build_store_report_lines(ctx, start, end, sid, cur, secure_db, get_ledger):
             qty = e.get("quantity", 0)
             stockin_lines.append(f"- {fmt_date(e['date'])} [{item}] × {qty}")
 
-    # ALL-TIME CALCS for financials and inventory
-    alltime_sales = []
-    for cust_id in store_customer_ids:
-        for acct_type in ["customer", "store_customer"]:
-            cust_ledger = get_ledger(acct_type, cust_id)
-            for e in cust_ledger:
-                if e.get("entry_type") == "sale":
-                    alltime_sales.append(e)
-    alltime_fees = [e for e in get_ledger("store", sid) if e.get("entry_type") == "handling_fee"]
-    alltime_payments = []
-    for cust_id in store_customer_ids:
-        for acct_type in ["general", "store", "partner"]:
-            cust_ledger = get_ledger(acct_type, cust_id)
-            for p in cust_ledger:
-                if p.get("entry_type") == "payment":
-                    alltime_payments.append(p)
-    alltime_expenses = [e for e in get_ledger("store", sid) if e.get("entry_type") == "expense"]
-
     sales_lines = []
     for s in sales_sorted:
         qty = s.get('quantity', 0)
@@ -178,29 +141,15 @@ def build_store_report_lines(ctx, start, end, sid, cur, secure_db, get_ledger):
 
     total_sales_only = sum(abs(s.get('quantity', 0) * s.get('unit_price', s.get('unit_cost', 0))) for s in sales_sorted)
     total_fees_only = sum(abs(f.get('amount', 0)) for f in fees_sorted)
-    grand_total = total_sales_only + total_fees_only
-
-    sledger = get_ledger("store", sid)
-    expenses = [e for e in sledger if e.get("entry_type") == "expense" and _between(e.get("date", ""), start, end)]
-    expense_lines = []
-    other_total = sum(abs(e.get("amount", 0)) for e in expenses)
-    if expenses:
-        expense_lines.append("• 🧾 Other Expenses")
-        for e in expenses:
-            expense_lines.append(f"   - {fmt_date(e.get('date', ''))}: {fmt_money(abs(e.get('amount', 0)), cur)}")
-        expense_lines.append(f"📊 Total Other Expenses: {fmt_money(other_total, cur)}")
 
     # Current inventory at market
-    store_inventory = compute_store_inventory(secure_db, get_ledger)
+    store_inventory = compute_store_inventory(lc)
     stock_balance = store_inventory.get(sid, defaultdict(int))
-    market_prices = {}
-    for item in stock_balance:
-        price = get_last_sale_price(alltime_sales, item)
-        if price == 0:
-            stk = [e for e in all_stockins if e.get("item_id") == item]
-            if stk:
-                price = sorted(stk, key=lambda x: (x.get("date", ""), x.get("timestamp", "")), reverse=True)[0].get("unit_price", 0)
-        market_prices[item] = price or 0
+    prices = price_index.prices(
+        sale_accounts=[(t, cid) for cid in store_customer_ids for t in ("customer", "store_customer")],
+        stockin_accounts=[("store", sid)] + [("partner", p.doc_id, sid) for p in lc.all("partners")],
+    )
+    market_prices = {item: prices.get(item) or 0 for item in stock_balance}
 
     current_stock_lines = []
     stock_value = 0
@@ -211,41 +160,6 @@ def build_store_report_lines(ctx, start, end, sid, cur, secure_db, get_ledger):
             current_stock_lines.append(f"   - [{item}] {qty} × {fmt_money(mp, cur)} = {fmt_money(val, cur)}")
             stock_value += val
 
-    # Financial position (all time)
-    total_sales = sum(abs(s.get('quantity', 0) * s.get('unit_price', s.get('unit_cost', 0))) for s in alltime_sales)
-    total_fees = sum(abs(f.get('amount', 0)) for f in alltime_fees)
-    total_pay = sum(p.get('amount', 0) for p in alltime_payments)
-    total_exp = sum(abs(e.get("amount", 0)) for e in alltime_expenses)
-    balance = total_sales + total_fees - total_pay - total_exp
-
-    # ---- SECTIONED LINES FOR MATCHED OUTPUT ----
-        # --- Header ---
-    lines = []
-    lines.append(f"📄 Account: {store_name}")
-    lines.append(f"🗓️ Period: {start.strftime('%d/%m/%Y')} → {end.strftime('%d/%m/%Y')}")
-    lines.append(f"    Currency: {cur}")
-    lines.append("──────────────────────────────\n")
-
-    # --- Sales Section ---
-    lines.append("🛒 Sales")
-    lines += sales_lines if sales_lines else ["(none)"]
-    lines.append("")
-
-    # --- Store Fees Section ---
-    lines.append("💳 Handling Fees")
-    lines += fee_lines if fee_lines else ["(none)"]
-    lines.append("")
-
-    # --- Units Sold by Item ---
-    lines.append("📦 Units Sold (by item):")
-    lines += unit_summary if unit_summary else ["(none)"]
-
-    lines.append(f"\n📊 Total Sales: {fmt_money(total_sales_only, cur)}")
-    lines.append(f"📊 Total Handling Fees: {fmt_money(total_fees_only, cur)}")
-    lines.append(f"\n📊 Grand Total (Sales - Fees): {fmt_money(total_sales_only - total_fees_only, cur)}")
-    lines.append("──────────────────────────────\n")
-
-    # --- Payments Section ---
     payment_lines = []
     total_gross = 0
     total_usd = 0
@@ -261,51 +175,99 @@ def build_store_report_lines(ctx, start, end, sid, cur, secure_db, get_ledger):
             f"• {fmt_date(p.get('date', ''))}: {fmt_money(amount, cur)} | {fee_perc:g}% | {fx_inv:.4f} | {fmt_money(usd_amt, 'USD')}"
         )
 
-    lines.append("💵 Payments")
-    lines += payment_lines if payment_lines else ["(none)"]
-    lines.append(f"\n📊 Total Payments: {fmt_money(total_gross, cur)} → {fmt_money(total_usd, 'USD')}")
-    lines.append("──────────────────────────────\n")
+    total_all_expenses = sum(abs(e.get("amount", 0)) for e in expenses)
+    balance = total_sales_only - total_fees_only - total_gross - total_all_expenses
 
-
-    # --- Expenses Section (only if there are actual expenses) ---
-    sledger = get_ledger("store", sid)
-    # DEBUG: show all entries pulled
-    print("DEBUG sledger:", sledger)
-    expenses = [e for e in sledger if e.get("entry_type") == "expense" and _between(e.get("date", ""), start, end)]
-    print("DEBUG filtered expenses:", expenses)
-    expense_lines = []
-    other_total = sum(abs(e.get("amount", 0)) for e in expenses)
-    total_all_expenses = other_total  # Always set, even if zero
-
-    if expenses:
-        lines.append("🧾 Expenses")
-        for e in expenses:
-            lines.append(f"   - {fmt_date(e.get('date', ''))}: {fmt_money(abs(e.get('amount', 0)), cur)}  {e.get('note', '')}")
-        lines.append(f"\n📊 Total All Expenses: {fmt_money(total_all_expenses, cur)}")
-        lines.append("──────────────────────────────\n")
-
-    # --- Inventory Section ---
-    lines.append("📦 Inventory")
+    # ---- SECTIONS ----
+    model = ReportModel(
+        f"📄 Account: {store_name}",
+        [
+            f"🗓️ Period: {start.strftime('%d/%m/%Y')} → {end.strftime('%d/%m/%Y')}",
+            f"    Currency: {cur}",
+            _RULE,
+        ],
+        separator=_RULE,
+        data={
+            "name": store_name,
+            "currency": cur,
+            "total_sales": total_sales_only,
+            "total_fees": total_fees_only,
+            "total_payments": total_gross,
+            "total_payments_usd": total_usd,
+            "stock_value": stock_value,
+            "balance": balance,
+        },
+    )
+    model.add(
+        "sales", "🛒 Sales",
+        [
+            *(sales_lines or ["(none)"]), "",
+            "💳 Handling Fees", *(fee_lines or ["(none)"]), "",
+            "📦 Units Sold (by item):", *(unit_summary or ["(none)"]),
+        ],
+        totals=[
+            f"\n📊 Total Sales: {fmt_money(total_sales_only, cur)}",
+            f"📊 Total Handling Fees: {fmt_money(total_fees_only, cur)}",
+            f"\n📊 Grand Total (Sales - Fees): {fmt_money(total_sales_only - total_fees_only, cur)}",
+        ],
+        scopes=("full", "sales"),
+    )
+    model.add(
+        "payments", "💵 Payments", payment_lines,
+        totals=[f"\n📊 Total Payments: {fmt_money(total_gross, cur)} → {fmt_money(total_usd, 'USD')}"],
+        scopes=("full", "payments"), empty="(none)",
+    )
+    if expenses:   # only if there are actual expenses
+        model.add(
+            "expenses", "🧾 Expenses",
+            [f"   - {fmt_date(e.get('date', ''))}: {fmt_money(abs(e.get('amount', 0)), cur)}  {e.get('note', '')}"
+             for e in expenses],
+            totals=[f"\n📊 Total All Expenses: {fmt_money(total_all_expenses, cur)}"],
+            scopes=("full",),
+        )
+    inventory_rows = []
     if stockin_lines:
-        lines.append("• In :  ")
-        lines += stockin_lines
+        inventory_rows += ["• In :  ", *stockin_lines]
     if current_stock_lines:
-        lines.append("\n• Current Stock On Hand @ market: ")
-        lines += current_stock_lines
-    lines.append(f"\n📊 Stock Value: {fmt_money(stock_value, cur)}")
-    lines.append("──────────────────────────────\n")
-
-    # --- Financial Position Section ---
-    balance = total_sales_only - total_fees_only - total_gross - (total_all_expenses if 'total_all_expenses' in locals() else 0)
-    lines.append("📊 Financial Position (ALL TIME)")
-    lines.append(f"Balance (S - Fees − P − E): {fmt_money(balance, cur)}")
-    lines.append(f"Inventory Value:     {fmt_money(stock_value, cur)}")
-    lines.append("────────────────────────────────────")
-    lines.append(f"Total Position:      {fmt_money(balance + stock_value, cur)}")
-
-
-
-    return lines
+        inventory_rows += ["\n• Current Stock On Hand @ market: ", *current_stock_lines]
+    model.add(
+        "inventory", "📦 Inventory", inventory_rows,
+        totals=[f"\n📊 Stock Value: {fmt_money(stock_value, cur)}"],
+        scopes=("full",),
+    )
+    model.add(
+        "position", "📊 Financial Position (ALL TIME)",
+        [
+            f"Balance (S - Fees − P − E): {fmt_money(balance, cur)}",
+            f"Inventory Value:     {fmt_money(stock_value, cur)}",
+            "────────────────────────────────────",
+        ],
+        totals=[f"Total Position:      {fmt_money(balance + stock_value, cur)}"],
+        scopes=("full",),
+    )
+    return model
+
+def build_store_report_lines(ctx, start, end, sid, cur, lc: LedgerContext, scope=None) -> list:
+    """The rendered store report as text lines."""
+    model = build_store_report(ctx, start, end, sid, cur, lc)
+    return render_text(model, scope).split("\n")
+
+def _store_report_job(start, end, sid, cur=None) -> ReportModel:
+    """Worker entry: diagnostics and the report over one request context."""
+    lc = LedgerContext()
+    store_report_diagnostic(sid, lc)
+    return build_store_report({}, start, end, sid, cur, lc)
+
+async def _model(update, ctx, sid) -> ReportModel:
+    # one model serves every scope; scopes only pick the sections to render.
+    # The store (name, currency) is read only when the model is built.
+    return await report_engine.store_report_async(
+        sid, ctx["start_date"], ctx["end_date"], key=update.effective_user.id)
+
+async def _report_failed(update, exc) -> int:
+    if isinstance(exc, ReportTimeout):
+        await update.effective_message.reply_text("⏳ The report took too long – try a shorter period.")
+    return REPORT_PAGE
 
 @require_unlock
 async def show_store_report_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -415,26 +377,20 @@ async def show_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.callback_query.edit_message_text("⚠️ Please select a store first from the report menu.")
         return ConversationHandler.END
 
-    sid = ctx["store_id"]
-    store = secure_db.table("stores").get(doc_id=sid)
-    if not store:
+    try:
+        model = await _model(update, ctx, ctx["store_id"])
+    except KeyError:
         await update.callback_query.edit_message_text("⚠️ Store not found.")
         return ConversationHandler.END
-
-    cur = store["currency"]
-    start, end = ctx["start_date"], ctx["end_date"]
-
-    # Print diagnostics (NEW)
-    store_report_diagnostic(sid, secure_db, get_ledger)
-
-    lines = build_store_report_lines(ctx, start, end, sid, cur, secure_db, get_ledger)
+    except (ReportTimeout, ReportCancelled) as exc:
+        return await _report_failed(update, exc)
 
     nav = []
     nav.append(InlineKeyboardButton("📄 Export PDF", callback_data="store_export_pdf"))
     nav.append(InlineKeyboardButton("🏠 Main Menu", callback_data="main_menu"))
 
     await update.callback_query.edit_message_text(
-        "\n".join(lines),
+        render_text(model, ctx["scope"]),
         reply_markup=InlineKeyboardMarkup([nav]),
         parse_mode="Markdown"
     )
@@ -445,36 +401,15 @@ async def export_pdf(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.callback_query.answer("Generating PDF …")
     ctx = context.user_data
 
-    sid = ctx["store_id"]
-    store = secure_db.table("stores").get(doc_id=sid)
-    cur = store["currency"]
-    store_name = store["name"]
-
-    start, end = ctx["start_date"], ctx["end_date"]
-    lines = build_store_report_lines(ctx, start, end, sid, cur, secure_db, get_ledger)
-
-    buffer = BytesIO()
-    pdf = canvas.Canvas(buffer, pagesize=letter)
-    pdf.setFont("Helvetica-Bold", 14)
-    pdf.drawString(40, 760, f"Report ({store_name})")
-    pdf.setFont("Helvetica", 10)
-
-    y = 740
-    def pdf_add(text, font="Helvetica", size=10, gap=15):
-        nonlocal y
-        if y < 60:
-            pdf.showPage()
-            pdf.setFont(font, size)
-            y = 760
-        pdf.setFont(font, size)
-        pdf.drawString(40, y, text)
-        y -= gap
-
-    for line in lines:
-        for subline in line.split("\n"):
-            pdf_add(subline)
-    pdf.save()
-    buffer.seek(0)
+    try:
+        model = await _model(update, ctx, ctx["store_id"])
+    except (ReportTimeout, ReportCancelled) as exc:
+        return await _report_failed(update, exc)
+    store_name = model.data["name"]
+    try:
+        buffer = BytesIO(await report_pdf.export_pdf(update.effective_user.id, model, ctx["scope"], "store"))
+    except (ReportTimeout, ReportCancelled) as exc:
+        return await _report_failed(update, exc)
     pdf_input = InputFile(buffer, filename=f"Report ({store_name}).pdf")
     await update.effective_message.reply_document(pdf_input)
     await update.callback_query.answer("PDF exported.", show_alert=False)
@@ -0,0 +1,303 @@
+# handlers/reports/workers.py
+"""
+Report computation off the bot's event loop.
+
+The owner position, store and partner reports ran inline in their Telegram
+handlers, so one large report froze the bot for every user.  They now run
+in a process pool:
+
+    model = await report_executor.run(user_id, _partner_model, pid, start, end)
+
+run() does not ship the ledger with every job.  The parent keeps one
+"generation" of it for the workers: the ledger, the archive manifest and
+the rows of every archived segment, read once in a thread (off the event
+loop), then kept current by recording each ledger add / delete as it
+happens.  A worker installs a generation the first time it sees one – as
+an in-memory, unlocked secure_db, with the derived ledger state reset –
+and afterwards only replays the changes it has not applied yet through the
+ledger module (apply_ledger_changes), so its index, stock and price
+projections stay warm between jobs.  The small tables the reports read
+besides the ledger (REPORT_TABLES) are re-read, again in a thread, when
+they change and go with every job.  Lock/unlock (and so /closeperiod) or
+REBASE_CHANGES recorded changes start a new generation.  The report code
+runs in the worker unchanged and returns a picklable result (ReportModel,
+dict …).  Workers never see the PIN or the key.
+
+- `timeout`   – per request (REPORT_TIMEOUT); raises ReportTimeout.
+- `key`       – one job per key (the user id): a new request, or cancel(key)
+                when the user navigates away, abandons the previous one and
+                its awaiting handler gets ReportCancelled.
+- Lock/unlock abandons every job.
+
+A timeout or cancel only abandons the await: a process can't be
+interrupted, so a job already running in a worker finishes there, its
+result is dropped, and that worker stays busy until then – later jobs
+queue behind it.
+
+config.py knobs (optional):
+    REPORT_WORKERS = 2     # 0 = compute inline (old behaviour, no pool)
+    REPORT_TIMEOUT = 60    # seconds
+"""
+
+import asyncio
+import itertools
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import config
+from secure_db import secure_db
+from handlers.ledger import (
+    LEDGER_TABLE, add_ledger_listener, apply_ledger_changes, archive_store,
+)
+from handlers.ledger_archive import MANIFEST_TABLE
+
+logger = logging.getLogger("reports.workers")
+
+WORKERS = int(getattr(config, "REPORT_WORKERS", 2))
+TIMEOUT = float(getattr(config, "REPORT_TIMEOUT", 60))
+
+# always shipped: the ledger itself and the archive manifest
+_LEDGER_TABLES = (LEDGER_TABLE, MANIFEST_TABLE)
+# what the customer / partner / store / owner reports read besides the ledger
+REPORT_TABLES = ("customers", "partners", "stores", "generals")
+# recorded changes after which the next job starts a new generation
+REBASE_CHANGES = 5000
+
+
+class ReportTimeout(Exception):
+    """The report did not finish within its timeout."""
+
+
+class ReportCancelled(Exception):
+    """The report was abandoned (new request, navigation, lock)."""
+
+
+class _NeedBase(Exception):
+    """Worker → parent: the job's generation isn't installed here; send its base."""
+
+
+# ─────────────────────────────────────────────────────────────────────────
+#  Snapshot (parent) / install (worker)
+# ─────────────────────────────────────────────────────────────────────────
+def take_snapshot(tables=REPORT_TABLES) -> dict:
+    """Picklable copy of *tables* (None = all), the ledger and archived rows."""
+    data = secure_db.snapshot()
+    if tables is not None:
+        data = {t: data[t] for t in (*_LEDGER_TABLES, *tables) if t in data}
+    segments = zip(archive_store.manifest(), archive_store.indexes_for(None, None))
+    archives = {meta["file"]: [(row.doc_id, dict(row)) for row in seg.all.rows]
+                for meta, seg in segments}
+    return {"tables": data, "archives": archives}
+
+
+def _read_tables(names) -> dict:
+    data = secure_db.snapshot()
+    return {name: data.get(name, {}) for name in names}
+
+
+class _Generation:
+    """The parent's copy of the ledger for the workers (see module doc)."""
+
+    def __init__(self, token):
+        self.token = token
+        self.live = True        # False once a lock/unlock dropped it
+        self.loading = None     # future of the first read
+        self.base = None        # {"tables": ledger + manifest, "archives": …}
+        self.changes = []       # ("add", doc_id, row) / ("delete", [doc_ids])
+        self.tables = {}        # REPORT_TABLES as last read
+        self.read_at = {}       # table → secure_db.table_version() at that read
+
+
+_installed = {"token": None, "applied": 0}      # worker: generation held
+
+
+def _install(base: dict):
+    """Worker side: serve *base* through the module-level secure_db."""
+    from tinydb import TinyDB
+    from tinydb.storages import MemoryStorage
+    from tinydb.table import Document
+    from handlers.ledger_index import LedgerIndex
+
+    if secure_db.db is not None:
+        secure_db.db.close()
+    db = TinyDB(storage=MemoryStorage)
+    db.storage.write(base["tables"])
+    secure_db.db, secure_db._unlocked = db, True
+    secure_db._run_session_hooks()          # drop the previous generation's derived state
+    for file, rows in base["archives"].items():
+        idx = LedgerIndex()
+        idx.build([Document(row, doc_id) for doc_id, row in rows])
+        archive_store._loaded[file] = idx
+
+
+def _set_tables(tables: dict):
+    """Worker side: replace the non-ledger tables with the job's copy."""
+    data = secure_db.db.storage.read()
+    data.update(tables)
+    secure_db.db.storage.write(data)
+    for name in tables:
+        secure_db.db.table(name).clear_cache()
+    secure_db._version += 1
+
+
+def _run_job(token, base, tables, changes, fn, args):
+    if _installed["token"] != token:
+        if base is None:
+            raise _NeedBase()
+        _install(base)
+        _installed.update(token=token, applied=0)
+    apply_ledger_changes(changes[_installed["applied"]:])
+    _installed["applied"] = len(changes)
+    _set_tables(tables)
+    return fn(*args)
+
+
+# ─────────────────────────────────────────────────────────────────────────
+#  Executor
+# ─────────────────────────────────────────────────────────────────────────
+class ReportExecutor:
+    def __init__(self, workers: int = WORKERS, timeout: float = TIMEOUT):
+        self.workers = workers
+        self.timeout = timeout
+        self._pool = None
+        self._jobs = {}         # key → asyncio future of the running job
+        self._abandoned = set() # ids of futures cancelled by cancel()
+        self._waiting = {}      # key → ticket of a job still reading its tables
+        self._gen = None
+        self._tokens = itertools.count(1)
+        add_ledger_listener(self.on_ledger_event)   # records changes for the generation
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: workers must not inherit the unlocked session or bot threads
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    async def run(self, key, fn, *args, tables=REPORT_TABLES, timeout=None):
+        """fn(*args) in a worker over the ledger and *tables*; see module doc."""
+        self.cancel(key)
+        if self.workers <= 0:
+            return fn(*args)
+        ticket = object()
+        if key is not None:
+            self._waiting[key] = ticket
+        try:
+            gen, data = await self._state(tuple(tables))
+        finally:
+            mine = key is None or self._waiting.get(key) is ticket
+            if key is not None and mine:
+                del self._waiting[key]
+        if not mine:                        # cancelled while reading
+            raise ReportCancelled()
+        job = (data, list(gen.changes), fn, args)
+        try:
+            return await self._submit(key, fn, _run_job, (gen.token, None, *job), timeout)
+        except _NeedBase:
+            return await self._submit(key, fn, _run_job, (gen.token, gen.base, *job), timeout)
+
+    async def _state(self, names):
+        """(generation, {table: rows} for *names*), reading what is missing or stale."""
+        gen = self._gen
+        if gen is None or len(gen.changes) > REBASE_CHANGES:
+            gen = self._gen = _Generation(next(self._tokens))
+            gen.loading = asyncio.ensure_future(self._load(gen, names))
+        try:
+            # shielded: one caller being cancelled must not abort the shared read
+            await asyncio.shield(gen.loading)
+            stale = [n for n in names if secure_db.table_version(n) != gen.read_at.get(n)]
+            if stale:
+                read_at = {n: secure_db.table_version(n) for n in stale}
+                gen.tables.update(await asyncio.to_thread(_read_tables, stale))
+                gen.read_at.update(read_at)
+        except Exception:
+            if self._gen is gen:
+                self._gen = None
+            raise
+        if not gen.live:
+            raise ReportCancelled()
+        if self._gen is not gen:            # rebased meanwhile
+            return await self._state(names)
+        return gen, {n: gen.tables[n] for n in names}
+
+    async def _load(self, gen, names):
+        # versions first: a write during the read makes the tables stale again;
+        # ledger changes during it are already being recorded (replay is idempotent)
+        read_at = {n: secure_db.table_version(n) for n in names}
+        snap = await asyncio.to_thread(take_snapshot, names)
+        tables = snap["tables"]
+        gen.base = {"tables": {t: tables.pop(t) for t in _LEDGER_TABLES if t in tables},
+                    "archives": snap["archives"]}
+        gen.tables = {n: tables.get(n, {}) for n in names}
+        gen.read_at = read_at
+
+    async def call(self, key, fn, *args, timeout=None):
+        """
+        fn(*args) in a worker without a snapshot – for pure functions of
+        their arguments (PDF layout / drawing).  key=None: not cancellable
+        by key (sibling jobs of one request).
+        """
+        if key is not None:
+            self.cancel(key)
+        if self.workers <= 0:
+            return fn(*args)
+        return await self._submit(key, fn, fn, args, timeout)
+
+    async def _submit(self, key, fn, target, args, timeout):
+        fut = asyncio.wrap_future(self._get_pool().submit(target, *args))
+        if key is not None:
+            self._jobs[key] = fut
+        try:
+            return await asyncio.wait_for(fut, self.timeout if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Report job %s for %r timed out", getattr(fn, "__name__", fn), key)
+            raise ReportTimeout() from None
+        except asyncio.CancelledError:
+            if id(fut) in self._abandoned:
+                raise ReportCancelled() from None
+            raise
+        finally:
+            self._abandoned.discard(id(fut))
+            if key is not None and self._jobs.get(key) is fut:
+                del self._jobs[key]
+
+    def cancel(self, key) -> bool:
+        """Abandon the job running for *key*, if any."""
+        if self._waiting.pop(key, None) is not None:
+            return True
+        fut = self._jobs.pop(key, None)
+        if fut is None or fut.done():
+            return False
+        self._abandoned.add(id(fut))
+        fut.cancel()
+        return True
+
+    def cancel_all(self):
+        for key in [*self._waiting, *self._jobs]:
+            self.cancel(key)
+
+    def shutdown(self):
+        self.cancel_all()
+        self._gen = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def on_ledger_event(self, event, payload):
+        gen = self._gen
+        if event == "reset":
+            if gen is not None:
+                gen.live = False
+            self._gen = None
+            self.cancel_all()
+        elif gen is not None:
+            if event == "add":
+                gen.changes.append(("add", payload.doc_id, dict(payload)))
+            else:
+                gen.changes.append(("delete", list(payload)))
+
+
+report_executor = ReportExecutor()
@@ -15,7 +15,7 @@ from tinydb import Query
 
 from handlers.utils import require_unlock, fmt_money, fmt_date
 from secure_db import secure_db
-from handlers.ledger import add_ledger_entry, delete_ledger_entries_by_related
+from handlers.ledger_txn import LedgerTransaction
 
 logger = logging.getLogger(__name__)
 
@@ -218,6 +218,81 @@ async def get_sale_note(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     return S_CONFIRM
 
+def _add_sale_legs(txn, buyer_type, customer_id, store_id, item_id, qty,
+                   unit_price, unit_fee, total_fee, cur, note, date, ts,
+                   related_id=None):
+    """Buffer the legs of one sale in *txn*; returns the group's related_id.
+
+    Buyer leg (−qty × price), store inventory leg (amount 0) and, with a
+    handling fee, the store fee leg – offset by a partner fee leg when the
+    buyer is a partner.  Used by both confirm_sale and the edit flow.
+    """
+    related_id = txn.add(
+        account_type=buyer_type,
+        account_id=customer_id,
+        entry_type="sale",
+        related_id=related_id,
+        amount=-qty * unit_price,
+        currency=cur,
+        note=note,
+        date=date,
+        timestamp=ts,
+        item_id=item_id,
+        quantity=-qty,
+        unit_price=unit_price,
+        store_id=store_id,
+    )
+    txn.add(
+        account_type="store",
+        account_id=store_id,
+        entry_type="sale",
+        related_id=related_id,
+        amount=0,
+        currency=cur,
+        note="",
+        date=date,
+        timestamp=ts,
+        item_id=item_id,
+        quantity=-qty,
+        unit_price=unit_price,
+        store_id=store_id,
+    )
+    if total_fee > 0:
+        fee_note = ("Handling fee (customer sale)" if buyer_type == "customer"
+                    else "Handling fee (partner sale)")
+        if buyer_type != "customer":  # partner buyer
+            txn.add(
+                account_type="partner",
+                account_id=customer_id,
+                entry_type="handling_fee",
+                related_id=related_id,
+                amount=-total_fee,
+                currency=cur,
+                note=fee_note,
+                date=date,
+                timestamp=ts,
+                item_id=item_id,
+                quantity=qty,
+                unit_price=unit_fee,
+                store_id=store_id,
+            )
+        txn.add(
+            account_type="store",
+            account_id=store_id,
+            entry_type="handling_fee",
+            related_id=related_id,
+            amount=total_fee,
+            currency=cur,
+            note=fee_note,
+            date=date,
+            timestamp=ts,
+            item_id=item_id,
+            quantity=qty,
+            unit_price=unit_fee,
+            store_id=store_id,
+        )
+    return related_id
+
 @require_unlock
 async def confirm_sale(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.callback_query.answer()
@@ -231,7 +306,6 @@ async def confirm_sale(update: Update, context: ContextTypes.DEFAULT_TYPE):
     cur = store_row["currency"]
 
     total_fee   = d["sale_fee"] * d["sale_qty"]
-    total_sale  = d["sale_qty"] * d["sale_price"]
     sale_date   = datetime.utcnow().strftime("%d%m%Y")
     sale_ts     = datetime.utcnow().isoformat()
 
@@ -248,26 +322,15 @@ async def confirm_sale(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     sale_id        = None
     ledger_related_id = None
-    ledger_written = []
+    txn = LedgerTransaction()
 
     try:
-        # 1) Write to ledger FIRST to get global serial related_id
-        ledger_related_id = add_ledger_entry(
-            account_type=buyer_type,
-            account_id=customer_id,
-            entry_type="sale",
-            related_id=None,
-            amount=-total_sale,
-            currency=cur,
-            note=note,
-            date=sale_date,
-            timestamp=sale_ts,
-            item_id=item_id,
-            quantity=-qty,
-            unit_price=unit_price,
-            store_id=store_id,
+        # 1) Buffer all legs FIRST to get global serial related_id; they
+        #    are checked and written together at the end (step 5)
+        ledger_related_id = _add_sale_legs(
+            txn, buyer_type, customer_id, store_id, item_id, qty,
+            unit_price, d["sale_fee"], total_fee, cur, note, sale_date, sale_ts,
         )
-        ledger_written.append((buyer_type, customer_id, ledger_related_id))
 
         # 2) Insert sale row, saving related_id
         sale_id = secure_db.insert(
@@ -309,77 +372,8 @@ async def confirm_sale(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 },
             )
 
-        # 5) Store inventory ledger entry
-        add_ledger_entry(
-            account_type="store",
-            account_id=store_id,
-            entry_type="sale",
-            related_id=ledger_related_id,
-            amount=0,
-            currency=cur,
-            note="",
-            date=sale_date,
-            timestamp=sale_ts,
-            item_id=item_id,
-            quantity=-qty,
-            unit_price=unit_price,
-            store_id=store_id,
-        )
-        ledger_written.append(("store", store_id, ledger_related_id))
-
-        # handling-fee ledgers
-        if total_fee > 0:
-            if buyer_type == "customer":
-                add_ledger_entry(
-                    account_type="store",
-                    account_id=store_id,
-                    entry_type="handling_fee",
-                    related_id=ledger_related_id,
-                    amount=total_fee,
-                    currency=cur,
-                    note="Handling fee (customer sale)",
-                    date=sale_date,
-                    timestamp=sale_ts,
-                    item_id=item_id,
-                    quantity=qty,
-                    unit_price=d["sale_fee"],
-                    store_id=store_id,
-                )
-                ledger_written.append(("store", store_id, ledger_related_id))
-            else:  # partner buyer
-                add_ledger_entry(
-                    account_type="partner",
-                    account_id=customer_id,
-                    entry_type="handling_fee",
-                    related_id=ledger_related_id,
-                    amount=-total_fee,
-                    currency=cur,
-                    note="Handling fee (partner sale)",
-                    date=sale_date,
-                    timestamp=sale_ts,
-                    item_id=item_id,
-                    quantity=qty,
-                    unit_price=d["sale_fee"],
-                    store_id=store_id,
-                )
-                ledger_written.append(("partner", customer_id, ledger_related_id))
-
-                add_ledger_entry(
-                    account_type="store",
-                    account_id=store_id,
-                    entry_type="handling_fee",
-                    related_id=ledger_related_id,
-                    amount=total_fee,
-                    currency=cur,
-                    note="Handling fee (partner sale)",
-                    date=sale_date,
-                    timestamp=sale_ts,
-                    item_id=item_id,
-                    quantity=qty,
-                    unit_price=d["sale_fee"],
-                    store_id=store_id,
-                )
-                ledger_written.append(("store", store_id, ledger_related_id))
+        # 5) commit the ledger group (sale without store leg etc. is rejected)
+        txn.commit()
 
     except Exception as e:
         logging.exception("[confirm_sale] exception – rolling back")
@@ -389,9 +383,6 @@ async def confirm_sale(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # restore inventory
         if 'inv_rec' in locals():
             secure_db.update("store_inventory", {"quantity": inv_rec["quantity"]}, [inv_rec.doc_id])
-        # remove ledger writes
-        for acct_type, acct_id, rel_id in ledger_written:
-            delete_ledger_entries_by_related(acct_type, acct_id, rel_id)
 
         await update.callback_query.edit_message_text(f"❌ Sale aborted, error: {e}")
         return ConversationHandler.END
@@ -577,6 +568,53 @@ async def save_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return S_EDIT_CONFIRM
 
+def _sale_edit_fields(field: str, new: str) -> dict:
+    """Sales-row fields changed by one edit-flow answer."""
+    if field == "store":
+        return {"store_id": int(new)}
+    if field == "itemqty":
+        item_part, qty_part = new.split(",", 1)
+        return {"item_id": item_part.strip(), "quantity": int(qty_part.strip())}
+    if field == "price":
+        return {"unit_price": float(new)}
+    if field == "fee":
+        return {"handling_fee": float(new)}
+    if field == "note":
+        return {"note": "" if new == "-" else new}
+    return {}
+
+def _save_sale_edit(doc_id: int, related_id, fields: dict):
+    """Rewrite a sale's record and ledger legs in one checked transaction.
+
+    All legs of the group (buyer, old store, partner fee) are replaced by the
+    legs confirm_sale would write for the edited record; if the new group is
+    rejected neither the record nor the ledger changes.
+    """
+    if related_id is None:
+        raise ValueError("sale has no related_id – ledger legs cannot be matched")
+    sale = secure_db.table("sales").get(doc_id=doc_id)
+    new = {**sale, **fields}
+    buyer = secure_db.table("customers").get(doc_id=sale["customer_id"])
+    buyer_type = buyer.get("type", "customer") if buyer else "customer"
+
+    txn = LedgerTransaction()
+    txn.remove(buyer_type, sale["customer_id"], related_id)
+    txn.remove("store", sale["store_id"], related_id)
+    if buyer_type != "customer":
+        txn.remove("partner", sale["customer_id"], related_id)
+    txn.update_row("sales", doc_id, fields)
+
+    qty       = new["quantity"]
+    total_fee = new.get("handling_fee", 0) or 0
+    _add_sale_legs(
+        txn, buyer_type, new["customer_id"], new["store_id"], new["item_id"],
+        qty, new["unit_price"], total_fee / qty if qty else 0, total_fee,
+        new["currency"], new.get("note", ""),
+        datetime.utcnow().strftime("%d%m%Y"), new["timestamp"],
+        related_id=related_id,
+    )
+    txn.commit()
+
 @require_unlock
 async def confirm_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.callback_query.answer()
@@ -584,73 +622,30 @@ async def confirm_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await show_sales_menu(update, context)
         return ConversationHandler.END
 
-    sid   = context.user_data["edit_sale_id"]
-    field = context.user_data["edit_field"]
-    new   = context.user_data["new_value"]
-
-    # Fetch sale before editing to get old values for ledger removal
-    sale = secure_db.table("sales").get(doc_id=sid)
-    related_id = sale.get("related_id")    # <- ALWAYS use this for ledger
-
-    # --- UPDATE DB RECORD ---
-    if field == "store":
-        secure_db.update("sales", {"store_id": int(new)}, [sid])
-    elif field == "itemqty":
-        item_part, qty_part = new.split(",", 1)
-        item_id = item_part.strip()
-        qty     = int(qty_part.strip())
-        secure_db.update("sales", {"item_id": item_id, "quantity": qty}, [sid])
-    elif field == "price":
-        secure_db.update("sales", {"unit_price": float(new)}, [sid])
-    elif field == "fee":
-        secure_db.update("sales", {"handling_fee": float(new)}, [sid])
-    elif field == "note":
-        secure_db.update("sales", {"note": "" if new == "-" else new}, [sid])
+    # Always use these values
+    doc_id     = context.user_data["edit_sale_id"]
+    related_id = context.user_data["edit_related_id"]
+    field      = context.user_data["edit_field"]
+    new        = context.user_data["new_value"]
 
-    # --- LEDGER PATCH: Remove old entries ---
+    # --- UPDATE DB RECORD + LEDGER in one checked transaction ---
     try:
-        delete_ledger_entries_by_related("customer", sale["customer_id"], related_id)
-        if sale["handling_fee"] > 0:
-            delete_ledger_entries_by_related("store", sale["store_id"], related_id)
+        _save_sale_edit(doc_id, related_id, _sale_edit_fields(field, new))
     except Exception as e:
-        logging.error(f"[sales-edit] Failed to delete previous ledger entries for sale {sid}: {e}")
-
-    # --- LEDGER PATCH: Add new entries for updated sale ---
-    updated_sale = secure_db.table("sales").get(doc_id=sid)
-    if updated_sale:
-        try:
-            add_ledger_entry(
-                account_type="customer",
-                account_id=updated_sale["customer_id"],
-                entry_type="sale",
-                related_id=related_id,  # Always use related_id
-                amount=-(updated_sale["quantity"] * updated_sale["unit_price"] + updated_sale.get("handling_fee", 0)),
-                currency=updated_sale["currency"],
-                note=f"Sale {updated_sale['item_id']} ×{updated_sale['quantity']}" +
-                     (f" + handling fee {updated_sale.get('handling_fee', 0)}" if updated_sale.get("handling_fee", 0) else ""),
-                date=datetime.utcnow().strftime("%d%m%Y"),
-                timestamp=updated_sale["timestamp"],
-            )
-            if updated_sale.get("handling_fee", 0) > 0:
-                add_ledger_entry(
-                    account_type="store",
-                    account_id=updated_sale["store_id"],
-                    entry_type="handling_fee",
-                    related_id=related_id,  # Always use related_id
-                    amount=updated_sale["handling_fee"],
-                    currency=updated_sale["currency"],
-                    note="Handling fee for customer sale (edited)",
-                    date=datetime.utcnow().strftime("%d%m%Y"),
-                    timestamp=updated_sale["timestamp"],
-                )
-        except Exception as e:
-            logging.error(f"[sales-edit] Failed to add new ledger entries for sale {sid}: {e}")
+        logging.exception(f"[sales-edit] Failed to update sale {related_id}")
+        await update.callback_query.edit_message_text(
+            f"❌ Sale not updated, error: {e}",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="sales_menu")]]))
+        return ConversationHandler.END
 
     await update.callback_query.edit_message_text(
         "✅ Sale updated.",
         reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="sales_menu")]]))
     return ConversationHandler.END
 
+
+
+
 # ======================================================================
 #                                EDIT FLOW
 # ======================================================================
@@ -844,62 +839,15 @@ async def confirm_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     field      = context.user_data["edit_field"]
     new        = context.user_data["new_value"]
 
-    # Fetch sale before editing for old values
-    sale = secure_db.table("sales").get(doc_id=doc_id)
-
-    # --- UPDATE DB RECORD ---
-    if field == "store":
-        secure_db.update("sales", {"store_id": int(new)}, [doc_id])
-    elif field == "itemqty":
-        item_part, qty_part = new.split(",", 1)
-        item_id = item_part.strip()
-        qty     = int(qty_part.strip())
-        secure_db.update("sales", {"item_id": item_id, "quantity": qty}, [doc_id])
-    elif field == "price":
-        secure_db.update("sales", {"unit_price": float(new)}, [doc_id])
-    elif field == "fee":
-        secure_db.update("sales", {"handling_fee": float(new)}, [doc_id])
-    elif field == "note":
-        secure_db.update("sales", {"note": "" if new == "-" else new}, [doc_id])
-
-    # --- LEDGER PATCH: Remove old entries using related_id ---
+    # --- UPDATE DB RECORD + LEDGER in one checked transaction ---
     try:
-        delete_ledger_entries_by_related("customer", sale["customer_id"], related_id)
-        if sale["handling_fee"] > 0:
-            delete_ledger_entries_by_related("store", sale["store_id"], related_id)
+        _save_sale_edit(doc_id, related_id, _sale_edit_fields(field, new))
     except Exception as e:
-        logging.error(f"[sales-edit] Failed to delete previous ledger entries for sale {related_id}: {e}")
-
-    # --- LEDGER PATCH: Add new entries for updated sale using related_id ---
-    updated_sale = secure_db.table("sales").get(doc_id=doc_id)
-    if updated_sale:
-        try:
-            add_ledger_entry(
-                account_type="customer",
-                account_id=updated_sale["customer_id"],
-                entry_type="sale",
-                related_id=related_id,  # Always use related_id
-                amount=-(updated_sale["quantity"] * updated_sale["unit_price"] + updated_sale.get("handling_fee", 0)),
-                currency=updated_sale["currency"],
-                note=f"Sale {updated_sale['item_id']} ×{updated_sale['quantity']}" +
-                     (f" + handling fee {updated_sale.get('handling_fee', 0)}" if updated_sale.get("handling_fee", 0) else ""),
-                date=datetime.utcnow().strftime("%d%m%y"),
-                timestamp=updated_sale["timestamp"],
-            )
-            if updated_sale.get("handling_fee", 0) > 0:
-                add_ledger_entry(
-                    account_type="store",
-                    account_id=updated_sale["store_id"],
-                    entry_type="handling_fee",
-                    related_id=related_id,
-                    amount=updated_sale["handling_fee"],
-                    currency=updated_sale["currency"],
-                    note="Handling fee for customer sale (edited)",
-                    date=datetime.utcnow().strftime("%d%m%y"),
-                    timestamp=updated_sale["timestamp"],
-                )
-        except Exception as e:
-            logging.error(f"[sales-edit] Failed to add new ledger entries for sale {related_id}: {e}")
+        logging.exception(f"[sales-edit] Failed to update sale {related_id}")
+        await update.callback_query.edit_message_text(
+            f"❌ Sale not updated, error: {e}",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="sales_menu")]]))
+        return ConversationHandler.END
 
     await update.callback_query.edit_message_text(
         "✅ Sale updated.",
@@ -995,16 +943,31 @@ async def perform_delete_sale(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     sale = context.user_data["del_sale"]
     rid  = context.user_data["del_related_id"]
-
-    # Restore inventory
+    buyer = secure_db.table("customers").get(doc_id=sale["customer_id"])
+    buyer_type = buyer.get("type", "customer") if buyer else "customer"
+
+    # --- Remove legs + sale record and restore inventory in one write ---
+    txn = LedgerTransaction()
+    txn.remove(buyer_type, sale["customer_id"], rid)
+    txn.remove("store", sale["store_id"], rid)
+    if buyer_type != "customer":
+        txn.remove("partner", sale["customer_id"], rid)
     q = Query()
     rec = secure_db.table("store_inventory").get(
         (q.store_id == sale["store_id"]) & (q.item_id == sale["item_id"])
     )
     if rec:
-        secure_db.update("store_inventory",
-                         {"quantity": rec["quantity"] + sale["quantity"]},
-                         [rec.doc_id])
+        txn.update_row("store_inventory", rec.doc_id,
+                       {"quantity": rec["quantity"] + sale["quantity"]})
+    txn.delete_row("sales", sale.doc_id)
+    try:
+        txn.commit()
+    except Exception as e:
+        logging.exception(f"[sales-delete] Failed to delete sale {rid}")
+        await update.callback_query.edit_message_text(
+            f"❌ Sale not deleted, error: {e}",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="sales_menu")]]))
+        return ConversationHandler.END
 
     # Reverse handling fee if any
     if sale.get("handling_fee", 0) > 0:
@@ -1016,16 +979,6 @@ async def perform_delete_sale(update: Update, context: ContextTypes.DEFAULT_TYPE
             "timestamp":datetime.utcnow().isoformat(),
         })
 
-    # --- LEDGER PATCH: Remove ledger entries using related_id ---
-    try:
-        delete_ledger_entries_by_related("customer", sale["customer_id"], rid)
-        if sale.get("handling_fee", 0) > 0:
-            delete_ledger_entries_by_related("store", sale["store_id"], rid)
-    except Exception as e:
-        logging.error(f"[sales-delete] Failed to delete ledger entries for sale {rid}: {e}")
-
-    # Remove sale record
-    secure_db.remove("sales", [sale.doc_id])
     await update.callback_query.edit_message_text(
         f"✅ Sale #{rid} deleted.",
         reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="sales_menu")]]))
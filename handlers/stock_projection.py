@@ -0,0 +1,306 @@
+# handlers/stock_projection.py
+"""
+Partner stock projection – available stock per (partner, item) folded from
+ledger events, so the partner-sale conversation looks stock up instead of
+re-scanning the partner and customer ledgers on every call.
+
+Events (same semantics as the old ledger scan in partner_sales.py):
+  stockin            +quantity, grouped by (partner, related_id)
+  stockin_edit_qty   replaces the group's stock-in quantity (latest edit
+                     in ledger order wins)
+  stockin_delete     voids the whole group
+  sale               −|quantity| for partner:<id> and customer:<id> rows
+
+Each event adjusts the totals by the difference it makes to its group, so
+an add costs O(legs in that group).  Deletes arrive as doc_ids; the
+projection remembers which group / sale each hot doc_id fed and backs it
+out the same way.
+
+Snapshot + replay: the folded state is stored in `system_meta` (key
+"stock_projection") together with the chain head it covers.  On unlock the
+snapshot is loaded and only rows chained after it are replayed from the
+ledger index; if anything else changed since (deletes → new tombstones, a
+period close → new archive segment, unchained rows) the projection is
+rebuilt from the full ledger instead.  /rebuildstock forces a rebuild.
+
+config.py knob (optional):
+    STOCK_SNAPSHOT_EVERY = 500   # replayed events before a fresh snapshot
+"""
+
+import logging
+import threading
+
+from telegram import Update
+from telegram.ext import CommandHandler, ContextTypes
+from tinydb import Query
+
+import config
+from secure_db import secure_db
+from handlers.utils import require_unlock_and_admin
+from handlers.ledger import _chain_head, _index, add_ledger_listener, archive_store
+from handlers.ledger_chain import TOMBSTONE_TABLE
+from handlers.ledger_index import row_key
+from handlers.serials import META_TABLE
+
+logger = logging.getLogger("ledger.stock")
+
+SNAPSHOT_KEY = "stock_projection"
+SNAPSHOT_EVERY = int(getattr(config, "STOCK_SNAPSHOT_EVERY", 500))
+STOCK_TYPES = ("stockin", "stockin_edit_qty", "stockin_delete")
+
+
+class _Group:
+    """One stock-in group: the legs sharing (partner, related_id)."""
+    __slots__ = ("stockins", "edits", "deletes")
+
+    def __init__(self):
+        self.stockins = {}      # doc_id → (item_id, qty)
+        self.edits = {}         # doc_id → (row_key, qty | None)
+        self.deletes = set()    # doc_ids
+
+    def contribution(self) -> dict:
+        if self.deletes:
+            return {}
+        edit_qty = None
+        if self.edits:
+            edit_qty = max(self.edits.values(), key=lambda kq: kq[0])[1]
+        out = {}
+        for item, qty in self.stockins.values():
+            q = qty if edit_qty is None else edit_qty
+            out[item] = out.get(item, 0) + q
+        return out
+
+    def empty(self) -> bool:
+        return not (self.stockins or self.edits or self.deletes)
+
+
+class StockProjection:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.loaded = False
+            self._stock = {}        # str(account_id) → {item_id: qty}
+            self._groups = {}       # (str(partner_id), str(related_id)) → _Group
+            self._docs = {}         # hot doc_id → ("g", group key) | ("s", acct, item, qty)
+            self._seq = 0           # chain head covered by the state
+            self._replayed = 0
+
+    # ── folding ─────────────────────────────────────────────────────────
+    def _bump(self, acct, item, delta):
+        if delta:
+            items = self._stock.setdefault(acct, {})
+            items[item] = items.get(item, 0) + delta
+
+    def _regroup(self, key, change):
+        g = self._groups.setdefault(key, _Group())
+        before = g.contribution()
+        change(g)
+        after = g.contribution()
+        for item in before.keys() | after.keys():
+            self._bump(key[0], item, after.get(item, 0) - before.get(item, 0))
+        if g.empty():
+            del self._groups[key]
+
+    def apply(self, row, doc_id=None):
+        """Fold one ledger row in (doc_id: hot rows only, for later deletes)."""
+        et = row.get("entry_type")
+        at = row.get("account_type")
+        acct = str(row.get("account_id"))
+        if et == "sale" and at in ("partner", "customer"):
+            item, qty = row.get("item_id"), abs(row.get("quantity") or 0)
+            self._bump(acct, item, -qty)
+            if doc_id is not None:
+                self._docs[doc_id] = ("s", acct, item, qty)
+            return
+        if at != "partner" or et not in STOCK_TYPES:
+            return
+        key = (acct, str(row.get("related_id")))
+        did = doc_id if doc_id is not None else ("archived", id(row))
+        if et == "stockin":
+            val = (row.get("item_id"), row.get("quantity", 0))
+            self._regroup(key, lambda g: g.stockins.__setitem__(did, val))
+        elif et == "stockin_edit_qty":
+            val = (row_key(row), row.get("quantity"))
+            self._regroup(key, lambda g: g.edits.__setitem__(did, val))
+        else:
+            self._regroup(key, lambda g: g.deletes.add(did))
+        if doc_id is not None:
+            self._docs[doc_id] = ("g", key)
+
+    def _unapply(self, doc_id):
+        ref = self._docs.pop(doc_id, None)
+        if ref is None:
+            return
+        if ref[0] == "s":
+            _, acct, item, qty = ref
+            self._bump(acct, item, qty)
+            return
+
+        def drop(g):
+            g.stockins.pop(doc_id, None)
+            g.edits.pop(doc_id, None)
+            g.deletes.discard(doc_id)
+        self._regroup(ref[1], drop)
+
+    def on_ledger_event(self, event, payload):
+        with self._lock:
+            if not self.loaded:
+                return
+            if event == "add":
+                self.apply(payload, payload.doc_id)
+                seq = payload.get("chain_seq")
+                if seq is not None and seq > self._seq:
+                    self._seq = seq
+            elif event == "delete":
+                for doc_id in payload:
+                    self._unapply(doc_id)
+            else:
+                self.reset()
+
+    # ── loading ─────────────────────────────────────────────────────────
+    @staticmethod
+    def _fingerprint(idx) -> dict:
+        return {
+            "tombstones": len(secure_db.all(TOMBSTONE_TABLE)),
+            "archives":   len(archive_store.manifest()),
+            "unchained":  len(idx.all) - len(idx.chained),
+        }
+
+    def rebuild(self, save: bool = True) -> dict:
+        """Fold the full ledger (archived segments, then hot rows)."""
+        with self._lock:
+            self.reset()
+            idx = _index()
+            for seg in archive_store.indexes_for(None, None):
+                for row in seg.all.rows:
+                    self.apply(row)
+            for row in idx.all.rows:
+                self.apply(row, row.doc_id)
+            self._seq = _chain_head().seq
+            self.loaded = True
+            if save:
+                self.save_snapshot(idx)
+            logger.info("Stock projection rebuilt (%d groups, %d accounts)",
+                        len(self._groups), len(self._stock))
+            return self.stats()
+
+    def _load(self):
+        idx = _index()
+        snap = secure_db.get(META_TABLE, Query().key == SNAPSHOT_KEY)
+        val = snap["val"] if snap else None
+        if not val or val.get("fingerprint") != self._fingerprint(idx) \
+                or val.get("chain_seq", 0) > _chain_head().seq:
+            self.rebuild()
+            return
+        self._restore(val)
+        for row in idx.chained_since(self._seq):
+            self.apply(row, row.doc_id)
+            self._seq = row["chain_seq"]
+            self._replayed += 1
+        self.loaded = True
+        if self._replayed >= SNAPSHOT_EVERY:
+            self.save_snapshot(idx)
+
+    def ensure_loaded(self):
+        with self._lock:
+            if not self.loaded:
+                self._load()
+
+    # ── snapshot ────────────────────────────────────────────────────────
+    def save_snapshot(self, idx=None):
+        """Persist the folded state (JSON: tuples → lists, archived legs → null ids)."""
+        def hot(d):
+            return None if isinstance(d, tuple) else d
+
+        with self._lock:
+            idx = idx or _index()
+            groups = [
+                [acct, rid,
+                 [[hot(d), item, qty] for d, (item, qty) in g.stockins.items()],
+                 [[hot(d), list(k), qty] for d, (k, qty) in g.edits.items()],
+                 [hot(d) for d in g.deletes]]
+                for (acct, rid), g in self._groups.items()
+            ]
+            val = {
+                "chain_seq":   self._seq,
+                "fingerprint": self._fingerprint(idx),
+                "stock":       [[acct, item, qty] for acct, items in self._stock.items()
+                                for item, qty in items.items()],
+                "groups":      groups,
+                "sales":       [[d, *ref[1:]] for d, ref in self._docs.items() if ref[0] == "s"],
+            }
+            secure_db.table(META_TABLE).upsert({"key": SNAPSHOT_KEY, "val": val},
+                                               Query().key == SNAPSHOT_KEY)
+            self._replayed = 0
+
+    def _restore(self, val):
+        for acct, item, qty in val["stock"]:
+            self._stock.setdefault(acct, {})[item] = qty
+        archived = 0
+
+        def did(d):
+            nonlocal archived
+            if d is not None:
+                return d
+            archived += 1
+            return ("archived", archived)
+
+        for acct, rid, stockins, edits, deletes in val["groups"]:
+            key = (acct, rid)
+            g = self._groups[key] = _Group()
+            for d, item, qty in stockins:
+                g.stockins[did(d)] = (item, qty)
+            for d, k, qty in edits:
+                g.edits[did(d)] = (tuple(k), qty)
+            for d in deletes:
+                g.deletes.add(did(d))
+            for d in (*g.stockins, *g.edits, *g.deletes):
+                if not isinstance(d, tuple):
+                    self._docs[d] = ("g", key)
+        for d, acct, item, qty in val["sales"]:
+            self._docs[d] = ("s", acct, item, qty)
+        self._seq = val["chain_seq"]
+
+    # ── queries ─────────────────────────────────────────────────────────
+    def available(self, partner_id, item_id) -> int:
+        self.ensure_loaded()
+        return self._stock.get(str(partner_id), {}).get(item_id, 0)
+
+    def inventory(self, partner_id) -> dict:
+        """{item_id: qty} with qty > 0 for *partner_id*."""
+        self.ensure_loaded()
+        with self._lock:
+            items = self._stock.get(str(partner_id), {})
+            return {iid: qty for iid, qty in items.items() if qty > 0}
+
+    def stats(self) -> dict:
+        return {"groups": len(self._groups), "accounts": len(self._stock),
+                "chain_seq": self._seq}
+
+
+stock_projection = StockProjection()
+add_ledger_listener(stock_projection.on_ledger_event)
+
+
+# ─────────────────────────────────────────────────────────────────────────
+#  /rebuildstock
+# ─────────────────────────────────────────────────────────────────────────
+@require_unlock_and_admin
+async def rebuild_stock_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        s = stock_projection.rebuild()
+    except Exception as e:
+        logger.exception("Stock projection rebuild failed")
+        await update.message.reply_text(f"❌ Rebuild failed: {e}")
+        return
+    await update.message.reply_text(
+        f"📦 Stock projection rebuilt: {s['groups']} stock-in groups, "
+        f"{s['accounts']} accounts (chain seq {s['chain_seq']})."
+    )
+
+
+def register_stock_projection_handlers(app):
+    app.add_handler(CommandHandler("rebuildstock", rebuild_stock_command))
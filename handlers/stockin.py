@@ -23,7 +23,7 @@ from tinydb import Query
 
 from handlers.utils import require_unlock, fmt_money, fmt_date
 from secure_db       import secure_db
-from handlers.ledger import add_ledger_entry
+from handlers.ledger_txn import LedgerTransaction
 
 def _extract_doc_id(text: str) -> int | None:
     try:
@@ -223,9 +223,10 @@ async def confirm_stockin(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     d = context.user_data
     cur = _store_currency(d["store_id"])
+    txn = LedgerTransaction()
     try:
-        # === PATCH: Ledger first for unique related_id ===
-        related_id = add_ledger_entry(
+        # === PATCH: Ledger first for unique related_id (written at commit) ===
+        related_id = txn.add(
             account_type="partner",
             account_id=d["partner_id"],
             entry_type="stockin",
@@ -270,6 +271,7 @@ async def confirm_stockin(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 "unit_cost":d["cost"],
                 "currency": cur,
             })
+        txn.commit()
     except Exception as e:
         try:
             if 'partner_inv_id' in locals():
@@ -581,7 +583,8 @@ async def confirm_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     rec = recs[0]
     store_id = rec["store_id"]
 
-    # Ledger edit tracking variables
+    # Record, store inventory and edit leg are written together by commit()
+    txn = LedgerTransaction()
     ledger_type = None
     ledger_args = {}
 
@@ -590,15 +593,14 @@ async def confirm_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if field == "qty":
             new_qty = int(val)
             delta   = new_qty - rec["quantity"]
-            secure_db.update("partner_inventory", {"quantity": new_qty}, [doc_id])
+            txn.update_row("partner_inventory", doc_id, {"quantity": new_qty})
 
             q2 = Query()
             inv = secure_db.table("store_inventory").get((q2.store_id == store_id) &
                                                         (q2.item_id == rec["item_id"]))
             if inv:
-                secure_db.update("store_inventory",
-                                {"quantity": inv["quantity"] + delta},
-                                [inv.doc_id])
+                txn.update_row("store_inventory", inv.doc_id,
+                               {"quantity": inv["quantity"] + delta})
             ledger_type = "stockin_edit_qty"
             ledger_args = dict(
                 account_type="partner",
@@ -615,12 +617,12 @@ async def confirm_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
         elif field == "cost":
             old_cost = rec["unit_cost"]
-            secure_db.update("partner_inventory", {"unit_cost": float(val)}, [doc_id])
+            txn.update_row("partner_inventory", doc_id, {"unit_cost": float(val)})
             q2 = Query()
             inv = secure_db.table("store_inventory").get((q2.store_id == store_id) &
                                                         (q2.item_id == rec["item_id"]))
             if inv:
-                secure_db.update("store_inventory", {"unit_cost": float(val)}, [inv.doc_id])
+                txn.update_row("store_inventory", inv.doc_id, {"unit_cost": float(val)})
             ledger_type = "stockin_edit_cost"
             ledger_args = dict(
                 account_type="partner",
@@ -636,34 +638,15 @@ async def confirm_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 related_id=rec.get("related_id", rec.doc_id)
             )
         elif field == "date":
-            secure_db.update("partner_inventory", {"date": val}, [doc_id])
+            txn.update_row("partner_inventory", doc_id, {"date": val})
         elif field == "note":
-            secure_db.update("partner_inventory", {"note": "" if val == "-" else val}, [doc_id])
+            txn.update_row("partner_inventory", doc_id, {"note": "" if val == "-" else val})
         if ledger_type:
-            add_ledger_entry(entry_type=ledger_type, **ledger_args)
+            txn.add(entry_type=ledger_type, **ledger_args)
+        txn.commit()
 
     except Exception as e:
-        # Rollback attempt
-        if field == "qty":
-            secure_db.update("partner_inventory", {"quantity": rec["quantity"]}, [doc_id])
-            q2 = Query()
-            inv = secure_db.table("store_inventory").get((q2.store_id == store_id) & (q2.item_id == rec["item_id"]))
-            if inv:
-                secure_db.update(
-                    "store_inventory",
-                    {"quantity": inv["quantity"] - (int(val) - rec["quantity"])},
-                    [inv.doc_id]
-                )
-        elif field == "cost":
-            secure_db.update("partner_inventory", {"unit_cost": rec["unit_cost"]}, [doc_id])
-            q2 = Query()
-            inv = secure_db.table("store_inventory").get((q2.store_id == store_id) & (q2.item_id == rec["item_id"]))
-            if inv:
-                secure_db.update(
-                    "store_inventory",
-                    {"unit_cost": rec["unit_cost"]},
-                    [inv.doc_id]
-                )
+        # nothing was written – commit() is all-or-nothing
         await update.callback_query.edit_message_text(
             f"❌ Stock-In edit failed: {str(e)}"
         )
@@ -814,7 +797,9 @@ async def del_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
     rec = recs[0]
 
     try:
-        add_ledger_entry(
+        # delete leg, store inventory and record removal in one write
+        txn = LedgerTransaction()
+        txn.add(
             entry_type="stockin_delete",
             account_type="partner",
             account_id=rec["partner_id"],
@@ -828,22 +813,14 @@ async def del_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
             unit_price=rec["unit_cost"],
             store_id=rec["store_id"]
         )
-    except Exception as e:
-        await update.callback_query.edit_message_text(
-            f"❌ Stock-In delete failed: {str(e)}"
-        )
-        return ConversationHandler.END
-
-    try:
-        if rec:
-            q2 = Query()
-            inv = secure_db.table("store_inventory").get((q2.store_id == rec["store_id"]) &
-                                                        (q2.item_id  == rec["item_id"]))
-            if inv:
-                secure_db.update("store_inventory",
-                                {"quantity": inv["quantity"] - rec["quantity"]},
-                                [inv.doc_id])
-        secure_db.remove("partner_inventory", [doc_id])
+        q2 = Query()
+        inv = secure_db.table("store_inventory").get((q2.store_id == rec["store_id"]) &
+                                                    (q2.item_id  == rec["item_id"]))
+        if inv:
+            txn.update_row("store_inventory", inv.doc_id,
+                           {"quantity": inv["quantity"] - rec["quantity"]})
+        txn.delete_row("partner_inventory", doc_id)
+        txn.commit()
     except Exception as e:
         await update.callback_query.edit_message_text(
             f"❌ Stock-In delete failed: {str(e)}"
@@ -0,0 +1,228 @@
+# handlers/store_stock.py
+"""
+Store-by-item stock, folded from ledger events instead of re-scanned.
+
+report_utils.compute_store_inventory used to re-read every partner and
+customer ledger once per store, and get_global_store_inventory scanned all
+of them again.  StoreStock keeps the per-source sums those two functions
+need, updated on every ledger "add":
+
+  own_in[store][item]            store:<id> `stockin` rows
+  partner_in[partner][sid][item] partner `stockin` rows with a store_id
+  sc_sales[customer][sid][item]  store_customer `sale` rows (−|qty|)
+  sales[(type, id)][item]        general/store/partner `sale` rows with a
+                                 store_id (−|qty|, global view only)
+
+Stock-in slices keep a missing item_id as None; the per-store view shows it
+as "?" like the old code did.
+
+Queries combine those slices with the stores / partners / customers tables
+(one snapshot read) – O(accounts + items), no ledger scan.  The two views
+keep the exact semantics of the functions they replace.
+
+It also keeps the physical on-hand count per (store, item) – stock-in
+groups with their qty edits / deletes folded (as in stock_projection.py),
+minus the store leg of every sale – which is what the `store_inventory`
+table tracks.  reconcile() / /stockcheck list the cells where the two
+disagree.
+
+Deletes and lock/unlock drop the state; it is rebuilt from the ledger index
+(and archived segments) on the next query.
+"""
+
+import logging
+import threading
+from collections import defaultdict
+
+from telegram import Update
+from telegram.ext import CommandHandler, ContextTypes
+
+from secure_db import secure_db
+from handlers.utils import require_unlock_and_admin
+from handlers.ledger import _index, add_ledger_listener, archive_store
+from handlers.ledger_index import row_key
+from handlers.stock_projection import STOCK_TYPES, _Group
+
+logger = logging.getLogger("ledger.store_stock")
+
+GLOBAL_SALE_TYPES = ("general", "store", "partner")
+
+
+def _add(d: dict, item, qty):
+    d[item] = d.get(item, 0) + qty
+
+
+class StoreStock:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.loaded = False
+            self._own_in = {}        # str(store id) → {item: qty}
+            self._partner_in = {}    # str(partner id) → {store_id: {item: qty}}
+            self._sc_sales = {}      # str(customer id) → {store_id: {item: −qty}}
+            self._sales = {}         # (account_type, str(id)) → {item: −qty}
+            self._groups = {}        # (str(partner id), str(related_id)) → _Group
+            self._group_store = {}   # group key → str(store_id)
+            self._sold = {}          # str(store id) → {str(item): qty sold}
+
+    # ── folding ─────────────────────────────────────────────────────────
+    def apply(self, row, doc_id=None):
+        et = row.get("entry_type")
+        at = row.get("account_type")
+        acct = str(row.get("account_id"))
+        sid = row.get("store_id")
+        qty = row.get("quantity") or 0
+        if et == "stockin" and at == "store":
+            _add(self._own_in.setdefault(acct, {}), row.get("item_id"), qty)
+        elif et == "stockin" and at == "partner" and sid is not None:
+            by_store = self._partner_in.setdefault(acct, {})
+            _add(by_store.setdefault(sid, {}), row.get("item_id"), qty)
+        elif et == "sale":
+            if at == "store_customer":
+                by_store = self._sc_sales.setdefault(acct, {})
+                _add(by_store.setdefault(sid, {}), row.get("item_id", "?"), -abs(qty))
+            if at in GLOBAL_SALE_TYPES and sid is not None:
+                _add(self._sales.setdefault((at, acct), {}), row.get("item_id"), -abs(qty))
+            if at == "store":
+                _add(self._sold.setdefault(acct, {}), str(row.get("item_id")), abs(qty))
+        if at == "partner" and et in STOCK_TYPES:
+            key = (acct, str(row.get("related_id")))
+            g = self._groups.setdefault(key, _Group())
+            did = doc_id if doc_id is not None else ("archived", id(row))
+            if et == "stockin":
+                g.stockins[did] = (str(row.get("item_id")), row.get("quantity", 0))
+                self._group_store[key] = str(sid)
+            elif et == "stockin_edit_qty":
+                g.edits[did] = (row_key(row), row.get("quantity"))
+            else:
+                g.deletes.add(did)
+
+    def on_ledger_event(self, event, payload):
+        with self._lock:
+            if not self.loaded:
+                return
+            if event == "add":
+                self.apply(payload, payload.doc_id)
+            else:       # delete / reset: rebuilt on the next query
+                self.reset()
+
+    def ensure_loaded(self):
+        with self._lock:
+            if self.loaded:
+                return
+            for seg in archive_store.indexes_for(None, None):
+                for row in seg.all.rows:
+                    self.apply(row)
+            for row in _index().all.rows:
+                self.apply(row, row.doc_id)
+            self.loaded = True
+
+    # ── views ───────────────────────────────────────────────────────────
+    def per_store(self, tables: dict | None = None) -> dict:
+        """{store doc_id: {item_id: qty}} – compute_store_inventory semantics."""
+        tables = tables if tables is not None else secure_db.snapshot()
+        self.ensure_loaded()
+        stores = {int(k): v for k, v in tables.get("stores", {}).items()}
+        customers = tables.get("customers", {})
+        with self._lock:
+            inventory = {}
+            for sid, store in stores.items():
+                stock = defaultdict(int)
+                for item, q in self._own_in.get(str(sid), {}).items():
+                    stock["?" if item is None else item] += q
+                for pid in tables.get("partners", {}):
+                    for item, q in self._partner_in.get(pid, {}).get(sid, {}).items():
+                        stock["?" if item is None else item] += q
+                for cid, cust in customers.items():
+                    if cust.get("name") == store.get("name"):
+                        for item, q in self._sc_sales.get(cid, {}).get(sid, {}).items():
+                            stock[item] += q
+                inventory[sid] = dict(stock)
+            return inventory
+
+    def global_stock(self, tables: dict | None = None) -> defaultdict:
+        """{item_id: units} – get_global_store_inventory semantics."""
+        tables = tables if tables is not None else secure_db.snapshot()
+        self.ensure_loaded()
+        with self._lock:
+            balance = defaultdict(int)
+            for sid in tables.get("stores", {}):
+                for item, q in self._own_in.get(sid, {}).items():
+                    balance[item] += q
+            for pid in tables.get("partners", {}):
+                for by_item in self._partner_in.get(pid, {}).values():
+                    for item, q in by_item.items():
+                        balance[item] += q
+            for at in GLOBAL_SALE_TYPES:
+                for acct in tables.get(at + "s", {}):
+                    for item, q in self._sales.get((at, acct), {}).items():
+                        balance[item] += q
+            return balance
+
+    def on_hand(self) -> dict:
+        """{str(store_id): {str(item_id): qty}} physical stock from the ledger."""
+        self.ensure_loaded()
+        with self._lock:
+            out = {}
+            for sid, items in self._own_in.items():
+                for item, q in items.items():
+                    _add(out.setdefault(sid, {}), str(item), q)
+            for key, g in self._groups.items():
+                sid = self._group_store.get(key)
+                if sid is None:
+                    continue
+                for item, q in g.contribution().items():
+                    _add(out.setdefault(sid, {}), item, q)
+            for sid, items in self._sold.items():
+                for item, q in items.items():
+                    _add(out.setdefault(sid, {}), item, -q)
+            return out
+
+    def reconcile(self, tables: dict | None = None) -> list[tuple]:
+        """[(store_id, item_id, ledger_qty, table_qty)] where they differ."""
+        tables = tables if tables is not None else secure_db.snapshot()
+        table = {}
+        for rec in tables.get("store_inventory", {}).values():
+            key = (str(rec.get("store_id")), str(rec.get("item_id")))
+            table[key] = table.get(key, 0) + (rec.get("quantity") or 0)
+        ledger = {(sid, item): q for sid, items in self.on_hand().items()
+                  for item, q in items.items()}
+        diffs = []
+        for key in sorted(ledger.keys() | table.keys()):
+            lq, tq = ledger.get(key, 0), table.get(key, 0)
+            if lq != tq:
+                diffs.append((*key, lq, tq))
+        return diffs
+
+
+store_stock = StoreStock()
+add_ledger_listener(store_stock.on_ledger_event)
+
+
+# ─────────────────────────────────────────────────────────────────────────
+#  /stockcheck
+# ─────────────────────────────────────────────────────────────────────────
+@require_unlock_and_admin
+async def stock_check_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        diffs = store_stock.reconcile()
+    except Exception as e:
+        logger.exception("Stock reconciliation failed")
+        await update.message.reply_text(f"❌ Stock check failed: {e}")
+        return
+    if not diffs:
+        await update.message.reply_text("✅ store_inventory matches the ledger.")
+        return
+    lines = [f"⚠️ {len(diffs)} store/item cell(s) differ (ledger vs store_inventory):"]
+    for sid, item, lq, tq in diffs[:50]:
+        lines.append(f"• store {sid} [{item}]: ledger {lq} vs table {tq}")
+    if len(diffs) > 50:
+        lines.append(f"… and {len(diffs) - 50} more")
+    await update.message.reply_text("\n".join(lines)[:4096])
+
+
+def register_store_stock_handlers(app):
+    app.add_handler(CommandHandler("stockcheck", stock_check_command))
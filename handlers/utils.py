@@ -5,6 +5,7 @@ from secure_db import secure_db
 from telegram import Update
 from telegram.ext import ConversationHandler, ContextTypes
 from functools import wraps
+from decimal import Decimal, ROUND_HALF_UP
 from config import ADMIN_TELEGRAM_ID
 
 def require_unlock_and_admin(func):
@@ -80,6 +81,47 @@ def fmt_money(amount: float, code: str | None = "USD") -> str:
     sign = _CURRENCY_SIGNS.get((code or "USD").upper(), f"{code or ''} ")
     return f"{sign}{amount:,.2f}"
 
+# Digits after the decimal point per ISO-4217 code; anything else is 2.
+_CURRENCY_EXPONENTS = {
+    "JPY": 0, "KRW": 0, "VND": 0, "CLP": 0, "ISK": 0, "UGX": 0,
+    "BHD": 3, "KWD": 3, "OMR": 3, "JOD": 3, "TND": 3,
+    # add or override as needed …
+}
+
+def currency_exponent(code: str | None) -> int:
+    return _CURRENCY_EXPONENTS.get((code or "USD").upper(), 2)
+
+def to_minor(amount, code: str | None = "USD") -> int:
+    """
+    12.34, 'USD' → 1234   (rounded half-away-from-zero to the minor unit)
+    None / '' → 0
+    """
+    if amount is None or amount == "":
+        return 0
+    exp = currency_exponent(code)
+    if isinstance(amount, int):
+        return amount * 10 ** exp
+    # via the shortest repr, not the binary float: 1.005 → 101, 2.675 → 268
+    exact = Decimal(str(amount)).quantize(Decimal(1).scaleb(-exp), ROUND_HALF_UP)
+    return int(exact.scaleb(exp))
+
+def from_minor(minor: int, code: str | None = "USD") -> float:
+    """1234, 'USD' → 12.34"""
+    return minor / 10 ** currency_exponent(code)
+
+def fmt_minor(minor: int, code: str | None = "USD") -> str:
+    """1234, 'USD' → '$12.34'  (decimals follow the currency exponent)"""
+    exp = currency_exponent(code)
+    sign = _CURRENCY_SIGNS.get((code or "USD").upper(), f"{code or ''} ")
+    return f"{sign}{minor / 10 ** exp:,.{exp}f}"
+
+def sum_money(amounts, code: str | None = "USD") -> float:
+    """
+    Exact total of float amounts: summed as integer minor units, converted
+    back once.  sum_money([0.1] * 10) == 1.0
+    """
+    return from_minor(sum(to_minor(a, code) for a in amounts), code)
+
 # ── Date ───────────────────────────────────────────────────────
 def fmt_date(ddmmyyyy: str | None) -> str:
     """
@@ -0,0 +1,411 @@
+# handlers/verify_ledger.py
+"""
+Double-entry validator: /verifyledger and `python -m handlers.verify_ledger`.
+
+One pass over `ledger_entries` in write order (archived segments first),
+grouping legs by related_id.  Legs are held only while a group is "open":
+once WINDOW rows have gone by without touching it, the group is checked and
+reduced to a bitmask of the leg kinds it contained.  A group that shows up
+again later (edits, deletes) is checked as a continuation against that
+bitmask, so the validator's own state is the window plus one small int per
+related_id.
+
+The rows themselves are not streamed: the DB is one encrypted JSON
+document, so verify_ledger() decrypts it whole with secure_db.snapshot()
+(archived segments come from the session's archive cache), and peak memory
+is that of the decrypted DB.  The pass over the rows takes about 4 s for
+1M rows (500k two-leg payment groups, measured on verify_rows); decrypting
+and parsing the file come on top.
+
+Per flow (classified from the leg kinds present):
+  sale               buyer `sale` + store `sale`, equal quantities,
+                     partner/store handling fees net to zero
+  partner_sale       partner `sale` + owner `partner_sale` (and their
+                     *_delete pair) net to zero
+  payment            customer `payment` + owner `payment_recv` (= usd_amt)
+  payout             partner `payment` + owner `payout_sent` (= −usd_amt)
+  dividend_credit    partner `project_payout` + `dividend_credit`, net zero
+  dividend_withdraw  `dividend_withdrawal` + owner `payout_sent`
+  investor_expense   `investor_expense` + `expense_credit`
+  stockin            edits/deletes need the original `stockin` leg
+  expense / pot_adjustment / opening_balance – single legs
+
+Afterwards `sales`, `partner_inventory`, `partner_payouts` and
+`customer_payments` rows must reference a live group of the right kind.
+All amounts are compared in integer minor units.
+"""
+
+import argparse
+import getpass
+import logging
+import sys
+import time
+from collections import OrderedDict
+
+from telegram import Update
+from telegram.ext import CommandHandler, ContextTypes
+from tinydb.table import Document
+
+from secure_db import secure_db
+from handlers.utils import require_unlock_and_admin, to_minor
+from handlers.ledger import LEDGER_TABLE, archive_store
+from handlers.ledger_index import amount_minor
+
+logger = logging.getLogger("ledger.verify")
+
+WINDOW = 5000           # rows a group may stay untouched before it is checked
+MAX_LEGS = 64           # legs kept per open group
+MAX_EXAMPLES = 5        # examples kept per issue kind
+
+# ── leg kinds (bit flags) ────────────────────────────────────────────────
+BUYER_SALE, STORE_SALE, STORE_FEE, PARTNER_FEE = 1, 2, 4, 8
+OWNER_PSALE, PSALE_DEL, OWNER_PSALE_DEL = 16, 32, 64
+CUST_PAYMENT, OWNER_RECV, PARTNER_PAYMENT, OWNER_PAYOUT = 128, 256, 512, 1024
+STOCKIN, STOCKIN_EDIT, STOCKIN_DEL = 2048, 4096, 8192
+PROJECT_PAYOUT, DIV_CREDIT, DIV_WITHDRAW, OWNER_FEE = 2**14, 2**15, 2**16, 2**17
+INV_EXPENSE, EXPENSE_CREDIT = 2**18, 2**19
+EXPENSE, POT_ADJ, OPENING = 2**20, 2**21, 2**22
+
+_BY_TYPE = {
+    ("store", "sale"): STORE_SALE,
+    ("store", "handling_fee"): STORE_FEE,
+    ("partner", "handling_fee"): PARTNER_FEE,
+    ("owner", "partner_sale"): OWNER_PSALE,
+    ("partner", "sale_delete"): PSALE_DEL,
+    ("owner", "partner_sale_delete"): OWNER_PSALE_DEL,
+    ("customer", "payment"): CUST_PAYMENT,
+    ("owner", "payment_recv"): OWNER_RECV,
+    ("partner", "payment"): PARTNER_PAYMENT,
+    ("owner", "payout_sent"): OWNER_PAYOUT,
+    ("partner", "stockin"): STOCKIN,
+    ("partner", "stockin_edit_qty"): STOCKIN_EDIT,
+    ("partner", "stockin_edit_cost"): STOCKIN_EDIT,
+    ("partner", "stockin_delete"): STOCKIN_DEL,
+    ("partner", "project_payout"): PROJECT_PAYOUT,
+    ("partner_dividends", "dividend_credit"): DIV_CREDIT,
+    ("partner_dividends", "dividend_withdrawal"): DIV_WITHDRAW,
+    ("owner", "fee"): OWNER_FEE,
+    ("partner", "investor_expense"): INV_EXPENSE,
+    ("partner", "expense_credit"): EXPENSE_CREDIT,
+    ("owner", "pot_adjustment"): POT_ADJ,
+}
+
+_KIND_NAMES = {
+    BUYER_SALE: "buyer:sale", STORE_SALE: "store:sale", STORE_FEE: "store:handling_fee",
+    PARTNER_FEE: "partner:handling_fee", OWNER_PSALE: "owner:partner_sale",
+    PSALE_DEL: "partner:sale_delete", OWNER_PSALE_DEL: "owner:partner_sale_delete",
+    CUST_PAYMENT: "customer:payment", OWNER_RECV: "owner:payment_recv",
+    PARTNER_PAYMENT: "partner:payment", OWNER_PAYOUT: "owner:payout_sent",
+    STOCKIN: "partner:stockin", STOCKIN_EDIT: "partner:stockin_edit",
+    STOCKIN_DEL: "partner:stockin_delete", PROJECT_PAYOUT: "partner:project_payout",
+    DIV_CREDIT: "dividends:credit", DIV_WITHDRAW: "dividends:withdrawal",
+    OWNER_FEE: "owner:fee", INV_EXPENSE: "partner:investor_expense",
+    EXPENSE_CREDIT: "partner:expense_credit", EXPENSE: "expense",
+    POT_ADJ: "owner:pot_adjustment", OPENING: "opening_balance",
+}
+
+_UNIQUE = (BUYER_SALE, STORE_SALE, OWNER_PSALE, CUST_PAYMENT, OWNER_RECV,
+           PARTNER_PAYMENT, OWNER_PAYOUT, STOCKIN, PROJECT_PAYOUT, DIV_CREDIT)
+
+_TABLE_REFS = {             # table → leg kind its related_id must point at
+    "sales": BUYER_SALE,
+    "partner_inventory": STOCKIN,
+    "partner_payouts": PARTNER_PAYMENT,
+    "customer_payments": CUST_PAYMENT,
+}
+
+
+def leg_kind(row) -> int:
+    at, et = row.get("account_type"), row.get("entry_type")
+    kind = _BY_TYPE.get((at, et))
+    if kind:
+        return kind
+    if et == "sale" and at not in ("store", "owner"):
+        return BUYER_SALE       # customer / general / store_customer / partner buyer
+    if et == "expense":
+        return EXPENSE
+    if et == "opening_balance":
+        return OPENING
+    return 0
+
+
+class Leg:
+    __slots__ = ("kind", "doc_id", "currency", "minor", "qty", "usd_minor")
+
+    def __init__(self, row, kind):
+        self.kind = kind
+        self.doc_id = getattr(row, "doc_id", None)
+        self.currency = row.get("currency")
+        self.minor = amount_minor(row)
+        self.qty = row.get("quantity")
+        usd = row.get("usd_amt")
+        self.usd_minor = None if usd is None else to_minor(usd, "USD")
+
+
+class Report:
+    def __init__(self, max_examples=MAX_EXAMPLES):
+        self.max_examples = max_examples
+        self.rows = 0
+        self.groups = 0
+        self.flows = {}
+        self.issues = {}        # reason → count
+        self.examples = {}      # reason → [(related_id, detail)]
+        self.unlinked = {}      # table → rows without related_id
+        self.seconds = 0.0
+
+    def issue(self, reason: str, related_id, detail: str = ""):
+        self.issues[reason] = self.issues.get(reason, 0) + 1
+        ex = self.examples.setdefault(reason, [])
+        if len(ex) < self.max_examples:
+            ex.append((related_id, detail))
+
+    @property
+    def ok(self) -> bool:
+        return not self.issues
+
+    def format(self) -> str:
+        lines = [f"🧮 Ledger verification: {self.rows} rows, {self.groups} groups "
+                 f"in {self.seconds:.1f}s"]
+        if self.flows:
+            lines.append("Flows: " + ", ".join(f"{k} {v}" for k, v in sorted(self.flows.items())))
+        for table, n in sorted(self.unlinked.items()):
+            lines.append(f"ℹ️ {n} {table} rows carry no related_id (not checked)")
+        if self.ok:
+            lines.append("✅ No issues found")
+            return "\n".join(lines)
+        lines.append(f"❌ {sum(self.issues.values())} issue(s):")
+        for reason, n in sorted(self.issues.items(), key=lambda kv: -kv[1]):
+            lines.append(f"• {reason}: {n}")
+            for rid, detail in self.examples.get(reason, []):
+                lines.append(f"    rel={rid} {detail}".rstrip())
+        return "\n".join(lines)
+
+
+def _names(bits: int) -> str:
+    return "+".join(name for k, name in _KIND_NAMES.items() if bits & k)
+
+
+def _net_zero(legs, kinds) -> bool:
+    totals = {}
+    for l in legs:
+        if l.kind & kinds:
+            totals[l.currency] = totals.get(l.currency, 0) + l.minor
+    return not any(totals.values())
+
+
+def check_group(rid, legs: list, prior: int, report: Report) -> int:
+    """Check one (part of a) group; returns the bitmask of its leg kinds."""
+    seen = 0
+    for l in legs:
+        seen |= l.kind
+    bits = seen | prior
+    continued = bool(prior)
+
+    if not continued:
+        for k in _UNIQUE:
+            if sum(1 for l in legs if l.kind == k) > 1:
+                report.issue("duplicate leg", rid, _names(k))
+
+    def need(*kinds):
+        for k in kinds:
+            if not bits & k:
+                report.issue("missing leg", rid, f"{_names(k)} (have {_names(bits)})")
+
+    if bits & (STOCKIN | STOCKIN_EDIT | STOCKIN_DEL):
+        flow = "stockin"
+        need(STOCKIN)
+        if any(l.minor for l in legs):
+            report.issue("stock-in leg with non-zero amount", rid)
+    elif bits & (OWNER_PSALE | PSALE_DEL | OWNER_PSALE_DEL):
+        flow = "partner_sale"
+        need(BUYER_SALE, OWNER_PSALE)
+        if seen & (PSALE_DEL | OWNER_PSALE_DEL) and not (seen & PSALE_DEL and seen & OWNER_PSALE_DEL):
+            report.issue("unpaired delete leg", rid, _names(seen))
+        if not _net_zero(legs, BUYER_SALE | OWNER_PSALE | PSALE_DEL | OWNER_PSALE_DEL):
+            report.issue("partner sale does not net to zero", rid)
+    elif bits & (BUYER_SALE | STORE_SALE | STORE_FEE | PARTNER_FEE):
+        flow = "sale"
+        need(BUYER_SALE, STORE_SALE)
+        buyer = [l for l in legs if l.kind == BUYER_SALE and l.qty is not None]
+        store = [l for l in legs if l.kind == STORE_SALE]
+        if buyer and store and buyer[0].qty != store[0].qty:
+            report.issue("sale quantity mismatch", rid, f"buyer {buyer[0].qty} vs store {store[0].qty}")
+        if any(l.minor for l in store):
+            report.issue("store sale leg with non-zero amount", rid)
+        if seen & PARTNER_FEE and not _net_zero(legs, STORE_FEE | PARTNER_FEE):
+            report.issue("handling fees do not net to zero", rid)
+    elif bits & (CUST_PAYMENT | OWNER_RECV):
+        flow = "payment"
+        need(CUST_PAYMENT, OWNER_RECV)
+        cust = [l for l in legs if l.kind == CUST_PAYMENT]
+        owner = [l for l in legs if l.kind == OWNER_RECV]
+        if cust and owner and cust[0].usd_minor is not None and owner[0].minor != cust[0].usd_minor:
+            report.issue("payment USD legs differ", rid,
+                         f"customer usd {cust[0].usd_minor} vs owner {owner[0].minor} (minor units)")
+    elif bits & DIV_WITHDRAW:
+        flow = "dividend_withdraw"
+        need(DIV_WITHDRAW, OWNER_PAYOUT)
+    elif bits & (PARTNER_PAYMENT | OWNER_PAYOUT):
+        flow = "payout"
+        need(PARTNER_PAYMENT, OWNER_PAYOUT)
+        part = [l for l in legs if l.kind == PARTNER_PAYMENT]
+        owner = [l for l in legs if l.kind == OWNER_PAYOUT]
+        if part and owner and part[0].usd_minor is not None and owner[0].minor != -part[0].usd_minor:
+            report.issue("payout USD legs differ", rid,
+                         f"partner usd {part[0].usd_minor} vs owner {owner[0].minor} (minor units)")
+    elif bits & (PROJECT_PAYOUT | DIV_CREDIT):
+        flow = "dividend_credit"
+        need(PROJECT_PAYOUT, DIV_CREDIT)
+        if not continued and not _net_zero(legs, PROJECT_PAYOUT | DIV_CREDIT):
+            report.issue("dividend credit does not net to zero", rid)
+    elif bits & (INV_EXPENSE | EXPENSE_CREDIT):
+        flow = "investor_expense"
+        need(INV_EXPENSE, EXPENSE_CREDIT)
+    elif bits & OWNER_FEE:
+        flow = "fee"
+        report.issue("orphaned leg", rid, "owner fee without a parent flow")
+    elif bits & (EXPENSE | POT_ADJ | OPENING):
+        flow = "single"
+    else:
+        flow = "unknown"
+    if bits & OWNER_FEE and flow not in ("dividend_withdraw", "investor_expense", "fee"):
+        report.issue("orphaned leg", rid, f"owner fee inside a {flow} group")
+    single = bits & (EXPENSE | POT_ADJ | OPENING)
+    if single and bits & ~single:
+        report.issue("mixed flows under one related_id", rid, _names(bits))
+
+    if not continued:
+        report.flows[flow] = report.flows.get(flow, 0) + 1
+    return bits
+
+
+def verify_rows(rows, tables: dict | None = None, window: int = WINDOW,
+                max_examples: int = MAX_EXAMPLES) -> Report:
+    """
+    Validate ledger *rows* (iterable of dicts, write order) and, optionally,
+    the business tables in *tables* ({name: iterable of rows}).
+    """
+    t0 = time.perf_counter()
+    report = Report(max_examples)
+    open_groups = OrderedDict()     # rid → [last_pos, legs]
+    digest = {}                     # rid → bitmask of checked legs
+
+    def close(rid, legs):
+        digest[rid] = check_group(rid, legs, digest.get(rid, 0), report)
+
+    pos = 0
+    for row in rows:
+        pos += 1
+        kind = leg_kind(row)
+        rid = row.get("related_id")
+        if not kind:
+            report.issue("unknown entry type", rid,
+                         f"{row.get('account_type')}:{row.get('entry_type')}")
+            continue
+        if rid is None:
+            if kind & (EXPENSE | POT_ADJ | OPENING):
+                continue
+            report.issue("leg without related_id", None,
+                         f"{row.get('account_type')}:{row.get('entry_type')} doc={getattr(row, 'doc_id', '?')}")
+            continue
+        rid = str(rid)
+        g = open_groups.get(rid)
+        if g is None:
+            g = open_groups[rid] = [pos, []]
+        else:
+            g[0] = pos
+            open_groups.move_to_end(rid)
+        if len(g[1]) < MAX_LEGS:
+            g[1].append(Leg(row, kind))
+        elif len(g[1]) == MAX_LEGS:
+            report.issue("oversized group", rid, f">{MAX_LEGS} legs")
+            g[1].append(None)
+        # check groups that went quiet
+        while open_groups:
+            old_rid, (last, legs) = next(iter(open_groups.items()))
+            if pos - last < window:
+                break
+            open_groups.popitem(last=False)
+            close(old_rid, [l for l in legs if l is not None])
+    for rid, (_, legs) in open_groups.items():
+        close(rid, [l for l in legs if l is not None])
+    report.rows = pos
+    report.groups = len(digest)
+
+    for table, kind in _TABLE_REFS.items():
+        for rec in (tables or {}).get(table, ()):
+            rid = rec.get("related_id")
+            if rid is None:
+                report.unlinked[table] = report.unlinked.get(table, 0) + 1
+                continue
+            if not digest.get(str(rid), 0) & kind:
+                report.issue(f"{table} row without its ledger group", rid,
+                             f"expects {_names(kind)}")
+    report.seconds = time.perf_counter() - t0
+    return report
+
+
+# ─────────────────────────────────────────────────────────────────────────
+#  Data source: one decrypted snapshot (+ archived segments)
+# ─────────────────────────────────────────────────────────────────────────
+def _snapshot_rows(snapshot: dict, table: str):
+    for doc_id, row in (snapshot.get(table) or {}).items():
+        yield Document(row, int(doc_id))
+
+
+def verify_ledger(include_archives: bool = True, window: int = WINDOW,
+                  max_examples: int = MAX_EXAMPLES) -> Report:
+    """
+    Validate the unlocked DB: archives (oldest first), then the hot ledger.
+    Reads the whole DB into memory once (see module doc).
+    """
+    snapshot = secure_db.snapshot()
+
+    def rows():
+        if include_archives:
+            for seg in archive_store.indexes_for(None, None):
+                yield from sorted(seg.all.rows, key=lambda r: r.doc_id)
+        yield from _snapshot_rows(snapshot, LEDGER_TABLE)
+
+    tables = {t: _snapshot_rows(snapshot, t) for t in _TABLE_REFS}
+    return verify_rows(rows(), tables, window, max_examples)
+
+
+@require_unlock_and_admin
+async def verify_ledger_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    hot_only = bool(context.args) and context.args[0].lower() == "hot"
+    await update.message.reply_text("🧮 Verifying ledger…")
+    try:
+        report = verify_ledger(include_archives=not hot_only)
+    except Exception as e:
+        logger.exception("Ledger verification failed")
+        await update.message.reply_text(f"❌ Verification failed: {e}")
+        return
+    await update.message.reply_text(report.format()[:4096])
+
+
+def register_verify_ledger_handlers(app):
+    app.add_handler(CommandHandler("verifyledger", verify_ledger_command))
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Validate ledger double-entry groups.")
+    ap.add_argument("--hot-only", action="store_true", help="skip archived segments")
+    ap.add_argument("--window", type=int, default=WINDOW)
+    ap.add_argument("--examples", type=int, default=MAX_EXAMPLES)
+    args = ap.parse_args(argv)
+
+    pin = getpass.getpass("PIN: ") if sys.stdin.isatty() else sys.stdin.readline().strip()
+    if not secure_db.unlock(pin):
+        print("❌ Unlock failed", file=sys.stderr)
+        return 2
+    try:
+        report = verify_ledger(not args.hot_only, args.window, args.examples)
+    finally:
+        secure_db.lock()
+    print(report.format())
+    return 0 if report.ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,7 @@ import os
 import json
 import base64
 import logging
+import threading
 import time
 from tinydb import TinyDB
 from tinydb.storages import JSONStorage
@@ -17,6 +18,10 @@ logger.setLevel(logging.INFO)
 
 
 class EncryptedJSONStorage(JSONStorage):
+    # write() truncates before writing: a read from another thread (report
+    # snapshots, handlers/reports/workers.py) must not see a half-written file
+    _io_lock = threading.Lock()
+
     def __init__(self, path, fernet: Fernet, **kwargs):
         super().__init__(path, **kwargs)
         self.fernet = fernet
@@ -28,7 +33,7 @@ class EncryptedJSONStorage(JSONStorage):
             if not os.path.exists(self._my_path):
                 logger.warning("📂 DB file does not exist, returning {}")
                 return {}
-            with open(self._my_path, "r", encoding="utf-8") as f:
+            with self._io_lock, open(self._my_path, "r", encoding="utf-8") as f:
                 raw = f.read()
             if not raw:
                 logger.warning("📂 DB file is empty, returning {}")
@@ -49,7 +54,7 @@ class EncryptedJSONStorage(JSONStorage):
             json_str = json.dumps(data, separators=(",", ":")).encode()
             token = self.fernet.encrypt(json_str)
             encoded = base64.urlsafe_b64encode(token).decode()
-            with open(self._my_path, "w", encoding="utf-8") as f:
+            with self._io_lock, open(self._my_path, "w", encoding="utf-8") as f:
                 f.seek(0)
                 f.truncate()
                 f.write(encoded)
@@ -68,6 +73,9 @@ class SecureDB:
         self._unlocked = False
         self._failed_attempts = 0
         self._last_access = time.monotonic()
+        self._session_hooks = []
+        self._version = 0
+        self._table_versions = {}
 
     # ------------------------------------------------------------------ #
     #  Internal helpers
@@ -96,6 +104,14 @@ class SecureDB:
         logger.debug("🔑 Derived encryption key from PIN and salt")
         return Fernet(token)
 
+    def _run_session_hooks(self):
+        self._version += 1
+        for hook in self._session_hooks:
+            try:
+                hook()
+            except Exception as e:
+                logger.error(f"❌ Session hook {hook!r} failed: {e}")
+
     # ------------------------------------------------------------------ #
     #  Unlock / lock
     # ------------------------------------------------------------------ #
@@ -113,6 +129,7 @@ class SecureDB:
             self._unlocked = True
             self._failed_attempts = 0
             self._last_access = time.monotonic()
+            self._run_session_hooks()
             return True
         except Exception as e:
             self._failed_attempts += 1
@@ -127,10 +144,37 @@ class SecureDB:
             self.db.close()
             self._unlocked = False
             logger.info("🔒 Database locked")
+            self._run_session_hooks()
+
+    def add_session_hook(self, hook):
+        """
+        Register *hook* (no arguments) to run after every real unlock and lock.
+        Modules holding in-memory state derived from the DB use it to reset.
+        """
+        if hook not in self._session_hooks:
+            self._session_hooks.append(hook)
 
     def is_unlocked(self) -> bool:
         return self._unlocked
 
+    @property
+    def version(self) -> int:
+        """
+        Bumped by every insert / update / remove / atomic_update and on
+        lock / unlock, so caches of data read from any table can key on it.
+        (Direct secure_db.table(...) writes – ledger batches, meta rows –
+        don't bump it; the ledger has its own version.)
+        """
+        return self._version
+
+    def table_version(self, table) -> int:
+        """Bumped by every insert / update / remove on *table* (see version)."""
+        return self._table_versions.get(table, 0)
+
+    def _bump(self, table):
+        self._version += 1
+        self._table_versions[table] = self._table_versions.get(table, 0) + 1
+
     def has_pin(self) -> bool:
         return os.path.exists(DB_FILE) and os.path.exists(SALT_FILE)
 
@@ -149,6 +193,7 @@ class SecureDB:
         self._unlocked = False
         self._failed_attempts = 0
         logger.critical("💥 Database and salt wiped due to security policy")
+        self._run_session_hooks()
 
     # ------------------------------------------------------------------ #
     #  Activity / access helpers
@@ -169,6 +214,7 @@ class SecureDB:
     def insert(self, table, doc):
         self.ensure_unlocked()
         result = self.db.table(table).insert(doc)
+        self._bump(table)
         self.db.close()
         self.unlock(self._passphrase)
         return result
@@ -197,6 +243,7 @@ class SecureDB:
         else:
             result = tab.update(fields, cond)
 
+        self._bump(table)
         self.db.close()
         self.unlock(self._passphrase)
         return result
@@ -217,6 +264,7 @@ class SecureDB:
         else:
             result = tab.remove(cond)
 
+        self._bump(table)
         self.db.close()
         self.unlock(self._passphrase)
         return result
@@ -229,5 +277,28 @@ class SecureDB:
         self.ensure_unlocked()
         return self.db.table(name)
 
+    def snapshot(self) -> dict:
+        """One decrypted read of every table: {table: {str(doc_id): doc}}."""
+        self.ensure_unlocked()
+        return self.db.storage.read() or {}
+
+    def atomic_update(self, mutate):
+        """
+        Apply *mutate(tables)* to the raw DB dict ({table: {str(doc_id): doc}})
+        and persist it with ONE encrypted write, so multi-table changes land
+        all-or-nothing.  The TinyDB handle is then re-opened (fresh table
+        caches / next ids) and session hooks run to drop derived state.
+        """
+        self.ensure_unlocked()
+        storage = self.db.storage
+        tables = storage.read() or {}
+        result = mutate(tables)
+        storage.write(tables)
+        self._version += 1
+        self.db.close()
+        self.db = TinyDB(DB_FILE, storage=lambda p: EncryptedJSONStorage(p, self.fernet))
+        self._run_session_hooks()
+        return result
+
 
 secure_db = SecureDB()
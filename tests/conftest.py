@@ -19,3 +19,23 @@ def db(tmp_path_factory):
     test_db = SecureDB(str(path))
     yield test_db
     # No teardown necessary; temporary directories are handled by pytest
+
+
+@pytest.fixture
+def unlocked_db(tmp_path, monkeypatch):
+    """
+    The global `secure_db` instance, unlocked against a throw-away encrypted
+    DB + salt in tmp_path.  Handlers and ledger helpers use it unchanged.
+    """
+    import secure_db as secure_db_module
+
+    salt_file = tmp_path / "kdf_salt.bin"
+    salt_file.write_bytes(os.urandom(16))
+    monkeypatch.setattr(secure_db_module, "DB_FILE", str(tmp_path / "db.json"))
+    monkeypatch.setattr(secure_db_module, "SALT_FILE", str(salt_file))
+
+    sdb = secure_db_module.secure_db
+    sdb.lock()
+    assert sdb.unlock("Test-PIN-123!")
+    yield sdb
+    sdb.lock()
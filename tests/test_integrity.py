@@ -0,0 +1,50 @@
+from handlers import ledger_archive
+from handlers.integrity import verify_chain
+from handlers.ledger import LEDGER_TABLE, add_ledger_entry, delete_ledger_entries_by_related
+from handlers.period_close import close_period
+
+
+def _write(n, day="01032025"):
+    return [add_ledger_entry("customer", 1, "payment", None, float(i + 1), "USD", date=day)
+            for i in range(n)]
+
+
+def test_incremental_verification_only_checks_new_entries(unlocked_db):
+    _write(3)
+    first = verify_chain()
+    assert first["first_bad"] is None and first["checked"] == 3
+    assert len(first["days"]) == 1
+
+    _write(2)
+    second = verify_chain()
+    assert second["first_bad"] is None
+    assert (second["from_seq"], second["checked"]) == (3, 2)
+    assert verify_chain()["checked"] == 0
+
+
+def test_tampering_is_pinpointed(unlocked_db):
+    _write(4)
+    verify_chain()                                  # the session's index is loaded
+    # edit the file behind the bot's back, session still unlocked
+    tables = unlocked_db.db.storage.read()
+    tables[LEDGER_TABLE]["3"]["amount"] = 99.0
+    unlocked_db.db.storage.write(tables)
+
+    bad = verify_chain(full=True)["first_bad"]
+    assert bad["chain_seq"] == 3 and bad["doc_id"] == 3
+    assert "modified" in bad["reason"]
+
+
+def test_rollbacks_and_period_close_keep_the_chain_verifiable(unlocked_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(ledger_archive, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    rel = add_ledger_entry("customer", 1, "sale", None, -5.0, "USD", date="01012024")
+    add_ledger_entry("customer", 2, "payment", None, 5.0, "USD", date="02012024")
+    delete_ledger_entries_by_related("customer", 1, rel)
+    add_ledger_entry("customer", 2, "payment", None, 1.0, "USD", date="02022025")
+    close_period("01012025")
+    _write(1)
+
+    report = verify_chain(full=True)
+    assert report["first_bad"] is None
+    assert report["checked"] == report["head_seq"] == 5
+    assert report["mismatched_days"] == []
@@ -0,0 +1,53 @@
+from datetime import datetime
+
+from handlers.ledger import (
+    add_ledger_entry,
+    delete_ledger_entries_by_related,
+    get_balance,
+    get_ledger,
+    iter_ledger,
+    ledger_version,
+)
+
+
+def _seed():
+    add_ledger_entry("customer", 1, "sale", None, -50.0, "USD", date="10012025",
+                     item_id="A", quantity=-5, unit_price=10.0, store_id=3)
+    add_ledger_entry("customer", 1, "payment", None, 20.0, "USD", date="05012025")
+    add_ledger_entry("customer", 2, "sale", None, -10.0, "USD", date="01022025",
+                     item_id="B", quantity=-1, unit_price=10.0, store_id=4)
+    # back-dated entry written last must still come out first
+    add_ledger_entry("customer", 1, "sale", None, -7.0, "USD", date="31122024",
+                     item_id="A", quantity=-1, unit_price=7.0, store_id=4)
+
+
+def test_entries_are_yielded_in_date_order(unlocked_db):
+    _seed()
+    dates = [e["date"] for e in iter_ledger("customer", 1)]
+    assert dates == ["31122024", "05012025", "10012025"]
+    assert [e["date"] for e in get_ledger("customer", 1)] == dates
+
+
+def test_predicates_are_combined(unlocked_db):
+    _seed()
+    sales = list(iter_ledger(entry_types="sale", item_id="A"))
+    assert [e["amount"] for e in sales] == [-7.0, -50.0]
+    assert [e["account_id"] for e in iter_ledger(entry_types=["sale"], store_id=4)] == [1, 2]
+    window = iter_ledger("customer", 1, entry_types="sale",
+                         start=datetime(2025, 1, 1), end="31012025")
+    assert [e["amount"] for e in window] == [-50.0]
+
+
+def test_writes_and_deletes_keep_index_current(unlocked_db):
+    _seed()
+    v = ledger_version()
+    assert get_balance("customer", 1) == -37.0
+    rid = add_ledger_entry("customer", 1, "payment", None, 37.0, "USD", date="02022025")
+    assert ledger_version() > v
+    assert get_balance("customer", 1) == 0.0
+    delete_ledger_entries_by_related("customer", 1, rid)
+    assert get_balance("customer", 1) == -37.0
+    # a fresh session sees the same persisted state
+    unlocked_db.lock()
+    assert unlocked_db.unlock("Test-PIN-123!")
+    assert get_balance("customer", 1) == -37.0
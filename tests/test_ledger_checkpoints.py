@@ -0,0 +1,23 @@
+from handlers import ledger
+from handlers.ledger import add_ledger_entry, get_account_totals, get_balance
+
+
+def test_checkpointed_balances_match_full_sums(unlocked_db, monkeypatch):
+    monkeypatch.setattr(ledger._checkpoints, "every", 2)
+    for day in range(1, 9):
+        add_ledger_entry("store", 5, "stockin", None, float(day), "USD",
+                         date=f"{day:02d}032025", item_id="A", quantity=day)
+    assert get_balance("store", 5) == 36.0
+    acct = ("store", "5")
+    assert ledger._checkpoints.checkpoint_count(acct) == 4
+
+    bal, units = get_account_totals("store", 5, as_of="05032025")
+    assert bal == 15.0 and units == {"A": 15}
+
+    # a back-dated entry invalidates the checkpoints that cover it
+    add_ledger_entry("store", 5, "stockin", None, 100.0, "USD",
+                     date="02032025", item_id="A", quantity=1)
+    assert ledger._checkpoints.checkpoint_count(acct) == 1
+    assert get_balance("store", 5, as_of="05032025") == 115.0
+    assert get_account_totals("store", 5)[1] == {"A": 37}
+    assert get_balance("store", 5) == 136.0
@@ -0,0 +1,28 @@
+import math
+
+from handlers.ledger import add_ledger_entry, delete_ledger_entries_by_related
+from handlers.ledger_columns import ledger_columns
+
+
+def test_columns_mirror_and_follow_the_ledger(unlocked_db):
+    add_ledger_entry("customer", 1, "sale", None, -50.0, "USD", date="10012025",
+                     item_id="A", quantity=-5, unit_price=10.0, store_id=3)
+    rel = add_ledger_entry("customer", 1, "payment", None, 20.0, "USD", date="05012025")
+
+    cols = ledger_columns()
+    assert len(cols) == 2
+    assert list(cols.numeric("amount")) == [-50.0, 20.0]
+    assert math.isnan(cols.numeric("quantity")[1])
+    sale = cols.code("entry_type", "sale")
+    assert list(cols.codes("entry_type")).count(sale) == 1
+    assert cols.code("store_id", 3) == cols.codes("store_id")[0]
+
+    # appended on write
+    add_ledger_entry("store", 3, "stockin", None, 0.0, "USD", item_id="A", quantity=10)
+    assert len(ledger_columns()) == 3
+    assert cols.categories("account_type") == ["customer", "store"]
+    assert cols.as_numpy("quantity")[2] == 10
+
+    # rebuilt after delete
+    delete_ledger_entries_by_related("customer", 1, rel)
+    assert list(ledger_columns().numeric("amount")) == [-50.0, 0.0]
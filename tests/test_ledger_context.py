@@ -0,0 +1,45 @@
+from datetime import datetime
+
+from handlers.ledger import add_ledger_entry, get_ledger
+from handlers.reports.context import LedgerContext
+from handlers.reports.store_report import build_store_report
+
+
+def test_reads_are_memoized_per_request(unlocked_db):
+    sid = unlocked_db.insert("stores", {"name": "Shop", "currency": "EUR"})
+    cid = unlocked_db.insert("customers", {"name": "Shop", "currency": "EUR"})
+    add_ledger_entry("store_customer", cid, "sale", None, -6.0, "EUR", date="05012025",
+                     item_id="A", quantity=-2, unit_price=3.0, store_id=sid)
+    add_ledger_entry("store", sid, "expense", None, -1.0, "EUR", date="05012025")
+
+    fetched = []
+    lc = LedgerContext(unlocked_db, lambda t, i: fetched.append((t, i)) or get_ledger(t, i))
+    assert lc("store", sid) is lc.ledger("store", str(sid))
+    assert lc.all("customers") is lc.all("customers") and lc.get("stores", sid)["name"] == "Shop"
+    assert lc.snapshot() is lc.snapshot()
+
+    model = build_store_report({}, datetime(2025, 1, 1), datetime(2025, 1, 31), sid, "EUR", lc)
+    assert model.data["total_sales"] == 6.0
+    assert len(fetched) == len(set(fetched)) == lc.reads    # each ledger fetched once
+    assert lc.aggregate() is lc.aggregate()         # one aggregate pass per request
+
+    # a new request sees new writes
+    add_ledger_entry("store", sid, "expense", None, -2.0, "EUR", date="06012025")
+    assert len(lc.ledger("store", sid)) == 1 and len(LedgerContext(unlocked_db).ledger("store", sid)) == 2
+
+
+def test_owner_position_decrypts_once(unlocked_db, monkeypatch):
+    from handlers.reports.owner_report import compute_owner_position
+
+    pid = unlocked_db.insert("partners", {"name": "Pat", "currency": "EUR"})
+    unlocked_db.insert("stores", {"name": "Shop", "currency": "EUR"})
+    add_ledger_entry("partner", pid, "stockin", None, 0, "EUR", item_id="A", quantity=3,
+                     unit_price=2.0)
+    compute_owner_position(LedgerContext())         # warm the index and trackers
+
+    storage = unlocked_db.db.storage
+    reads = []
+    monkeypatch.setattr(storage, "read", lambda read=storage.read: reads.append(1) or read())
+    pos = compute_owner_position(LedgerContext())
+    assert pos["partner_inv"]["A"]["units"] == 3
+    assert len(reads) == 1                          # one snapshot for every table read
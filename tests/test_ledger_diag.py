@@ -0,0 +1,20 @@
+from handlers import ledger_diag
+from handlers.ledger import add_ledger_entry
+
+
+def test_diagnostics_off_records_nothing(unlocked_db, monkeypatch, capsys):
+    monkeypatch.setattr(ledger_diag, "enabled", False)
+    ledger_diag.clear()
+    add_ledger_entry("customer", 1, "payment", None, 10.0, "USD")
+    assert ledger_diag.recent() == []
+    assert "LEDGER DEBUG" not in capsys.readouterr().out
+
+
+def test_diagnostics_on_buffers_write_with_caller(unlocked_db, monkeypatch):
+    monkeypatch.setattr(ledger_diag, "enabled", True)
+    ledger_diag.clear()
+    rid = add_ledger_entry("customer", 1, "payment", None, 10.0, "USD")
+    (rec,) = ledger_diag.recent()
+    assert rec["entry"]["related_id"] == rid
+    assert rec["caller"].startswith("test_ledger_diag.py:")
+    assert "test_diagnostics_on_buffers_write_with_caller" in rec["caller"]
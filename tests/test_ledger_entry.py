@@ -0,0 +1,27 @@
+from tinydb.table import Document
+
+from handlers.ledger import add_ledger_entry, get_ledger
+from handlers.ledger_entry import LedgerEntry
+
+
+def test_round_trip_and_dict_compat():
+    row = Document({"account_type": "store", "account_id": 3, "entry_type": "stockin",
+                    "related_id": 9, "amount": 0.0, "currency": "USD", "note": "",
+                    "date": "01012025", "timestamp": "t", "item_id": "A",
+                    "quantity": 4, "unit_cost": 2.5}, 17)
+    e = LedgerEntry.from_dict(row)
+    assert e.doc_id == 17 and e.unit_price == 2.5 and e.fee_amt is None
+    assert e.get("quantity", 0) == 4 and e.get("fee_amt", 0) == 0
+    assert e["amount"] == 0.0
+    assert e.to_dict() == dict(row)                 # legacy unit_cost row: unchanged
+    assert not hasattr(e, "__dict__")
+
+
+def test_stored_rows_round_trip(unlocked_db):
+    add_ledger_entry("customer", 1, "sale", None, -50.0, "USD", date="10012025",
+                     item_id="A", quantity=-5, unit_price=10.0, store_id=3)
+    (row,) = get_ledger("customer", 1)
+    (e,) = get_ledger("customer", 1, as_entries=True)
+    assert isinstance(e, LedgerEntry) and e.doc_id == row.doc_id and e == LedgerEntry.from_dict(row)
+    assert (e.quantity, e.unit_price, e.store_id, e.usd_amt) == (-5, 10.0, 3, None)
+    assert e.to_dict() == dict(row)
@@ -0,0 +1,39 @@
+from handlers.ledger import add_ledger_entry, delete_ledger_entries_by_related
+from handlers.ledger_frame import ledger_frame
+from handlers.reports.owner_report import get_current_partner_inventory_with_value
+
+
+def test_frame_group_bys_follow_the_ledger(unlocked_db):
+    pid = unlocked_db.insert("partners", {"name": "Pat"})
+    add_ledger_entry("customer", 1, "sale", None, -30.0, "EUR", date="10012025",
+                     item_id="A", quantity=-3, unit_price=10.0)
+    add_ledger_entry("store_customer", 1, "sale", None, -8.0, "EUR", date="12012025",
+                     item_id="B", quantity=-2, unit_price=4.0)
+    add_ledger_entry("customer", 2, "sale", None, -5.0, "EUR", date="15012025",
+                     item_id="A", quantity=-1, unit_price=5.0)
+    add_ledger_entry("customer", 1, "payment", None, 100.0, "EUR", usd_amt=110.0)
+    add_ledger_entry("customer", 1, "payment", None, 20.0, "USD")
+
+    frame = ledger_frame()
+    m = frame.mask("sale", {"customer": [1], "store_customer": [1]})
+    assert frame.item_sales(m) == {"A": {"units": 3, "value": 30.0},
+                                   "B": {"units": 2, "value": 8.0}}
+    assert frame.item_sales(frame.mask("sale", start="11012025", end="31012025")) == {
+        "B": {"units": 2, "value": 8.0}, "A": {"units": 1, "value": 5.0}}
+    assert frame.currency_totals(frame.mask("payment", {"customer": [1]})) == {
+        "EUR": {"local": 100.0, "usd": 110.0, "currency": "EUR"},
+        "USD": {"local": 20.0, "usd": 20.0, "currency": "USD"}}
+
+    # appended incrementally, rebuilt after a delete
+    add_ledger_entry("partner", pid, "stockin", None, 0.0, "EUR", item_id="A",
+                     quantity=10, unit_price=6.0)
+    rid = add_ledger_entry("partner", pid, "sale", None, -6.0, "EUR", item_id="A", quantity=-4,
+                           unit_price=1.5)
+    frame = ledger_frame()
+    assert len(frame) == 7
+    # customer:<partner id> sales count against the partner's stock too
+    assert get_current_partner_inventory_with_value(unlocked_db, frame) == {
+        "A": {"units": 3, "value": 4.5, "price": 1.5}}
+    delete_ledger_entries_by_related("partner", pid, rid)
+    inv = get_current_partner_inventory_with_value(unlocked_db, ledger_frame())
+    assert inv["A"]["units"] == 7
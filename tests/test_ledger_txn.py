@@ -0,0 +1,110 @@
+import pytest
+
+from handlers.ledger import add_ledger_entry, get_ledger
+from handlers.ledger_txn import LedgerInvariantError, LedgerTransaction
+
+
+def test_payment_group_is_written_together(unlocked_db):
+    with LedgerTransaction() as txn:
+        rid = txn.add("customer", 1, "payment", None, 100.0, "EUR", usd_amt=110.0)
+        txn.add("owner", "POT", "payment_recv", rid, 110.0, "USD")
+        assert txn.legs(rid) == 2
+        assert txn.net(rid) == {"EUR": 10000, "USD": 11000}
+        assert get_ledger("customer", 1) == []      # nothing written before commit
+    assert len(txn.doc_ids) == 2
+    assert [r["related_id"] for r in get_ledger("owner", "POT")] == [rid]
+
+
+def test_sale_without_store_leg_is_rejected(unlocked_db):
+    txn = LedgerTransaction()
+    txn.add("customer", 1, "sale", None, -20.0, "EUR", item_id="A", quantity=-2, store_id=3)
+    with pytest.raises(LedgerInvariantError, match="missing leg"):
+        txn.commit()
+    assert get_ledger("customer", 1) == []
+
+
+def test_payout_owner_leg_must_be_minus_usd(unlocked_db):
+    txn = LedgerTransaction()
+    rid = txn.add("partner", 2, "payment", None, 500.0, "EUR", usd_amt=540.0)
+    txn.add("owner", "POT", "payout_sent", rid, -504.0, "USD")
+    with pytest.raises(LedgerInvariantError) as exc:
+        txn.commit()
+    assert exc.value.report.issues == {"payout USD legs differ": 1}
+    assert get_ledger("partner", 2) == []
+
+
+def test_exception_inside_block_writes_nothing(unlocked_db):
+    with pytest.raises(RuntimeError):
+        with LedgerTransaction() as txn:
+            rid = txn.add("customer", 1, "payment", None, 1.0, "EUR", usd_amt=1.0)
+            txn.add("owner", "POT", "payment_recv", rid, 1.0, "USD")
+            raise RuntimeError("boom")
+    assert get_ledger("customer", 1) == []
+
+
+def test_edit_legs_continue_an_existing_group(unlocked_db):
+    rid = add_ledger_entry("partner", 2, "stockin", None, 0, "EUR", item_id="A", quantity=5)
+    with LedgerTransaction() as txn:
+        txn.add("partner", 2, "stockin_edit_qty", rid, 0, "EUR", item_id="A", quantity=1)
+    assert len(get_ledger("partner", 2)) == 2
+
+    orphan = LedgerTransaction()
+    orphan.add("partner", 2, "stockin_delete", None, 0, "EUR", item_id="A", quantity=-5)
+    with pytest.raises(LedgerInvariantError, match="partner:stockin"):
+        orphan.commit()
+
+
+def _payment(unlocked_db, usd):
+    from secure_db import secure_db
+    with LedgerTransaction() as txn:
+        rid = txn.add("customer", 1, "payment", None, 100.0, "EUR", usd_amt=usd)
+        txn.add("owner", "POT", "payment_recv", rid, usd, "USD")
+    doc_id = secure_db.insert("customer_payments", {"customer_id": 1, "usd_amt": usd,
+                                                    "related_id": rid})
+    return rid, doc_id
+
+
+def test_replace_swaps_legs_and_record_in_one_write(unlocked_db):
+    from secure_db import secure_db
+    rid, doc_id = _payment(unlocked_db, 110.0)
+    txn = LedgerTransaction()
+    assert txn.remove("customer", 1, rid) == 1
+    assert txn.remove("owner", "POT", rid) == 1
+    txn.update_row("customer_payments", doc_id, {"usd_amt": 120.0})
+    txn.add("customer", 1, "payment", rid, 100.0, "EUR", usd_amt=120.0)
+    txn.add("owner", "POT", "payment_recv", rid, 120.0, "USD")
+    txn.commit()
+    assert [r["amount"] for r in get_ledger("owner", "POT")] == [120.0]
+    assert secure_db.table("customer_payments").get(doc_id=doc_id)["usd_amt"] == 120.0
+
+
+def test_rejected_replace_changes_nothing(unlocked_db):
+    from secure_db import secure_db
+    rid, doc_id = _payment(unlocked_db, 110.0)
+    txn = LedgerTransaction()
+    txn.remove("customer", 1, rid)
+    txn.remove("owner", "POT", rid)
+    txn.update_row("customer_payments", doc_id, {"usd_amt": 120.0})
+    txn.add("customer", 1, "payment", rid, 100.0, "EUR", usd_amt=120.0)
+    with pytest.raises(LedgerInvariantError):
+        txn.commit()        # owner leg missing: the old legs don't count
+    assert [r["amount"] for r in get_ledger("owner", "POT")] == [110.0]
+    assert len(get_ledger("customer", 1)) == 1
+    assert secure_db.table("customer_payments").get(doc_id=doc_id)["usd_amt"] == 110.0
+
+
+def test_sale_edit_reposts_every_leg(unlocked_db):
+    from secure_db import secure_db
+    from handlers.sales import _add_sale_legs, _save_sale_edit
+    with LedgerTransaction() as txn:
+        rid = _add_sale_legs(txn, "customer", 1, 3, "A", 2, 10.0, 1.0, 2.0,
+                             "EUR", "", "01012025", "2025-01-01T00:00:00")
+    sid = secure_db.insert("sales", {"customer_id": 1, "store_id": 3, "item_id": "A",
+                                     "quantity": 2, "unit_price": 10.0, "handling_fee": 2.0,
+                                     "note": "", "currency": "EUR",
+                                     "timestamp": "2025-01-01T00:00:00", "related_id": rid})
+    _save_sale_edit(sid, rid, {"quantity": 3})
+    assert [(r["entry_type"], r["amount"]) for r in get_ledger("customer", 1)] == [("sale", -30.0)]
+    store = sorted((r["entry_type"], r["quantity"]) for r in get_ledger("store", 3))
+    assert store == [("handling_fee", 3), ("sale", -3)]
+    assert secure_db.table("sales").get(doc_id=sid)["quantity"] == 3
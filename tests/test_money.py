@@ -0,0 +1,24 @@
+from handlers.ledger import add_ledger_entry, get_balance, get_ledger
+from handlers.ledger_columns import ledger_columns
+from handlers.utils import fmt_minor, from_minor, sum_money, to_minor
+
+
+def test_minor_unit_conversion():
+    assert to_minor(12.34, "USD") == 1234 and to_minor(-0.125, "USD") == -13
+    assert to_minor(1500, "JPY") == 1500 and to_minor(1.2345, "KWD") == 1235
+    assert (to_minor(1.005), to_minor(1.015), to_minor(2.675), to_minor(-2.675)) == (101, 102, 268, -268)
+    assert to_minor("19.995") == 2000 and to_minor(2.5, "JPY") == 3
+    assert from_minor(1234, "usd") == 12.34
+    assert fmt_minor(123456, "USD") == "$1,234.56"
+    assert fmt_minor(1500, "JPY") == "¥1,500"
+    assert sum_money([0.1] * 10) == 1.0 and sum([0.1] * 10) != 1.0
+
+
+def test_ledger_totals_are_exact(unlocked_db):
+    for _ in range(10):
+        add_ledger_entry("customer", 1, "payment", None, 0.1, "USD")
+    assert get_ledger("customer", 1)[0]["amount_minor"] == 10
+    assert get_balance("customer", 1) == 1.0
+    cols = ledger_columns()
+    assert cols.sum_minor() == 100
+    assert cols.sum_minor([0, 1]) == 20
@@ -0,0 +1,50 @@
+import asyncio
+
+from handlers.ledger import add_ledger_entry
+from handlers.reports import owner_report
+from handlers.reports.owner_report import owner_snapshot, render_owner_position
+from handlers.reports.workers import report_executor
+
+
+def test_snapshot_serves_until_the_ledger_changes(unlocked_db, monkeypatch):
+    monkeypatch.setattr(report_executor, "workers", 0)     # compute inline
+    calls = []
+    compute = owner_report.compute_owner_position
+    monkeypatch.setattr(owner_report, "compute_owner_position",
+                        lambda db: calls.append(1) or compute(db))
+    owner_snapshot.pos = None
+    cid = unlocked_db.insert("customers", {"name": "Cy"})
+    add_ledger_entry("customer", cid, "sale", None, -20.0, "USD", item_id="A",
+                     quantity=-2, unit_price=10.0)
+
+    pos, as_of = owner_snapshot.get()
+    assert pos["sales"] == {"A": {"units": 2, "value": 20.0}}
+    assert owner_snapshot.get() == (pos, as_of) and len(calls) == 1
+    assert f"As of {as_of:%d/%m/%Y}" in render_owner_position(pos, as_of)
+
+    add_ledger_entry("customer", cid, "payment", None, 20.0, "USD")
+    assert owner_snapshot.current() is None
+    pos, _ = owner_snapshot.get()
+    assert pos["payments"]["USD"]["usd"] == 20.0 and len(calls) == 2
+
+    # inside the bot loop a write schedules the recompute once writes settle
+    async def write_and_settle():
+        monkeypatch.setattr(owner_report, "SNAPSHOT_DELAY", 0.01)
+        add_ledger_entry("customer", cid, "payment", None, 5.0, "USD")
+        add_ledger_entry("customer", cid, "payment", None, 5.0, "USD")
+        await asyncio.sleep(0.1)
+
+    asyncio.run(write_and_settle())
+    assert len(calls) == 3
+    assert owner_snapshot.current()[0]["payments"]["USD"]["usd"] == 30.0
+
+
+def test_table_writes_make_the_snapshot_stale(unlocked_db, monkeypatch):
+    monkeypatch.setattr(report_executor, "workers", 0)
+    owner_snapshot.pos = None
+    pid = unlocked_db.insert("partners", {"name": "Pat", "currency": "EUR"})
+    owner_snapshot.get()
+    assert owner_snapshot.current() is not None
+
+    unlocked_db.remove("partners", [pid])
+    assert owner_snapshot.current() is None
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+from cryptography.fernet import Fernet
+
+from handlers import ledger_archive
+from handlers.ledger import (
+    add_ledger_entry, archive_store, get_balance, get_ledger, iter_ledger,
+)
+from handlers.period_close import close_period
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(ledger_archive, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    return tmp_path / "archive"
+
+
+def test_close_period_archives_and_reads_back(unlocked_db, archive_dir):
+    add_ledger_entry("customer", 1, "sale", None, -30.0, "USD", date="10062024",
+                     item_id="A", quantity=-3, unit_price=10.0, store_id=2)
+    add_ledger_entry("customer", 1, "payment", None, 12.5, "USD", date="20062024")
+    add_ledger_entry("customer", 1, "payment", None, 7.5, "USD", date="05012025")
+    add_ledger_entry("customer", 2, "payment", None, 1.0, "USD", date="01022024")
+
+    res = close_period("01012025")
+    assert res["rows"] == 3 and res["openings"] == 3
+    assert os.listdir(archive_dir) == [res["file"]]
+
+    # hot ledger: openings + the open period only
+    hot = list(iter_ledger("customer", 1, archives=False))
+    assert [e["entry_type"] for e in hot] == ["opening_balance", "opening_balance", "payment"]
+    assert get_balance("customer", 1) == -10.0
+    assert get_balance("customer", 2) == 1.0
+
+    # a range inside the open period never opens a segment
+    assert [e["amount"] for e in get_ledger("customer", 1, "01012025")] == [7.5]
+    assert archive_store._loaded == {}
+
+    # reaching back reads the archive instead of the openings
+    full = get_ledger("customer", 1)
+    assert [e["amount"] for e in full] == [-30.0, 12.5, 7.5]
+    assert get_balance("customer", 1, as_of="15062024") == -30.0
+
+    with pytest.raises(ValueError):
+        close_period("01012025")
+
+
+def test_second_close_folds_previous_openings(unlocked_db, archive_dir):
+    add_ledger_entry("store", 2, "stockin", None, 0.0, "USD", date="01012024",
+                     item_id="A", quantity=10)
+    close_period("01022024")
+    add_ledger_entry("store", 2, "stockin", None, 0.0, "USD", date="01032024",
+                     item_id="A", quantity=5)
+    close_period("01042024")
+
+    hot = list(iter_ledger("store", 2, archives=False))
+    assert [(e["entry_type"], e.get("quantity")) for e in hot] == [("opening_balance", 15)]
+    assert [e["quantity"] for e in iter_ledger("store", 2)] == [10, 5]
+
+
+def test_pin_change_reseals_segments(unlocked_db, archive_dir):
+    add_ledger_entry("customer", 1, "payment", None, 12.5, "USD", date="20062024")
+    add_ledger_entry("customer", 1, "payment", None, 7.5, "USD", date="05012025")
+    close_period("01012025")
+
+    tables = unlocked_db.snapshot()
+    new_key = Fernet(Fernet.generate_key())
+    old = ledger_archive.reseal_segments(tables, unlocked_db.fernet, new_key)
+    ledger_archive.remove_segment_files(old)
+
+    meta = next(iter(tables[ledger_archive.MANIFEST_TABLE].values()))
+    assert os.listdir(archive_dir) == [meta["file"]]
+    assert [r["amount"] for r in ledger_archive.open_segment(meta, new_key)] == [12.5]
@@ -0,0 +1,39 @@
+from handlers.ledger import add_ledger_entry, delete_ledger_entries_by_related
+from handlers.price_index import price_index
+
+
+def test_latest_sale_then_stockin_fallback(unlocked_db):
+    price_index.reset()
+    add_ledger_entry("partner", 1, "stockin", None, 0, "EUR",
+                     item_id="A", quantity=5, unit_price=4, store_id=1, date="01012024")
+    add_ledger_entry("partner", 1, "stockin", None, 0, "EUR",
+                     item_id="B", quantity=5, unit_price=6, date="01012024")
+    # DDMMYYYY: 01022023 sorts after 31012024 as a string but is older
+    add_ledger_entry("customer", 1, "sale", None, -10, "EUR",
+                     item_id="A", quantity=-1, unit_price=10, store_id=1, date="31012024")
+    add_ledger_entry("customer", 1, "sale", None, -7, "EUR",
+                     item_id="A", quantity=-1, unit_price=7, store_id=1, date="01022023")
+    add_ledger_entry("customer", 1, "sale", None, 0, "EUR",
+                     item_id="B", quantity=-1, unit_price=0, date="02012024")
+
+    prices = price_index.prices([("customer", 1)], [("partner", 1)])
+    assert prices == {"A": 10, "B": 6}      # B: sale price 0 → stock-in cost
+    # owner report: the latest sale wins even at 0 (old get_last_market_price)
+    assert price_index.prices([("customer", 1)], [("partner", 1)],
+                              zero_fallback=False) == {"A": 10, "B": 0}
+    assert price_index.prices([("customer", 2)], [("partner", 1)]) == {"A": 4, "B": 6}
+
+    # store-side only, or pinned to one store
+    assert price_index.prices([], [("partner", 1)], with_store=True) == {"A": 4}
+    assert price_index.prices([], [("partner", 1, 2)]) == {}
+
+    # a newer sale is picked up as it is written
+    add_ledger_entry("customer", 1, "sale", None, -12, "EUR",
+                     item_id="A", quantity=-1, unit_price=12, store_id=1, date="01022024")
+    rid = add_ledger_entry("customer", 1, "sale", None, -15, "EUR",
+                           item_id="A", quantity=-1, unit_price=15, store_id=1, date="02022024")
+    assert price_index.prices([("customer", 1)])["A"] == 15
+
+    # deleting it falls back to the previous latest
+    delete_ledger_entries_by_related("customer", 1, rid)
+    assert price_index.prices([("customer", 1)])["A"] == 12
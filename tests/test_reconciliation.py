@@ -0,0 +1,64 @@
+from handlers.ledger import add_ledger_entry, delete_ledger_entries_by_related, get_ledger
+from handlers.partner_sales import calc_total_reconciliation_needed
+from handlers.reconciliation import reconciliation
+from handlers.reports.report_utils import (
+    build_partner_sales_summary, build_sales_summary, compute_partner_inventory,
+    get_unreconciled_units,
+)
+
+
+def _old_needed(db):
+    """calc_total_reconciliation_needed before the tracker (oracle)."""
+    names = {p["name"] for p in db.all("partners")}
+    sold, done = {}, {}
+    for c in db.all("customers"):
+        if c["name"] in names:
+            for e in get_ledger("customer", c.doc_id):
+                if e["entry_type"] == "sale":
+                    sold[e["item_id"]] = sold.get(e["item_id"], 0) + abs(e["quantity"])
+    for p in db.all("partners"):
+        for e in get_ledger("partner", p.doc_id):
+            if e["entry_type"] == "sale":
+                done[e["item_id"]] = done.get(e["item_id"], 0) + abs(e["quantity"])
+    return {i: n - done.get(i, 0) for i, n in sold.items() if n - done.get(i, 0) > 0}
+
+
+def _seed(db):
+    p1 = db.insert("partners", {"name": "Ann"})
+    p2 = db.insert("partners", {"name": "Bob"})
+    c_ann = db.insert("customers", {"name": "Ann"})
+    c_bob = db.insert("customers", {"name": "Bob"})
+    c_other = db.insert("customers", {"name": "Zed"})
+    for pid, item, qty in ((p1, "A", 10), (p2, "A", 5), (p2, "B", 4)):
+        add_ledger_entry("partner", pid, "stockin", None, 0, "EUR",
+                         item_id=item, quantity=qty, store_id=1)
+    for cid, item, qty in ((c_ann, "A", 3), (c_bob, "A", 2), (c_bob, "B", 4), (c_other, "A", 7)):
+        add_ledger_entry("customer", cid, "sale", None, -qty, "EUR",
+                         item_id=item, quantity=-qty, store_id=1)
+    rid = add_ledger_entry("partner", p1, "sale", None, -1, "EUR", item_id="A", quantity=-1)
+    return p1, p2, rid
+
+
+def test_tracker_views_match_ledger_scans(unlocked_db):
+    reconciliation.reset()
+    p1, p2, rid = _seed(unlocked_db)
+    assert calc_total_reconciliation_needed() == _old_needed(unlocked_db) == {"A": 4, "B": 4}
+    assert reconciliation.pending(p1) == {"A": 2}
+    assert reconciliation.pending(p2) == {"A": 2, "B": 4}
+
+    assert build_sales_summary(unlocked_db) == {"A": {"units": 12}, "B": {"units": 4}}
+    assert build_partner_sales_summary(unlocked_db) == {"A": {"units": 1}}
+    assert get_unreconciled_units(build_sales_summary(unlocked_db),
+                                  build_partner_sales_summary(unlocked_db)) == {"A": 11, "B": 4}
+    assert compute_partner_inventory(unlocked_db) == {p1: {"A": 9}, p2: {"A": 5, "B": 4}}
+
+    # partner-sale removed → units are pending again
+    delete_ledger_entries_by_related("partner", p1, rid)
+    assert reconciliation.pending(p1) == {"A": 3}
+    assert calc_total_reconciliation_needed() == _old_needed(unlocked_db)
+
+    # partner stock-ins at a store show up on both sides; the store's own don't
+    assert reconciliation.inventory_to_reconcile() == {}
+    sid = unlocked_db.insert("stores", {"name": "North"})
+    add_ledger_entry("store", sid, "stockin", None, 0, "EUR", item_id="C", quantity=3)
+    assert reconciliation.inventory_to_reconcile() == {"C": -3}
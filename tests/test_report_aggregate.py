@@ -0,0 +1,79 @@
+from collections import defaultdict
+from datetime import datetime
+
+from handlers.ledger import add_ledger_entry, get_ledger
+from handlers.reports.aggregate import aggregate
+
+
+def _in(e, start, end):
+    if not (start and end):
+        return True
+    return start <= datetime.strptime(e["date"], "%d%m%Y") <= end
+
+
+def _old(db, start=None, end=None):
+    """The per-account report_utils scans before aggregate() (oracle)."""
+    out = {k: defaultdict(lambda: defaultdict(list)) for k in ("store_sales", "customer_sales", "handling_fees")}
+    out.update({k: defaultdict(list) for k in ("store_payments", "store_stockins", "store_expenses")})
+    out["payouts"] = []
+    for s in db.all("stores"):
+        for e in get_ledger("store", s.doc_id):
+            if not _in(e, start, end):
+                continue
+            et = e["entry_type"]
+            if et == "sale":
+                out["store_sales"][s.doc_id][e.get("item_id", "?")].append(e)
+            elif et == "handling_fee":
+                out["handling_fees"][s.doc_id][e.get("item_id", "?")].append(e)
+            elif et in ("expense", "stockin"):
+                out["store_" + et + "s"][s.doc_id].append(e)
+        for p in db.all("partners"):
+            for e in get_ledger("partner", p.doc_id):
+                if e["entry_type"] == "stockin" and e.get("store_id") == s.doc_id and _in(e, start, end):
+                    out["store_stockins"][s.doc_id].append(e)
+        for c in db.all("customers"):
+            if c["name"] == s["name"]:
+                for t in ("customer", "store_customer"):
+                    out["store_payments"][s.doc_id] += [
+                        e for e in get_ledger(t, c.doc_id)
+                        if e["entry_type"] == "payment" and _in(e, start, end)]
+    for p in db.all("partners"):
+        out["payouts"] += [e for e in get_ledger("partner", p.doc_id)
+                           if e["entry_type"] in ("payout", "payment_sent") and _in(e, start, end)]
+    for c in db.all("customers"):
+        for e in get_ledger("customer", c.doc_id):
+            if e["entry_type"] == "sale" and _in(e, start, end):
+                out["customer_sales"][c.doc_id][e.get("item_id", "?")].append(e)
+    return out
+
+
+def _plain(v):
+    if isinstance(v, dict):
+        return {k: _plain(x) for k, x in v.items() if x}
+    return v
+
+
+def test_aggregate_matches_per_account_scans(unlocked_db):
+    sid = unlocked_db.insert("stores", {"name": "Shop"})
+    pid = unlocked_db.insert("partners", {"name": "Pat"})
+    cid = unlocked_db.insert("customers", {"name": "Shop"})
+    other = unlocked_db.insert("customers", {"name": "Zed"})
+    for day in ("05012024", "20012024", "03022024"):
+        add_ledger_entry("partner", pid, "stockin", None, 0, "EUR", item_id="A", quantity=5,
+                         store_id=sid, date=day)
+        add_ledger_entry("store", sid, "stockin", None, 0, "EUR", item_id="B", quantity=2, date=day)
+        add_ledger_entry("store", sid, "sale", None, -4, "EUR", item_id="A", quantity=-1,
+                         store_id=sid, date=day)
+        add_ledger_entry("store", sid, "handling_fee", None, -1, "EUR", item_id="A", date=day)
+        add_ledger_entry("store", sid, "expense", None, -3, "EUR", date=day)
+        add_ledger_entry("customer", cid, "payment", None, 10, "EUR", date=day)
+        add_ledger_entry("store_customer", cid, "payment", None, 5, "EUR", date=day)
+        add_ledger_entry("customer", other, "sale", None, -4, "EUR", item_id="A", quantity=-1, date=day)
+        add_ledger_entry("partner", pid, "payout", None, -2, "USD", date=day)
+        add_ledger_entry("partner", pid, "payment_sent", None, -1, "USD", date=day)
+
+    for window in ((None, None), (datetime(2024, 1, 10), datetime(2024, 1, 31))):
+        agg, old = aggregate(unlocked_db, *window), _old(unlocked_db, *window)
+        for name, expected in old.items():
+            assert _plain(getattr(agg, name)) == _plain(expected), name
+    assert len(aggregate(unlocked_db, datetime(2024, 1, 10), datetime(2024, 1, 31)).payouts) == 2
@@ -0,0 +1,48 @@
+from datetime import datetime
+
+from handlers.ledger import add_ledger_entry
+from handlers.reports.cache import ReportCache, report_cache
+from handlers.reports import report_engine
+
+
+def test_lru_eviction_and_memory_cap(unlocked_db):
+    cache = ReportCache(max_entries=2, max_bytes=10_000)
+    for n in range(3):
+        cache.get_or_build("customer", n, None, None, "full", lambda: {"n": n})
+    assert len(cache) == 2 and cache.get(cache.key("customer", 0, None, None, "full")) is None
+    cache.get_or_build("customer", 3, None, None, "full", lambda: ["x" * 20_000])
+    assert len(cache) == 2                          # too large: built, not cached
+    cache.get_or_build("customer", 4, None, None, "full", lambda: ["x" * 6_000])
+    cache.get_or_build("customer", 5, None, None, "full", lambda: ["y" * 6_000])
+    assert len(cache) == 1 and cache.bytes <= 10_000   # byte cap evicts the older one
+    assert cache.get(cache.key("customer", 5, None, None, "full")) is not None
+
+
+def test_model_reused_until_a_ledger_write(unlocked_db):
+    report_cache.clear()
+    cid = unlocked_db.insert("customers", {"name": "Cy", "currency": "EUR"})
+    add_ledger_entry("customer", cid, "sale", None, -10.0, "EUR", date="05012025",
+                     item_id="A", quantity=-1, unit_price=10.0)
+    period = (datetime(2025, 1, 1), datetime(2025, 1, 31))
+
+    model = report_engine.customer_report(cid, *period)
+    assert model.data["total_sales"] == 10.0
+    assert report_engine.customer_report(cid, *period) is model              # page flip / PDF: no rebuild
+
+    add_ledger_entry("customer", cid, "payment", None, 4.0, "EUR", date="06012025")
+    assert len(report_cache) == 0                   # stale entry dropped on write
+    fresh = report_engine.customer_report(cid, *period)
+    assert fresh is not model and fresh.data["total_payments_local"] == 4.0
+
+
+def test_table_writes_invalidate_models(unlocked_db):
+    report_cache.clear()
+    cid = unlocked_db.insert("customers", {"name": "Cy", "currency": "EUR"})
+    period = (datetime(2025, 1, 1), datetime(2025, 1, 31))
+    model = report_engine.customer_report(cid, *period)
+
+    unlocked_db.update("customers", {"name": "Renamed", "currency": "USD"}, [cid])
+    fresh = report_engine.customer_report(cid, *period)
+    assert fresh is not model
+    assert (fresh.data["name"], fresh.data["currency"]) == ("Renamed", "USD")
+    assert len(report_cache) == 1                   # the stale entry went on put()
@@ -0,0 +1,46 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from handlers.ledger import add_ledger_entry
+from handlers.reports import ReportEngine
+from handlers.reports.cache import ReportCache
+from handlers.reports.model import ReportModel, render_text
+from handlers.reports.workers import report_executor
+
+JAN = (datetime(2025, 1, 1), datetime(2025, 1, 31))
+
+
+def test_reports_without_telegram(unlocked_db, monkeypatch):
+    monkeypatch.setattr(report_executor, "workers", 0)
+    engine = ReportEngine(cache=ReportCache())
+    cid = unlocked_db.insert("customers", {"name": "Cy", "currency": "EUR"})
+    pid = unlocked_db.insert("partners", {"name": "Pat", "currency": "USD"})
+    sid = unlocked_db.insert("stores", {"name": "Shop", "currency": "EUR"})
+    add_ledger_entry("customer", cid, "sale", None, -10.0, "EUR", date="05012025",
+                     item_id="A", quantity=1, unit_price=10.0, store_id=sid)
+
+    customer = engine.customer_report(cid, *JAN)
+    assert isinstance(customer, ReportModel) and customer.data["total_sales"] == 10.0
+    assert engine.customer_report(cid, *JAN) is customer          # cached
+    assert "Payments" not in render_text(customer, "sales")
+
+    partner = engine.partner_report(pid, *JAN)
+    store = engine.store_report(sid, *JAN)
+    assert isinstance(partner, ReportModel) and isinstance(store, ReportModel)
+    assert asyncio.run(engine.store_report_async(sid, *JAN, key=1)) is store
+    assert asyncio.run(engine.partner_report_async(pid, *JAN, key=1)) is partner
+
+    # a cache hit reads nothing – the store's currency is only needed on a build
+    storage, reads = unlocked_db.db.storage, []
+    monkeypatch.setattr(storage, "read", lambda read=storage.read: reads.append(1) or read())
+    assert engine.store_report(sid, *JAN) is store
+    assert asyncio.run(engine.store_report_async(sid, *JAN, key=1)) is store
+    assert reads == [] and store.data["currency"] == "EUR"
+    with pytest.raises(KeyError):
+        engine.store_report(sid + 1, *JAN)
+
+    pos, as_of = engine.owner_position()
+    assert isinstance(pos, dict) and as_of is not None
+    assert len(engine.cache) == 3
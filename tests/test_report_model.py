@@ -0,0 +1,48 @@
+import pickle
+from datetime import datetime
+
+from handlers.ledger import add_ledger_entry
+from handlers.reports.context import LedgerContext
+from handlers.reports.cache import approx_size
+from handlers.reports.customer_report import _customer_model
+from handlers.reports.model import ReportModel, render_lines, render_pdf, render_text
+from handlers.reports.store_report import build_store_report, build_store_report_lines
+
+
+def test_text_and_pdf_render_one_model():
+    model = ReportModel("*Title*", ["Period: x"], separator="--")
+    model.add("sales", "Sales", [f"row {n}" for n in range(10)], totals=["Total: 10"],
+              scopes=("full", "sales"), empty="(none on this page)", paged=True)
+    model.add("balance", "Balance: 3")
+
+    assert render_lines(model, "sales", page=0, page_size=4) == [
+        "*Title*", "Period: x", "Sales", "row 0", "row 1", "row 2", "row 3", "Total: 10", "--",
+        "Balance: 3", "--"]
+    assert render_lines(model, "full", page=2, page_size=4)[3:6] == ["row 8", "row 9", "--"]
+    assert "(none on this page)" in render_text(model, page=5, page_size=4)
+    assert render_text(model, "payments") == "*Title*\nPeriod: x\nBalance: 3\n--"
+
+    assert render_pdf(model).startswith(b"%PDF")
+    copy = pickle.loads(pickle.dumps(model))
+    assert render_text(copy) == render_text(model) and approx_size(model) > approx_size([])
+
+
+def test_report_models_from_the_ledger(unlocked_db):
+    cid = unlocked_db.insert("customers", {"name": "Shop", "currency": "EUR"})
+    sid = unlocked_db.insert("stores", {"name": "Shop", "currency": "EUR"})
+    add_ledger_entry("customer", cid, "sale", None, -10.0, "EUR", date="05012025",
+                     item_id="A", quantity=1, unit_price=10.0)
+    add_ledger_entry("customer", cid, "payment", None, 4.0, "EUR", date="06012025", note="cash")
+    add_ledger_entry("store", sid, "expense", None, -2.0, "EUR", date="06012025")
+    start, end = datetime(2025, 1, 1), datetime(2025, 1, 31)
+
+    model = _customer_model(cid, start, end)
+    assert len(model.section("sales").rows) == 1
+    assert "📝 cash" in model.section("payments").rows[0]
+    assert [s.key for s in model.visible("sales")] == ["sales", "balance"]
+    assert render_pdf(model, "full").startswith(b"%PDF")
+
+    store = build_store_report({}, start, end, sid, "EUR", LedgerContext(unlocked_db))
+    assert [s.key for s in store.sections] == ["sales", "payments", "expenses", "inventory", "position"]
+    lines = build_store_report_lines({}, start, end, sid, "EUR", LedgerContext(unlocked_db))
+    assert lines[0] == "📄 Account: Shop" and "🧾 Expenses" in lines
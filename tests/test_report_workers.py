@@ -0,0 +1,116 @@
+import asyncio
+import time
+from datetime import datetime
+
+import pytest
+
+from handlers.ledger import add_ledger_entry, delete_ledger_entries_by_related
+from handlers.reports.context import LedgerContext
+from handlers.reports.model import render_text
+from handlers.reports.owner_report import _owner_position_job
+from handlers.reports.partner_report import _partner_model
+from handlers.reports.workers import ReportCancelled, ReportExecutor, ReportTimeout
+
+
+def _slow(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def test_reports_match_inline_and_jobs_time_out_or_cancel(unlocked_db):
+    pid = unlocked_db.insert("partners", {"name": "Pat", "currency": "EUR"})
+    cid = unlocked_db.insert("customers", {"name": "Pat", "currency": "EUR"})
+    add_ledger_entry("partner", pid, "stockin", None, 0.0, "EUR", date="02012025",
+                     item_id="A", quantity=10, unit_price=4.0)
+    add_ledger_entry("customer", cid, "sale", None, -12.0, "EUR", date="05012025",
+                     item_id="A", quantity=-2, unit_price=6.0)
+    add_ledger_entry("customer", cid, "payment", None, 12.0, "EUR", usd_amt=13.0, date="06012025")
+    start, end = datetime(2025, 1, 1), datetime(2025, 1, 31)
+
+    executor = ReportExecutor(workers=1, timeout=60)
+
+    async def scenario():
+        model = await executor.run("u1", _partner_model, pid, start, end)
+        pos = await executor.run("u1", _owner_position_job)
+
+        with pytest.raises(ReportTimeout):
+            await executor.run("u2", _slow, 0.5, timeout=0.05)
+
+        job = asyncio.ensure_future(executor.run("u3", _slow, 0.2))
+        await asyncio.sleep(0.01)
+        assert executor.cancel("u3")                # user navigated away
+        with pytest.raises(ReportCancelled):
+            await job
+        return model, pos
+
+    try:
+        model, pos = asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+
+    inline = _partner_model(pid, start, end, LedgerContext())
+    assert render_text(model) == render_text(inline)
+    assert pos == _owner_position_job()
+    assert pos["sales"] == {"A": {"units": 2, "value": 12.0}}
+
+
+def test_warm_worker_gets_only_new_rows_and_changed_tables(unlocked_db, monkeypatch):
+    pid = unlocked_db.insert("partners", {"name": "Pat", "currency": "EUR"})
+    add_ledger_entry("partner", pid, "stockin", None, 0.0, "EUR", date="02012025",
+                     item_id="A", quantity=10, unit_price=4.0)
+    start, end = datetime(2025, 1, 1), datetime(2025, 1, 31)
+    executor = ReportExecutor(workers=1, timeout=60)
+    submit, bases = executor._submit, []
+
+    async def spy(key, fn, target, args, timeout):
+        bases.append(args[1] is not None)
+        return await submit(key, fn, target, args, timeout)
+
+    monkeypatch.setattr(executor, "_submit", spy)
+
+    def inline():
+        return render_text(_partner_model(pid, start, end, LedgerContext()))
+
+    async def scenario():
+        models = [await executor.run("u1", _partner_model, pid, start, end)]
+        rid = add_ledger_entry("partner", pid, "stockin", None, 0.0, "EUR", date="03012025",
+                               item_id="B", quantity=5, unit_price=2.0)
+        unlocked_db.update("partners", {"name": "Patricia"}, [pid])
+        models.append(await executor.run("u1", _partner_model, pid, start, end))
+        expected = inline()
+        delete_ledger_entries_by_related("partner", pid, rid)
+        models.append(await executor.run("u1", _partner_model, pid, start, end))
+        return models, expected
+
+    try:
+        (first, added, deleted), expected = asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+
+    assert bases == [False, True, False, False]     # base once, then only changes
+    assert render_text(added) == expected != render_text(first)
+    assert "Patricia" in render_text(added)
+    assert render_text(deleted) == inline()
+
+
+def test_pdf_export_parallel_matches_single_pass(monkeypatch):
+    from handlers.reports import pdf as report_pdf
+    from handlers.reports.model import ReportModel, render_pdf
+
+    model = ReportModel("*Statement*", ["Period: Jan"], separator="--")
+    for n in range(3):
+        model.add(f"s{n}", f"Section {n}", [f"row {n}.{i} " + "x" * 150 for i in range(60)])
+
+    executor = ReportExecutor(workers=2, timeout=60)
+    monkeypatch.setattr(report_pdf, "report_executor", executor)
+    monkeypatch.setattr(report_pdf, "PARALLEL_ROWS", 10)
+    try:
+        data = asyncio.run(report_pdf.export_pdf("u1", model, report="test"))
+    finally:
+        executor.shutdown()
+
+    rec = report_pdf.recent(1)[0]
+    assert rec["parallel"] and rec["sections"] == 3 and rec["bytes"] == len(data)
+    assert rec["pages"] > 3                         # long rows wrapped onto more pages
+    assert data.count(b"/Type /Page\n") == rec["pages"]
+    assert len(data) == len(render_pdf(model))      # same document as the inline path
@@ -0,0 +1,62 @@
+from tinydb import Query
+
+from handlers.ledger import related_id_allocator
+from handlers.serials import SerialAllocator
+
+
+def _high_water(db, key):
+    return db.table("system_meta").get(Query().key == key)["val"]
+
+
+def test_block_allocation_persists_only_high_water(unlocked_db):
+    alloc = SerialAllocator("test_serial", block_size=10)
+    ids = [alloc.next_id(unlocked_db) for _ in range(25)]
+    assert ids == list(range(1, 26))
+    # three blocks reserved: [1,11) [11,21) [21,31)
+    assert _high_water(unlocked_db, "test_serial") == 31
+
+
+def test_restart_skips_unused_ids_never_reuses(unlocked_db):
+    alloc = SerialAllocator("test_serial", block_size=10)
+    first = [alloc.next_id(unlocked_db) for _ in range(3)]
+    # simulate crash / restart: in-memory block is lost
+    restarted = SerialAllocator("test_serial", block_size=10)
+    after = restarted.next_id(unlocked_db)
+    assert first == [1, 2, 3]
+    assert after == 11
+
+
+def test_existing_meta_row_is_treated_as_next_free(unlocked_db):
+    unlocked_db.table("system_meta").insert({"key": "next_related_id", "val": 42})
+    alloc = SerialAllocator("next_related_id", block_size=5)
+    assert alloc.next_id(unlocked_db) == 42
+    assert _high_water(unlocked_db, "next_related_id") == 47
+
+
+def test_concurrent_allocation_is_unique(unlocked_db):
+    import threading
+
+    alloc = SerialAllocator("test_serial", block_size=7)
+    out = []
+
+    def worker():
+        for _ in range(50):
+            out.append(alloc.next_id(unlocked_db))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(out) == len(set(out)) == 200
+
+
+def test_restore_drops_the_in_memory_block(unlocked_db):
+    backup = unlocked_db.snapshot()                 # before any related_id
+    assert [related_id_allocator.next_id(unlocked_db) for _ in range(3)] == [1, 2, 3]
+
+    unlocked_db.db.storage.write(backup)            # restore the older DB …
+    unlocked_db.lock()                              # … which locks the session
+    assert unlocked_db.unlock("Test-PIN-123!")
+    first = related_id_allocator.next_id(unlocked_db)
+    assert first == 1 and _high_water(unlocked_db, "next_related_id") == 1 + related_id_allocator.block_size
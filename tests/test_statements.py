@@ -0,0 +1,37 @@
+import asyncio
+import io
+import zipfile
+from datetime import datetime
+
+from handlers.ledger import add_ledger_entry
+from handlers.reports.statements import parse_period, statements_zip
+from handlers.reports.workers import report_executor
+
+
+def test_parse_period():
+    assert parse_period(["022024"]) == (datetime(2024, 2, 1), datetime(2024, 2, 29))
+    assert parse_period(["01012025-15012025"]) == (datetime(2025, 1, 1), datetime(2025, 1, 15))
+    assert parse_period(["15012025", "01012025"]) is None
+    assert parse_period([]) is None and parse_period(["2025"]) is None
+
+
+def test_one_zip_for_every_entity(unlocked_db, monkeypatch):
+    monkeypatch.setattr(report_executor, "workers", 0)      # inline, same code path
+    cid = unlocked_db.insert("customers", {"name": "Ann Lee", "currency": "EUR"})
+    unlocked_db.insert("customers", {"name": "Shop", "currency": "EUR", "type": "store"})
+    unlocked_db.insert("partners", {"name": "Pat", "currency": "USD"})
+    unlocked_db.insert("stores", {"name": "Shop", "currency": "EUR"})
+    add_ledger_entry("customer", cid, "sale", None, -10.0, "EUR", date="05012025",
+                     item_id="A", quantity=1, unit_price=10.0)
+
+    seen = []
+
+    async def progress(done, total):
+        seen.append((done, total))
+
+    data, count = asyncio.run(statements_zip(1, datetime(2025, 1, 1), datetime(2025, 1, 31), progress))
+    names = zipfile.ZipFile(io.BytesIO(data)).namelist()
+    assert count == 3 and sorted(names) == [
+        f"customers/Ann_Lee_{cid}.pdf", "partners/Pat_1.pdf", "stores/Shop_1.pdf"]
+    assert seen[0] == (0, 3) and seen[-1] == (3, 3)
+    assert zipfile.ZipFile(io.BytesIO(data)).read(names[0]).startswith(b"%PDF")
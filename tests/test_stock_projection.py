@@ -0,0 +1,70 @@
+from handlers.ledger import add_ledger_entry, delete_ledger_entries_by_related, get_ledger
+from handlers.stock_projection import stock_projection
+
+
+def _scan(pid):
+    """The ledger scan partner_sales used before the projection."""
+    pledger, cledger = get_ledger("partner", pid), get_ledger("customer", pid)
+    deleted = {e["related_id"] for e in pledger if e["entry_type"] == "stockin_delete"}
+    edits = {e["related_id"]: e for e in pledger if e["entry_type"] == "stockin_edit_qty"}
+    stock = {}
+    for e in pledger:
+        if e["entry_type"] == "stockin" and e["related_id"] not in deleted:
+            qty = edits.get(e["related_id"], {}).get("quantity", e["quantity"])
+            stock[e["item_id"]] = stock.get(e["item_id"], 0) + qty
+    for e in (*cledger, *pledger):
+        if e["entry_type"] == "sale":
+            stock[e["item_id"]] = stock.get(e["item_id"], 0) - abs(e["quantity"])
+    return {i: q for i, q in stock.items() if q > 0}
+
+
+def _stockin(pid, item, qty, date="01012025"):
+    return add_ledger_entry("partner", pid, "stockin", None, 0, "EUR",
+                            item_id=item, quantity=qty, date=date, store_id=1)
+
+
+def _seed():
+    a = _stockin(1, "A", 10)
+    b = _stockin(1, "B", 4)
+    c = _stockin(1, "A", 3)
+    add_ledger_entry("partner", 1, "stockin_edit_qty", a, 0, "EUR", item_id="A", quantity=7,
+                     date="02012025")
+    add_ledger_entry("partner", 1, "stockin_edit_qty", a, 0, "EUR", item_id="A", quantity=8,
+                     date="03012025")
+    add_ledger_entry("partner", 1, "stockin_delete", b, 0, "EUR", item_id="B", quantity=-4)
+    sale = add_ledger_entry("customer", 1, "sale", None, -20, "EUR", item_id="A", quantity=-2)
+    add_ledger_entry("partner", 1, "sale", None, -10, "EUR", item_id="A", quantity=-1)
+    _stockin(2, "A", 5)
+    return a, c, sale
+
+
+def test_projection_matches_ledger_scan_and_follows_writes(unlocked_db):
+    stock_projection.reset()
+    a, c, sale = _seed()
+    assert stock_projection.inventory(1) == _scan(1) == {"A": 8 + 3 - 3}
+    assert stock_projection.available(2, "A") == 5
+
+    # incremental: adds and deletes after the projection is loaded
+    add_ledger_entry("partner", 1, "stockin_edit_qty", c, 0, "EUR", item_id="A", quantity=1,
+                     date="05012025")
+    delete_ledger_entries_by_related("customer", 1, sale)
+    assert stock_projection.inventory(1) == _scan(1) == {"A": 8 + 1 - 1}
+    delete_ledger_entries_by_related("partner", 1, c)
+    assert stock_projection.inventory(1) == _scan(1)
+
+
+def test_snapshot_replay_and_rebuild(unlocked_db):
+    _seed()
+    stock_projection.rebuild()                  # writes the snapshot
+
+    unlocked_db.lock(); unlocked_db.unlock("Test-PIN-123!")
+    _stockin(1, "C", 6)
+    assert stock_projection.inventory(1) == _scan(1)
+    assert stock_projection._replayed == 1     # snapshot + one replayed row
+
+    # a delete since the snapshot leaves a tombstone → full rebuild on load
+    rid = _stockin(1, "D", 2)
+    delete_ledger_entries_by_related("partner", 1, rid)
+    unlocked_db.lock(); unlocked_db.unlock("Test-PIN-123!")
+    assert stock_projection.inventory(1) == _scan(1)
+    assert stock_projection._replayed == 0
@@ -0,0 +1,112 @@
+from collections import defaultdict
+
+from tinydb import Query
+
+from handlers.ledger import add_ledger_entry, delete_ledger_entries_by_related, get_ledger
+from handlers.reports.report_utils import compute_store_inventory, get_global_store_inventory
+from handlers.store_stock import store_stock
+
+
+def _old_store_inventory(db):
+    """compute_store_inventory before the projection (oracle)."""
+    inventory = {}
+    for store in db.all("stores"):
+        stock = defaultdict(int)
+        for e in get_ledger("store", store.doc_id):
+            if e.get("entry_type") == "stockin":
+                stock[e.get("item_id", "?")] += e.get("quantity", 0)
+        for partner in db.all("partners"):
+            for e in get_ledger("partner", partner.doc_id):
+                if e.get("entry_type") == "stockin" and e.get("store_id") == store.doc_id:
+                    stock[e.get("item_id", "?")] += e.get("quantity", 0)
+        for cust in db.all("customers"):
+            if cust["name"] == store["name"]:
+                for e in get_ledger("store_customer", cust.doc_id):
+                    if e.get("entry_type") == "sale" and e.get("store_id") == store.doc_id:
+                        stock[e.get("item_id", "?")] -= abs(e.get("quantity", 0))
+        inventory[store.doc_id] = dict(stock)
+    return inventory
+
+
+def _old_global(db):
+    bal = defaultdict(int)
+    for store in db.all("stores"):
+        for e in get_ledger("store", store.doc_id):
+            if e.get("entry_type") == "stockin":
+                bal[e.get("item_id")] += e.get("quantity", 0)
+    for partner in db.all("partners"):
+        for e in get_ledger("partner", partner.doc_id):
+            if e.get("entry_type") == "stockin" and e.get("store_id") is not None:
+                bal[e.get("item_id")] += e.get("quantity", 0)
+    for t in ("general", "store", "partner"):
+        for acct in db.all(t + "s"):
+            for e in get_ledger(t, acct.doc_id):
+                if e.get("entry_type") == "sale" and e.get("store_id") is not None:
+                    bal[e.get("item_id")] -= abs(e.get("quantity", 0))
+    return bal
+
+
+def _stockin(db, pid, sid, item, qty):
+    rid = add_ledger_entry("partner", pid, "stockin", None, 0, "EUR",
+                           item_id=item, quantity=qty, store_id=sid)
+    q = Query()
+    rec = db.table("store_inventory").get((q.store_id == sid) & (q.item_id == item))
+    if rec:
+        db.update("store_inventory", {"quantity": rec["quantity"] + qty}, [rec.doc_id])
+    else:
+        db.insert("store_inventory", {"store_id": sid, "item_id": item, "quantity": qty})
+    return rid
+
+
+def _sale(db, buyer_type, cid, sid, item, qty):
+    rid = add_ledger_entry(buyer_type, cid, "sale", None, -qty * 10, "EUR",
+                           item_id=item, quantity=-qty, store_id=sid)
+    add_ledger_entry("store", sid, "sale", rid, 0, "EUR", item_id=item, quantity=-qty, store_id=sid)
+    q = Query()
+    rec = db.table("store_inventory").get((q.store_id == sid) & (q.item_id == item))
+    db.update("store_inventory", {"quantity": rec["quantity"] - qty}, [rec.doc_id])
+    return rid
+
+
+def _seed(db):
+    s1 = db.insert("stores", {"name": "North"})
+    s2 = db.insert("stores", {"name": "South"})
+    p1 = db.insert("partners", {"name": "P1"})
+    c1 = db.insert("customers", {"name": "Alice"})
+    c2 = db.insert("customers", {"name": "North", "type": "store_customer"})
+    _stockin(db, p1, s1, "A", 10)
+    _stockin(db, p1, s2, "A", 4)
+    _stockin(db, p1, s1, "B", 3)
+    add_ledger_entry("store", s2, "stockin", None, 0, "EUR", item_id="C", quantity=2)
+    _sale(db, "customer", c1, s1, "A", 2)
+    _sale(db, "store_customer", c2, s1, "B", 1)
+    _sale(db, "partner", p1, s2, "A", 1)
+    return s1, s2, p1, c1
+
+
+def test_views_match_the_old_scans(unlocked_db):
+    store_stock.reset()
+    s1, s2, p1, c1 = _seed(unlocked_db)
+    assert compute_store_inventory(unlocked_db) == _old_store_inventory(unlocked_db)
+    assert get_global_store_inventory(unlocked_db) == _old_global(unlocked_db)
+
+    # incremental add, then a delete (state rebuilt on the next query)
+    _stockin(unlocked_db, p1, s2, "D", 5)
+    rid = _sale(unlocked_db, "partner", p1, s2, "D", 2)
+    assert compute_store_inventory(unlocked_db) == _old_store_inventory(unlocked_db)
+    delete_ledger_entries_by_related("partner", p1, rid)
+    assert get_global_store_inventory(unlocked_db) == _old_global(unlocked_db)
+
+
+def test_reconcile_flags_store_inventory_drift(unlocked_db):
+    s1, s2, p1, c1 = _seed(unlocked_db)
+    rid = _stockin(unlocked_db, p1, s1, "E", 6)
+    add_ledger_entry("partner", p1, "stockin_edit_qty", rid, 0, "EUR", item_id="E", quantity=4,
+                     store_id=s1)
+    rec = unlocked_db.table("store_inventory").get(Query().item_id == "E")
+    unlocked_db.update("store_inventory", {"quantity": 4}, [rec.doc_id])
+    unlocked_db.insert("store_inventory", {"store_id": s2, "item_id": "C", "quantity": 2})
+    assert store_stock.reconcile() == []
+
+    unlocked_db.update("store_inventory", {"quantity": 9}, [rec.doc_id])
+    assert store_stock.reconcile() == [(str(s1), "E", 4, 9)]
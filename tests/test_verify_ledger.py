@@ -0,0 +1,57 @@
+from handlers.ledger import add_ledger_entry
+from handlers.verify_ledger import verify_ledger, verify_rows
+
+
+def _payment(usd_owner=11.0):
+    rid = add_ledger_entry("customer", 1, "payment", None, 10.0, "EUR", usd_amt=11.0)
+    add_ledger_entry("owner", "POT", "payment_recv", rid, usd_owner, "USD")
+    return rid
+
+
+def _sale(store_leg=True):
+    rid = add_ledger_entry("customer", 1, "sale", None, -20.0, "EUR",
+                           item_id="A", quantity=-2, unit_price=10.0, store_id=3)
+    if store_leg:
+        add_ledger_entry("store", 3, "sale", rid, 0, "EUR",
+                         item_id="A", quantity=-2, unit_price=10.0, store_id=3)
+    return rid
+
+
+def test_clean_ledger_and_linked_tables_pass(unlocked_db):
+    pay = _payment()
+    sale = _sale()
+    unlocked_db.table("sales").insert({"customer_id": 1, "related_id": sale})
+    unlocked_db.table("customer_payments").insert({"customer_id": 1, "related_id": pay})
+    unlocked_db.table("sales").insert({"customer_id": 1})   # legacy row
+
+    report = verify_ledger()
+    assert report.ok, report.format()
+    assert report.flows == {"payment": 1, "sale": 1}
+    assert report.unlinked == {"sales": 1}
+
+
+def test_orphans_and_unbalanced_groups_are_reported(unlocked_db):
+    _payment(usd_owner=10.99)
+    _sale(store_leg=False)
+    add_ledger_entry("owner", "POT", "payout_sent", None, -5.0, "USD")
+    unlocked_db.table("partner_payouts").insert({"partner_id": 2, "related_id": 999999})
+
+    report = verify_ledger()
+    assert report.issues == {
+        "payment USD legs differ": 1,
+        "missing leg": 2,                     # sale w/o store leg, payout w/o partner leg
+        "partner_payouts row without its ledger group": 1,
+    }
+    assert "store:sale" in report.format()
+
+
+def test_late_legs_are_checked_against_the_closed_group():
+    rows = [
+        {"account_type": "partner", "entry_type": "stockin", "related_id": 7, "amount": 0},
+        {"account_type": "owner", "entry_type": "pot_adjustment", "related_id": 8, "amount": 1},
+        {"account_type": "partner", "entry_type": "stockin_edit_qty", "related_id": 7, "amount": 0},
+        {"account_type": "partner", "entry_type": "stockin_delete", "related_id": 9, "amount": 0},
+    ]
+    report = verify_rows(rows, window=1)
+    assert report.issues == {"missing leg": 1}
+    assert report.examples["missing leg"][0][0] == "9"